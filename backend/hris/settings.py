@@ -43,14 +43,88 @@ SECRET_KEY = 'django-insecure-4&quhz))qhg9a(t#^fmycf=bf=dn#5n$k1k2d61)u+d&=ro8e#
 DEBUG = True
 USE_TZ = False
 
-# REST Framework Settings - No authentication required
+# REST Framework Settings - No permission checks; the bearer token is resolved
+# to request.user (cached per token) and views decide what to allow.
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_AUTHENTICATION_CLASSES': [],  # Empty = No authentication
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'letters.authentication.CachedJWTAuthentication',
+    ],
+}
+
+# Token -> user snapshot cache used by CachedJWTAuthentication
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL  = 300  # seconds
+
+# Letter version tokens (ETags on the list views) and cached calendar windows
+# live in the default cache. Celery workers bump versions too, so this must be
+# a cache every process shares, e.g.
+#   CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache
+#   CACHE_LOCATION=letters_cache   (then run `manage.py createcachetable`)
+# With the process-local default, ETags and calendar caching are switched off.
+CACHES = {
+    'default': {
+        'BACKEND':  os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
 }
 
+# Days before the due date a "Due Soon" reminder is sent, per letter priority.
+# Changing this only affects cycles scheduled afterwards; run
+# `manage.py rebuild_reminders` to apply it to existing ones.
+LETTERS_REMINDER_OFFSETS = {
+    'urgent':  (1, 2, 3, 5, 7),
+    'high':    (1, 2, 3, 5),
+    'default': (1, 2, 3),
+}
+
+# Nightly sweep: letters are split into id ranges of this size, and this many
+# chains of shards run side by side as a Celery group. Nothing joins the group,
+# so no result backend is needed; each shard's counts are in its TaskRun row.
+LETTERS_SWEEP_SHARD_SIZE  = 5000
+LETTERS_SWEEP_CONCURRENCY = 4
+
+# Record peak traced memory for tracked maintenance tasks (letters.runs).
+# tracemalloc slows allocation-heavy code down, so it can be switched off.
+LETTERS_TASK_TRACE_MEMORY = True
+
+# Notification coalescing (letters.notifications.deliver): another event for
+# the same user, letter and title within this many seconds of an unread
+# notification bumps its count instead of adding a row (0 turns it off).
+# Titles listed under DIGEST are collected into one row per user per day,
+# across letters, e.g. ('Due Soon', 'New Admin Comment').
+LETTERS_NOTIFICATION_COALESCE_SECONDS = 3600
+LETTERS_NOTIFICATION_DIGEST_TITLES    = ()
+
+# Calendar feed (/api/letters/calendar/ and calendar.ics): longest window a
+# request may ask for, and how long a built window stays cached. Cached
+# windows are keyed on the scope's version, so edits show up immediately.
+LETTERS_CALENDAR_MAX_DAYS      = 366
+LETTERS_CALENDAR_CACHE_SECONDS = 3600
+
+# Retention (manage.py apply_retention / letters.tasks.apply_retention):
+# age in days per policy, and whether removed rows are first written to
+# gzip JSONL segments in LETTERS_RETENTION_ARCHIVE_DIR (read them back with
+# manage.py scan_archive). Deletes run in primary-key batches with a pause
+# between them to keep lock footprints small on SQL Server.
+#
+# 'compact_cycle' is the cycle compaction horizon: completed cycles older than
+# this move to documents_cycle_archive and a per-letter history summary
+# (letters.compaction), so it normally runs before 'cycle' has anything to
+# delete. 'archived_cycle' later removes compacted rows themselves.
+LETTERS_RETENTION = {
+    'notification':   {'days': 30,  'archive': False},
+    'log':            {'days': 365, 'archive': True},
+    'compact_cycle':  {'days': 180, 'archive': False},
+    'cycle':          {'days': 730, 'archive': True},
+    'archived_cycle': {'days': 730, 'archive': True},
+}
+LETTERS_RETENTION_ARCHIVE_DIR = BASE_DIR / 'archive'
+LETTERS_RETENTION_BATCH_SIZE  = 1000
+LETTERS_RETENTION_SLEEP       = 0.1  # seconds
+
 CORS_ALLOW_CREDENTIALS = True
 
 CORS_ALLOW_METHODS = [
@@ -68,12 +142,16 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
 ]
 
+# Let the React app read ETags for conditional GETs on the letter lists
+CORS_EXPOSE_HEADERS = ['etag']
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Vite (React dev server)
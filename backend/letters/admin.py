@@ -1,3 +1,14 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import TaskRun
+
+
+@admin.register(TaskRun)
+class TaskRunAdmin(admin.ModelAdmin):
+    list_display    = (
+        "task_name", "status", "started_at", "duration_ms",
+        "rows_updated", "notifications_created", "query_count", "peak_memory_kb",
+    )
+    list_filter     = ("task_name", "status")
+    date_hierarchy  = "started_at"
+    readonly_fields = [field.name for field in TaskRun._meta.fields]
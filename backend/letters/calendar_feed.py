@@ -0,0 +1,189 @@
+"""
+Calendar feed: every due date in a window, real cycles merged with cycles
+projected from each recurring letter's rule.
+
+Stored cycles are read by due date, so the cost follows the window rather
+than how much history a letter has. Projection starts after a letter's
+newest cycle, from the next_due_date it carries (the due date the next cycle
+will get on completion), and continues with the letter's rule. Results are
+cached per role scope and window and keyed on that scope's version token, so
+any change to a letter or cycle in scope makes the next request rebuild. With
+a process-local cache nothing is cached, since Celery workers' version bumps
+would never reach the web process.
+"""
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from .models import ArchivedLetterCycle, LetterCycle
+from .recurrence import count_until, next_occurrences, rule_for
+from . import versions
+
+
+DEFAULT_WINDOW_DAYS = 31
+MAX_WINDOW_DAYS     = 366
+
+
+def scope_for(user):
+    """The version scope of the letters `user` sees (the same split as the list views)."""
+    if user.is_superuser and not user.is_staff:
+        return "all"
+    if user.is_superuser:
+        return f"head:{user.id}"
+    return f"assignee:{user.id}"
+
+
+def parse_window(start, end, default_days=DEFAULT_WINDOW_DAYS):
+    """
+    (from, to) dates from ISO strings. `from` defaults to today and `to` to
+    `default_days` later. Raises ValueError for bad dates, a reversed window,
+    or one longer than LETTERS_CALENDAR_MAX_DAYS.
+    """
+    max_days = getattr(settings, "LETTERS_CALENDAR_MAX_DAYS", MAX_WINDOW_DAYS)
+    try:
+        start = date.fromisoformat(start) if start else date.today()
+        end   = date.fromisoformat(end) if end else start + timedelta(days=min(default_days, max_days))
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format.")
+    if end < start:
+        raise ValueError("'to' must not be before 'from'.")
+    if (end - start).days > max_days:
+        raise ValueError(f"The window cannot be longer than {max_days} days.")
+    return start, end
+
+
+def _event(letter_id, ref_no, subject, priority, day, cycle_no, status, projected):
+    return {
+        "id":        f"letter-{letter_id}-cycle-{cycle_no}",
+        "letter_id": letter_id,
+        "ref_no":    ref_no,
+        "subject":   subject,
+        "priority":  priority,
+        "date":      day.isoformat(),
+        "cycle_no":  cycle_no,
+        "status":    status,
+        "projected": projected,
+    }
+
+
+def _stored(letters, start, end):
+    # Live and compacted cycles alike: compaction must not empty past months.
+    rows = [
+        row
+        for model in (LetterCycle, ArchivedLetterCycle)
+        for row in model.objects
+        .filter(letter__in=letters.values("pk"), due_date__gte=start, due_date__lte=end)
+        .values_list("letter_id", "letter__ref_no", "letter__subject", "letter__priority",
+                     "due_date", "cycle_no", "status")
+    ]
+    return [
+        _event(letter_id, ref_no, subject, priority, due, cycle_no, status, False)
+        for letter_id, ref_no, subject, priority, due, cycle_no, status in rows
+    ]
+
+
+def _projected(letters, start, end):
+    newest  = LetterCycle.objects.filter(letter_id=OuterRef("pk")).order_by("-cycle_no")
+    letters = (
+        letters.select_related(None)
+        .filter(status="in-progress", recurrence_type__isnull=False)
+        .exclude(recurrence_type="")
+        .annotate(
+            last_cycle_no=Subquery(newest.values("cycle_no")[:1]),
+            next_due=Subquery(newest.values("next_due_date")[:1]),
+        )
+        .filter(next_due__isnull=False, next_due__lte=end)
+        .only("pk", "ref_no", "subject", "priority", "recurrence_type", "recurrence_value", "recurrence_metadata")
+    )
+
+    # The next cycle's due date is known; the rest follow from the rule. One
+    # batch per occurrence count, since the engine returns a fixed number.
+    by_count = {}
+    for letter in letters:
+        rule = rule_for(letter)
+        by_count.setdefault(count_until(letter.next_due, rule, end), []).append((letter, rule))
+
+    events = []
+    for count, members in by_count.items():
+        later = next_occurrences(((letter.pk, letter.next_due, rule) for letter, rule in members), count)
+        for letter, _ in members:
+            for offset, due in enumerate([letter.next_due] + later[letter.pk], start=1):
+                if start <= due <= end:
+                    events.append(_event(
+                        letter.pk, letter.ref_no, letter.subject, letter.priority,
+                        due, letter.last_cycle_no + offset, "projected", True,
+                    ))
+    return events
+
+
+def build(letters, start, end):
+    events  = _stored(letters, start, end) + _projected(letters, start, end)
+    events.sort(key=lambda e: (e["date"], e["letter_id"], e["cycle_no"]))
+    return events
+
+
+def events_for(user, letters, start, end):
+    """
+    Calendar events between `start` and `end` (inclusive) for `letters`, the
+    queryset `user` is allowed to see, cached under the user's scope when
+    the cache is shared between processes.
+    """
+    if not versions.shared():
+        return build(letters, start, end)
+    scope   = scope_for(user)
+    version = versions.current([scope])[0]
+    key     = f"letters:calendar:{scope}:{start.isoformat()}:{end.isoformat()}:{version}"
+    timeout = getattr(settings, "LETTERS_CALENDAR_CACHE_SECONDS", 3600)
+    return cache.get_or_set(key, lambda: build(letters, start, end), timeout)
+
+
+def _ics_text(value):
+    return (
+        str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    # RFC 5545: lines longer than 75 octets continue on lines starting with a space.
+    encoded, parts = line.encode("utf-8"), []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        while (encoded[cut] & 0xC0) == 0x80:   # do not split a UTF-8 sequence
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+def to_ics(events, name="Letters"):
+    """An iCalendar document with one all-day VEVENT per event."""
+    stamp = datetime.now(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Compliance System//Letters//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_ics_text(name)}",
+    ]
+    for event in events:
+        day         = date.fromisoformat(event["date"])
+        summary     = f"{event['ref_no']} - {event['subject']}"
+        description = f"Cycle {event['cycle_no']} - {event['status']}"
+        if event["projected"]:
+            summary += " (projected)"
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{event['id']}@letters",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{day:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}",
+            f"SUMMARY:{_ics_text(summary)}",
+            f"DESCRIPTION:{_ics_text(description)}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
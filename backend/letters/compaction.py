@@ -0,0 +1,126 @@
+"""
+Compaction of completed cycles: old rows move from documents_cycle to
+documents_cycle_archive and are folded into one CycleHistorySummary row per
+letter. The move itself runs as the "compact_cycle" retention policy
+(letters.retention), which supplies batching, checkpoints and dry runs.
+
+Archived cycles still count in the task summary, so compaction changes no
+dashboard totals; reads that list a letter's cycles merge both tables.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedLetterCycle, CycleHistorySummary, LetterCycle, Tombstone
+from .pagination import encode_cursor, keyset_paginate
+from .sync import cycle_tombstones
+from . import versions
+
+
+ARCHIVED_FIELDS = (
+    "id", "letter_id", "cycle_no", "due_date", "next_due_date", "status",
+    "completed_at", "created_at", "updated_at",
+)
+
+
+def _on_time(row):
+    if row["completed_at"] is None:
+        return None
+    return row["completed_at"].date() <= row["due_date"]
+
+
+def fold(rows):
+    """
+    Archive `rows` (LetterCycle values dicts, already deleted from
+    documents_cycle in the caller's transaction) and add them to their
+    letters' history summaries.
+    """
+    ArchivedLetterCycle.objects.bulk_create(
+        [ArchivedLetterCycle(**{field: row[field] for field in ARCHIVED_FIELDS}) for row in rows],
+        batch_size=500,
+    )
+
+    by_letter = {}
+    for row in rows:
+        by_letter.setdefault(row["letter_id"], []).append(row)
+
+    existing = {
+        summary.letter_id: summary
+        for summary in CycleHistorySummary.objects.select_for_update().filter(letter_id__in=by_letter)
+    }
+    created, now = [], timezone.now()
+    for letter_id, letter_rows in by_letter.items():
+        summary = existing.get(letter_id)
+        if summary is None:
+            summary = CycleHistorySummary(letter_id=letter_id)
+            created.append(summary)
+        judged = [_on_time(row) for row in letter_rows]
+        summary.cycles  += len(letter_rows)
+        summary.on_time += sum(1 for ok in judged if ok is True)
+        summary.late    += sum(1 for ok in judged if ok is False)
+
+        first = min(letter_rows, key=lambda row: row["cycle_no"])
+        last  = max(letter_rows, key=lambda row: row["cycle_no"])
+        if summary.first_cycle_no is None or first["cycle_no"] < summary.first_cycle_no:
+            summary.first_cycle_no, summary.first_due_date = first["cycle_no"], first["due_date"]
+        if summary.last_cycle_no is None or last["cycle_no"] > summary.last_cycle_no:
+            summary.last_cycle_no, summary.last_due_date = last["cycle_no"], last["due_date"]
+        completed = [row["completed_at"] for row in letter_rows if row["completed_at"]]
+        if completed and (summary.last_completed_at is None or max(completed) > summary.last_completed_at):
+            summary.last_completed_at = max(completed)
+        summary.updated_at = now
+
+    CycleHistorySummary.objects.bulk_create(created)
+    CycleHistorySummary.objects.bulk_update(
+        [summary for letter_id, summary in existing.items() if letter_id in by_letter],
+        ["cycles", "on_time", "late", "first_due_date", "last_due_date",
+         "first_cycle_no", "last_cycle_no", "last_completed_at", "updated_at"],
+        batch_size=100,
+    )
+
+    # Delta-sync clients mirror documents_cycle; the rows left it.
+    Tombstone.objects.bulk_create(cycle_tombstones(rows))
+    scopes = set()
+    for letter_id in by_letter:
+        scopes |= versions.scopes_for_letter_id(letter_id)
+    transaction.on_commit(lambda: versions.bump(scopes))
+
+
+def history_summary(letter_id):
+    summary = CycleHistorySummary.objects.filter(letter_id=letter_id).first()
+    if summary is None:
+        return None
+    return {
+        "cycles":            summary.cycles,
+        "on_time":           summary.on_time,
+        "late":              summary.late,
+        "on_time_ratio":     summary.on_time_ratio,
+        "first_cycle_no":    summary.first_cycle_no,
+        "last_cycle_no":     summary.last_cycle_no,
+        "first_due_date":    summary.first_due_date.isoformat() if summary.first_due_date else None,
+        "last_due_date":     summary.last_due_date.isoformat() if summary.last_due_date else None,
+        "last_completed_at": summary.last_completed_at.isoformat() if summary.last_completed_at else None,
+    }
+
+
+def cycle_page(letter_id, descending=False, cursor=None, page_size=50):
+    """
+    One keyset page over a letter's live and archived cycles together,
+    ordered by cycle_no. cycle_no is unique per letter across both tables
+    (a cycle is moved, never copied), so one (cycle_no, id) cursor seeks in
+    both. Returns ([(cycle, archived), ...], next_cursor).
+    """
+    live,     _ = keyset_paginate(LetterCycle.objects.filter(letter_id=letter_id), "cycle_no",
+                                  descending=descending, cursor=cursor, page_size=page_size + 1)
+    archived, _ = keyset_paginate(ArchivedLetterCycle.objects.filter(letter_id=letter_id), "cycle_no",
+                                  descending=descending, cursor=cursor, page_size=page_size + 1)
+    merged = sorted(
+        [(cycle, False) for cycle in live] + [(cycle, True) for cycle in archived],
+        key=lambda item: item[0].cycle_no, reverse=descending,
+    )
+    page = merged[:page_size]
+    next_cursor = None
+    if len(merged) > page_size and page:
+        last = page[-1][0]
+        next_cursor = encode_cursor(last.cycle_no, last.pk)
+    return page, next_cursor
+
@@ -0,0 +1,98 @@
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Notification, NotificationCounter
+
+
+_pending = contextvars.ContextVar("letters_counters_pending", default=None)
+
+
+def adjust(deltas):
+    """Apply {user_id: delta} to the unread counters, creating missing rows."""
+    pending = _pending.get()
+    if pending is not None:
+        pending.update(deltas)
+        return
+    for user_id, delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        updated = NotificationCounter.objects.filter(user_id=user_id).update(unread=F("unread") + delta)
+        if updated:
+            continue
+        # No row yet: seed it from the table, which already includes this change.
+        try:
+            with transaction.atomic():
+                NotificationCounter.objects.create(user_id=user_id, unread=_count(user_id))
+        except IntegrityError:
+            # Another writer created the row first.
+            NotificationCounter.objects.filter(user_id=user_id).update(unread=F("unread") + delta)
+
+
+@contextmanager
+def deferred():
+    """Like summary.deferred(): sum the adjust() calls in the block and apply them once on exit."""
+    pending = Counter()
+    token   = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    adjust(pending)
+
+
+def _count(user_id):
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def unread_count(user_id):
+    unread = NotificationCounter.objects.filter(user_id=user_id).values_list("unread", flat=True).first()
+    if unread is None:
+        unread = _count(user_id)
+        try:
+            with transaction.atomic():
+                NotificationCounter.objects.create(user_id=user_id, unread=unread)
+        except IntegrityError:
+            pass
+    return max(unread, 0)
+
+
+def created(notifications):
+    adjust(Counter(n.user_id for n in notifications if not n.is_read))
+
+
+def compute():
+    """Authoritative unread counts straight from documents_notification."""
+    return Counter(dict(
+        Notification.objects.filter(is_read=False)
+        .values("user_id").annotate(n=Count("pk")).order_by()
+        .values_list("user_id", "n")
+    ))
+
+
+def stored():
+    return Counter(dict(NotificationCounter.objects.filter(unread__gt=0).values_list("user_id", "unread")))
+
+
+def drift():
+    """{user_id: (stored, expected)} for every user whose counter disagrees with the table."""
+    expected, table = compute(), stored()
+    return {
+        user_id: (table.get(user_id, 0), expected.get(user_id, 0))
+        for user_id in set(expected) | set(table)
+        if table.get(user_id, 0) != expected.get(user_id, 0)
+    }
+
+
+@transaction.atomic
+def rebuild():
+    counts = compute()
+    NotificationCounter.objects.all().delete()
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id, unread=n) for user_id, n in counts.items()],
+        batch_size=500,
+    )
+    return len(counts)
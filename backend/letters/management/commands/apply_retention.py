@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from letters import retention
+
+
+class Command(BaseCommand):
+    help = "Delete (and archive) expired notifications, logs and cycles, and compact old cycles, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--policy", action="append", choices=sorted(retention.POLICIES),
+            help="Policy to run; repeat for several. Defaults to all.",
+        )
+        parser.add_argument("--days", type=int, help="Override the retention age in days.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed.")
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--sleep", type=float, help="Seconds to pause between batches.")
+        parser.add_argument("--max-seconds", type=float, help="Stop after this long; the next run resumes.")
+
+    def handle(self, *args, **options):
+        names = options["policy"] or list(retention.POLICIES)
+        if options["days"] is not None and options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+
+        for name in names:
+            policy = retention.POLICIES[name](days=options["days"])
+            if options["dry_run"]:
+                self.stdout.write(json.dumps(retention.report(policy)))
+                continue
+            result = retention.run(
+                policy,
+                batch_size=options["batch_size"],
+                sleep=options["sleep"],
+                max_seconds=options["max_seconds"],
+            )
+            state = "done" if result["finished"] else "paused, will resume"
+            self.stdout.write(self.style.SUCCESS(f"{name}: removed {result['removed']} row(s), {state}."))
+            for path in result["segments"]:
+                self.stdout.write(f"  archived to {path}")
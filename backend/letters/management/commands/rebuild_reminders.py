@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from letters import reminders
+
+
+class Command(BaseCommand):
+    help = "Rebuild the reminder schedule from open letters and cycles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        scheduled = reminders.rebuild_schedule(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Scheduled {scheduled} reminder(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from letters import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the task search index from documents and documents_comment."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} letter(s)."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from letters import summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dashboard task summary table, or check it for drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only compare the table with documents / documents_cycle; exit non-zero on drift.",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            drifted = summary.drift()
+            for key, (stored, expected) in sorted(drifted.items(), key=str):
+                row = dict(zip(summary.KEY_FIELDS, key))
+                self.stdout.write(f"{row}: stored={stored} expected={expected}")
+            if drifted:
+                raise CommandError(f"{len(drifted)} summary row(s) drifted.")
+            self.stdout.write(self.style.SUCCESS("Task summary is consistent."))
+            return
+
+        rows = summary.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt task summary: {rows} row(s)."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from letters import counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user unread notification counters, or check them for drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only compare the counters with documents_notification; exit non-zero on drift.",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            drifted = counters.drift()
+            for user_id, (stored, expected) in sorted(drifted.items()):
+                self.stdout.write(f"user {user_id}: stored={stored} expected={expected}")
+            if drifted:
+                raise CommandError(f"{len(drifted)} counter(s) drifted.")
+            self.stdout.write(self.style.SUCCESS("Notification counters are consistent."))
+            return
+
+        rows = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt notification counters: {rows} user(s)."))
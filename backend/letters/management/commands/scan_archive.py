@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from letters import retention
+
+
+class Command(BaseCommand):
+    help = "Print archived rows from the retention JSONL segments, optionally filtered."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--policy", choices=sorted(retention.POLICIES))
+        parser.add_argument("--dir", help="Archive directory (default LETTERS_RETENTION_ARCHIVE_DIR).")
+        parser.add_argument(
+            "--match", action="append", default=[], metavar="FIELD=VALUE",
+            help="Only rows whose FIELD equals VALUE; repeat to require several.",
+        )
+        parser.add_argument("--limit", type=int)
+
+    def handle(self, *args, **options):
+        match = {}
+        for item in options["match"]:
+            field, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"--match expects FIELD=VALUE, got {item!r}.")
+            match[field] = value
+
+        rows = retention.read_archive(options["dir"], policy=options["policy"], match=match)
+        for n, row in enumerate(rows):
+            if options["limit"] is not None and n >= options["limit"]:
+                break
+            self.stdout.write(json.dumps(row))
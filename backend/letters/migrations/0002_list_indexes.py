@@ -0,0 +1,40 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('department', '0001_initial'),
+        ('letters', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='documents_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'due_date', 'id'], name='documents_active_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'status'], name='documents_active_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'priority'], name='documents_active_prio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'category'], name='documents_active_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lettercycle',
+            index=models.Index(fields=['letter', 'status', 'due_date'], name='documents_cycle_filter_idx'),
+        ),
+    ]
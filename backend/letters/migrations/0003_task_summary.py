@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('department', '0001_initial'),
+        ('letters', '0002_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assignee_id', models.IntegerField(blank=True, null=True)),
+                ('head_id', models.IntegerField(blank=True, null=True)),
+                ('status', models.CharField(max_length=20)),
+                ('month', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='department.department')),
+            ],
+            options={
+                'db_table': 'documents_task_summary',
+                'indexes': [models.Index(fields=['assignee_id', 'month'], name='task_summary_assignee_idx'), models.Index(fields=['head_id', 'month'], name='task_summary_head_idx')],
+                'unique_together': {('assignee_id', 'head_id', 'department', 'status', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0003_task_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('letter', 'Letter'), ('cycle', 'Cycle'), ('comment', 'Comment')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('letter_id', models.BigIntegerField()),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'documents_tombstone',
+            },
+        ),
+        migrations.AddField(
+            model_name='letter',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='lettercycle',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='lettercomment',
+            index=models.Index(fields=['created_at'], name='documents_comment_created_idx'),
+        ),
+    ]
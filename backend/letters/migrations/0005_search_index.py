@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0004_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('letter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='letters.letter')),
+            ],
+            options={
+                'db_table': 'documents_search_posting',
+                'indexes': [models.Index(fields=['term', '-weight'], name='search_posting_weight_idx')],
+                'unique_together': {('term', 'letter')},
+            },
+        ),
+    ]
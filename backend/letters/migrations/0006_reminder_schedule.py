@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fire_date', models.DateField()),
+                ('kind', models.CharField(choices=[('due_soon', 'Due Soon'), ('due_today', 'Due Today'), ('overdue', 'Overdue')], max_length=20)),
+            ],
+            options={
+                'db_table': 'documents_reminder',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lettercycle',
+            index=models.Index(fields=['status', 'due_date'], name='documents_cycle_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='reminderschedule',
+            name='cycle',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='letters.lettercycle'),
+        ),
+        migrations.AddField(
+            model_name='reminderschedule',
+            name='letter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='letters.letter'),
+        ),
+        migrations.AddIndex(
+            model_name='reminderschedule',
+            index=models.Index(fields=['fire_date'], name='documents_reminder_fire_idx'),
+        ),
+    ]
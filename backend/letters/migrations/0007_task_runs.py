@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0006_reminder_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=150)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('success', 'Success'), ('failure', 'Failure')], default='running', max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_ms', models.FloatField(blank=True, null=True)),
+                ('rows_updated', models.IntegerField(default=0)),
+                ('notifications_created', models.IntegerField(default=0)),
+                ('query_count', models.IntegerField(default=0)),
+                ('peak_memory_kb', models.IntegerField(blank=True, null=True)),
+                ('result', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'documents_task_run',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['task_name', 'started_at'], name='documents_task_run_name_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0011_notification_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lettercycle',
+            index=models.Index(fields=['due_date', 'letter'], name='documents_cycle_date_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0012_cycle_calendar_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CycleHistorySummary',
+            fields=[
+                ('letter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cycle_history', serialize=False, to='letters.letter')),
+                ('cycles', models.IntegerField(default=0)),
+                ('on_time', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('first_due_date', models.DateField(blank=True, null=True)),
+                ('last_due_date', models.DateField(blank=True, null=True)),
+                ('first_cycle_no', models.IntegerField(blank=True, null=True)),
+                ('last_cycle_no', models.IntegerField(blank=True, null=True)),
+                ('last_completed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'documents_cycle_history',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLetterCycle',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cycle_no', models.IntegerField()),
+                ('due_date', models.DateField()),
+                ('next_due_date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('in-progress', 'In Progress'), ('completed', 'Completed'), ('overdue', 'Overdue')], max_length=20)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('letter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_cycles', to='letters.letter')),
+            ],
+            options={
+                'db_table': 'documents_cycle_archive',
+                'unique_together': {('letter', 'cycle_no')},
+            },
+        ),
+    ]
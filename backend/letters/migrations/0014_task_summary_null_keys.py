@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+def merge_duplicate_buckets(apps, schema_editor):
+    """Fold rows that the old key let through (NULL assignee or head) into one per bucket."""
+    TaskSummary = apps.get_model("letters", "TaskSummary")
+    seen = {}
+    for row in TaskSummary.objects.filter(models.Q(assignee_id__isnull=True) | models.Q(head_id__isnull=True)).order_by("pk"):
+        key = (row.assignee_id, row.head_id, row.department_id, row.status, row.month)
+        keep = seen.get(key)
+        if keep is None:
+            seen[key] = row
+            continue
+        keep.count += row.count
+        keep.save(update_fields=["count"])
+        row.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('department', '0001_initial'),
+        ('letters', '0013_cycle_compaction'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_buckets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tasksummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('assignee_id__isnull', True), ('head_id__isnull', False)), fields=('head_id', 'department', 'status', 'month'), name='task_summary_no_assignee_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tasksummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('assignee_id__isnull', False), ('head_id__isnull', True)), fields=('assignee_id', 'department', 'status', 'month'), name='task_summary_no_head_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tasksummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('assignee_id__isnull', True), ('head_id__isnull', True)), fields=('department', 'status', 'month'), name='task_summary_unassigned_uniq'),
+        ),
+    ]
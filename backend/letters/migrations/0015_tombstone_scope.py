@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+def scope_existing_tombstones(apps, schema_editor):
+    """Shared tombstones written so far belong to their letter's current assignee and head."""
+    Letter    = apps.get_model("letters", "Letter")
+    Tombstone = apps.get_model("letters", "Tombstone")
+    letter = Letter.objects.filter(pk=models.OuterRef("letter_id"))
+    Tombstone.objects.filter(user_id__isnull=True).update(
+        assignee_id=models.Subquery(letter.values("assigned_to_id")[:1]),
+        head_id=models.Subquery(letter.values("assigned_head_id")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0014_task_summary_null_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='assignee_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='head_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(scope_existing_tombstones, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['assignee_id', 'deleted_at'], name='tombstone_assignee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['head_id', 'deleted_at'], name='tombstone_head_idx'),
+        ),
+    ]
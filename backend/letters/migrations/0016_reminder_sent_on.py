@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0015_tombstone_scope'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='reminderschedule',
+            name='documents_reminder_fire_idx',
+        ),
+        migrations.AddField(
+            model_name='reminderschedule',
+            name='sent_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reminderschedule',
+            index=models.Index(fields=['sent_on', 'fire_date'], name='documents_reminder_due_idx'),
+        ),
+    ]
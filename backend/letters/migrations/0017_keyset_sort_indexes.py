@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0016_reminder_sent_on'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='letter',
+            name='documents_active_prio_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='letter',
+            name='documents_active_cat_idx',
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'ref_no', 'id'], name='documents_active_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'subject', 'id'], name='documents_active_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'priority', 'id'], name='documents_active_prio_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['is_active', 'category', 'id'], name='documents_active_cat_id_idx'),
+        ),
+    ]
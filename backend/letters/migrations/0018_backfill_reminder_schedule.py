@@ -0,0 +1,67 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:02
+
+from datetime import timedelta
+
+from django.db import migrations
+
+
+def backfill_reminders(apps, schema_editor):
+    """
+    Plan reminders for the open letters that have none yet, so the nightly
+    sweep has something to fire before the first edit or rebuild_reminders
+    run. Mirrors letters.reminders.plan_letter on the historical models.
+    """
+    from letters.reminders import offsets_for
+
+    Letter           = apps.get_model("letters", "Letter")
+    LetterCycle      = apps.get_model("letters", "LetterCycle")
+    ReminderSchedule = apps.get_model("letters", "ReminderSchedule")
+
+    def plan(letter, cycle_id, due_date):
+        days = [d for d in sorted(set(offsets_for(letter.priority))) if d > 0]
+        rows = [
+            ReminderSchedule(letter_id=letter.pk, cycle_id=cycle_id, kind="due_soon", fire_date=due_date - timedelta(days=d))
+            for d in days
+        ]
+        rows.append(ReminderSchedule(letter_id=letter.pk, cycle_id=cycle_id, kind="due_today", fire_date=due_date))
+        rows.append(ReminderSchedule(letter_id=letter.pk, cycle_id=cycle_id, kind="overdue", fire_date=due_date + timedelta(days=1)))
+        return rows
+
+    letters = (
+        Letter.objects.filter(is_active=True, status="in-progress")
+        .exclude(pk__in=ReminderSchedule.objects.values("letter_id"))
+        .order_by("pk")
+    )
+    last_pk = 0
+    while True:
+        batch = list(letters.filter(pk__gt=last_pk)[:500])
+        if not batch:
+            return
+        cycles = {}
+        for letter_id, cycle_id, due_date, status in (
+            LetterCycle.objects.filter(letter_id__in=[letter.pk for letter in batch])
+            .values_list("letter_id", "id", "due_date", "status")
+        ):
+            cycles.setdefault(letter_id, []).append((cycle_id, due_date, status))
+        rows = []
+        for letter in batch:
+            if letter.pk not in cycles:
+                if letter.due_date:
+                    rows.extend(plan(letter, None, letter.due_date))
+                continue
+            for cycle_id, due_date, status in cycles[letter.pk]:
+                if status != "completed":
+                    rows.extend(plan(letter, cycle_id, due_date))
+        ReminderSchedule.objects.bulk_create(rows, batch_size=1000)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0017_keyset_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_reminders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('letters', '0018_backfill_reminder_schedule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedlettercycle',
+            index=models.Index(fields=['due_date', 'letter'], name='documents_cycle_arch_date_idx'),
+        ),
+    ]
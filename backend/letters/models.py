@@ -70,6 +70,7 @@ class Letter(models.Model):
 
     next_due_date = models.DateField(null=True, blank=True)
     created_at    = models.DateTimeField(auto_now_add=True)
+    updated_at    = models.DateTimeField(auto_now=True, db_index=True)
 
     def calculate_next_due_date(self, base_date=None):
         base: date = base_date or self.due_date
@@ -119,6 +120,16 @@ class Letter(models.Model):
     class Meta:
         ordering = ["-created_at"]
         db_table = "documents"
+        indexes = [
+            # Keyset pages for the task lists: (is_active, sort column, id).
+            models.Index(fields=["is_active", "created_at", "id"], name="documents_active_created_idx"),
+            models.Index(fields=["is_active", "due_date", "id"],   name="documents_active_due_idx"),
+            models.Index(fields=["is_active", "status"],           name="documents_active_status_idx"),
+            models.Index(fields=["is_active", "ref_no", "id"],     name="documents_active_ref_idx"),
+            models.Index(fields=["is_active", "subject", "id"],    name="documents_active_subject_idx"),
+            models.Index(fields=["is_active", "priority", "id"],   name="documents_active_prio_id_idx"),
+            models.Index(fields=["is_active", "category", "id"],   name="documents_active_cat_id_idx"),
+        ]
 
 
 class LetterCycle(models.Model):
@@ -136,6 +147,7 @@ class LetterCycle(models.Model):
 
     completed_at = models.DateTimeField(null=True, blank=True)
     created_at   = models.DateTimeField(auto_now_add=True)
+    updated_at   = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         if self.status:
@@ -145,6 +157,64 @@ class LetterCycle(models.Model):
     class Meta:
         unique_together = ("letter", "cycle_no")
         db_table = "documents_cycle"
+        indexes = [
+            models.Index(fields=["letter", "status", "due_date"], name="documents_cycle_filter_idx"),
+            # Nightly overdue sweep: status = 'in-progress' AND due_date < today.
+            models.Index(fields=["status", "due_date"],           name="documents_cycle_due_idx"),
+            # Calendar windows: due_date range joined back to the scoped letters.
+            models.Index(fields=["due_date", "letter"],           name="documents_cycle_date_idx"),
+        ]
+
+
+class ArchivedLetterCycle(models.Model):
+    """
+    A completed cycle compacted out of documents_cycle (letters.compaction).
+    Keeps the original id, so cycle ids stay unique across both tables.
+    """
+    id       = models.BigIntegerField(primary_key=True)
+    letter   = models.ForeignKey(Letter, related_name="archived_cycles", on_delete=models.CASCADE)
+    cycle_no = models.IntegerField()
+    due_date = models.DateField()
+    next_due_date = models.DateField(null=True, blank=True)
+    status   = models.CharField(max_length=20, choices=LetterCycle.STATUS_CHOICES)
+
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at   = models.DateTimeField()
+    updated_at   = models.DateTimeField()
+    archived_at  = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("letter", "cycle_no")
+        db_table = "documents_cycle_archive"
+        indexes = [
+            models.Index(fields=["due_date", "letter"], name="documents_cycle_arch_date_idx"),
+        ]
+
+
+class CycleHistorySummary(models.Model):
+    """
+    Totals over a letter's compacted cycles, so history views can report them
+    without reading every archived row. Not reduced when retention later
+    removes archived rows.
+    """
+    letter  = models.OneToOneField(Letter, on_delete=models.CASCADE, primary_key=True, related_name="cycle_history")
+    cycles  = models.IntegerField(default=0)
+    on_time = models.IntegerField(default=0)   # completed on or before the due date
+    late    = models.IntegerField(default=0)
+    first_due_date    = models.DateField(null=True, blank=True)
+    last_due_date     = models.DateField(null=True, blank=True)
+    first_cycle_no    = models.IntegerField(null=True, blank=True)
+    last_cycle_no     = models.IntegerField(null=True, blank=True)
+    last_completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "documents_cycle_history"
+
+    @property
+    def on_time_ratio(self):
+        judged = self.on_time + self.late
+        return round(self.on_time / judged, 4) if judged else None
 
 
 class Log(models.Model):
@@ -179,10 +249,30 @@ class Notification(models.Model):
     title   = models.CharField(max_length=255)
     message = models.TextField()
     is_read = models.BooleanField(default=False)
+    # How many events this row stands for; see letters.notifications.deliver.
+    count   = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "documents_notification"
+        indexes = [
+            # Inbox pages: keyset on (created_at, id) within one user, optionally unread only.
+            models.Index(fields=["user", "is_read", "created_at", "id"], name="notification_inbox_unread_idx"),
+            models.Index(fields=["user", "created_at", "id"],            name="notification_inbox_idx"),
+        ]
+
+
+class NotificationCounter(models.Model):
+    """
+    Unread notifications per user, so the header badge is a primary-key read.
+    Kept in step by letters.counters on every write path; reconcile with
+    `manage.py reconcile_notification_counters`.
+    """
+    user   = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="notification_counter")
+    unread = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "documents_notification_counter"
 
 
 class Category(models.Model):
@@ -200,6 +290,172 @@ class LetterComment(models.Model):
     class Meta:
         ordering   = ["-created_at"]
         db_table   = "documents_comment"   # good practice to set explicitly
+        indexes = [
+            models.Index(fields=["created_at"], name="documents_comment_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Comment by {self.user.username} on Letter {self.letter_id}"
+
+
+class TaskSummary(models.Model):
+    """
+    Denormalized row counts behind the dashboards, one row per
+    (assignee, head, department, status, created month). Kept in step by
+    letters.summary on every write path; rebuild with `manage.py rebuild_task_summary`.
+    User ids are plain integers so that deleting a user (letters SET_NULL)
+    cannot collide rows on the unique key; the rebuild command folds them back.
+    """
+    assignee_id = models.IntegerField(null=True, blank=True)
+    head_id     = models.IntegerField(null=True, blank=True)
+    department  = models.ForeignKey(Department, on_delete=models.CASCADE)
+    status      = models.CharField(max_length=20)
+    month       = models.DateField()
+    count       = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "documents_task_summary"
+        unique_together = ("assignee_id", "head_id", "department", "status", "month")
+        # A unique key never treats two NULLs as equal, so buckets without an
+        # assignee or head need their own constraints or concurrent first
+        # writes would each insert one.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["head_id", "department", "status", "month"],
+                condition=models.Q(assignee_id__isnull=True, head_id__isnull=False),
+                name="task_summary_no_assignee_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["assignee_id", "department", "status", "month"],
+                condition=models.Q(assignee_id__isnull=False, head_id__isnull=True),
+                name="task_summary_no_head_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["department", "status", "month"],
+                condition=models.Q(assignee_id__isnull=True, head_id__isnull=True),
+                name="task_summary_unassigned_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["assignee_id", "month"], name="task_summary_assignee_idx"),
+            models.Index(fields=["head_id", "month"],     name="task_summary_head_idx"),
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    Marks something a delta-sync client should drop: a letter that was deleted
+    (soft or hard), or one that left a user's scope. `user_id` is NULL when the
+    removal applies to everyone who could see the letter, which `assignee_id`
+    and `head_id` record as of the removal.
+    """
+    OBJECT_CHOICES = [
+        ("letter",  "Letter"),
+        ("cycle",   "Cycle"),
+        ("comment", "Comment"),
+    ]
+    object_type = models.CharField(max_length=20, choices=OBJECT_CHOICES)
+    object_id   = models.BigIntegerField()
+    letter_id   = models.BigIntegerField()
+    user_id     = models.IntegerField(null=True, blank=True)
+    assignee_id = models.IntegerField(null=True, blank=True)
+    head_id     = models.IntegerField(null=True, blank=True)
+    deleted_at  = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = "documents_tombstone"
+        indexes = [
+            models.Index(fields=["assignee_id", "deleted_at"], name="tombstone_assignee_idx"),
+            models.Index(fields=["head_id", "deleted_at"],     name="tombstone_head_idx"),
+        ]
+
+
+class SearchPosting(models.Model):
+    """
+    Inverted index for task search: one row per (term, letter) holding the
+    term's field-weighted frequency across subject, ref_no, file_description,
+    category and the letter's comments. Maintained by letters.search.
+    """
+    term   = models.CharField(max_length=64)
+    letter = models.ForeignKey(Letter, on_delete=models.CASCADE, related_name="search_postings")
+    weight = models.FloatField()
+
+    class Meta:
+        db_table = "documents_search_posting"
+        unique_together = ("term", "letter")
+        indexes = [
+            models.Index(fields=["term", "-weight"], name="search_posting_weight_idx"),
+        ]
+
+
+class ReminderSchedule(models.Model):
+    """
+    Due-date reminders, written by letters.reminders whenever a cycle is
+    created or a due date, priority or status changes. The nightly sweep only
+    reads unsent rows with fire_date <= today and stamps `sent_on` once
+    handled; sent rows stay while their cycle is open so replanning never
+    repeats them. A row with no cycle belongs to a letter that has no cycles yet.
+    """
+    KIND_CHOICES = [
+        ("due_soon",  "Due Soon"),
+        ("due_today", "Due Today"),
+        ("overdue",   "Overdue"),
+    ]
+    letter    = models.ForeignKey(Letter, on_delete=models.CASCADE, related_name="reminders")
+    cycle     = models.ForeignKey(LetterCycle, on_delete=models.CASCADE, null=True, blank=True, related_name="reminders")
+    fire_date = models.DateField()
+    kind      = models.CharField(max_length=20, choices=KIND_CHOICES)
+    sent_on   = models.DateField(null=True, blank=True)
+
+    class Meta:
+        db_table = "documents_reminder"
+        indexes = [
+            models.Index(fields=["sent_on", "fire_date"], name="documents_reminder_due_idx"),
+        ]
+
+
+class TaskRun(models.Model):
+    """One execution of a tracked maintenance task (see letters.runs.tracked_run)."""
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("success", "Success"),
+        ("failure", "Failure"),
+    ]
+    task_name   = models.CharField(max_length=150)
+    status      = models.CharField(max_length=20, choices=STATUS_CHOICES, default="running")
+    started_at  = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(null=True, blank=True)
+
+    rows_updated          = models.IntegerField(default=0)
+    notifications_created = models.IntegerField(default=0)
+    query_count           = models.IntegerField(default=0)
+    peak_memory_kb        = models.IntegerField(null=True, blank=True)
+
+    result = models.TextField(blank=True)
+    error  = models.TextField(blank=True)
+
+    class Meta:
+        db_table = "documents_task_run"
+        ordering = ["-started_at"]
+        indexes = [
+            models.Index(fields=["task_name", "started_at"], name="documents_task_run_name_idx"),
+        ]
 
     def __str__(self):
-        return f"Comment by {self.user.username} on Letter {self.letter_id}"
\ No newline at end of file
+        return f"{self.task_name} @ {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class RetentionCheckpoint(models.Model):
+    """
+    Progress of a letters.retention policy run: the last primary key handled,
+    so an interrupted run resumes where it stopped. Reset to 0 once a run
+    reaches the end of the table.
+    """
+    policy     = models.CharField(max_length=50, unique=True)
+    last_pk    = models.BigIntegerField(default=0)
+    processed  = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "documents_retention_checkpoint"
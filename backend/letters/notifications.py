@@ -0,0 +1,131 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Letter, LetterComment, Notification
+from . import counters
+
+
+# SQL Server caps a statement at 2100 parameters, so IN lists are sent in chunks.
+IN_CLAUSE_CHUNK = 1000
+
+
+def chunked(items, size=IN_CLAUSE_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def letter_recipients(letter_id):
+    """
+    Users who follow a letter: its assignee, head and creator, plus everyone who
+    has commented on it (its watchers).
+    """
+    row = Letter.objects.filter(pk=letter_id).values_list("assigned_to_id", "assigned_head_id", "created_by_id").first()
+    recipients = set(row or ())
+    recipients.update(LetterComment.objects.filter(letter_id=letter_id).values_list("user_id", flat=True).distinct())
+    recipients.discard(None)
+    return recipients
+
+
+def notify_users(user_ids, letter_id, title, message, batch_size=500):
+    """One notification per user, `batch_size` rows per INSERT. Returns the number of new rows."""
+    created, _ = deliver(
+        [(user_id, letter_id, title, message) for user_id in sorted(user_ids)],
+        batch_size=batch_size,
+    )
+    return len(created)
+
+
+def notify(user_id, letter_id, title, message):
+    """A single notification, coalesced like any other."""
+    return deliver([(user_id, letter_id, title, message)])
+
+
+def _digest_message(count, message):
+    return f"{count} updates today. Latest: {message}"
+
+
+@transaction.atomic
+def deliver(candidates, batch_size=500):
+    """
+    Write notifications for `candidates`, an iterable of (user_id, letter_id,
+    title, message), coalescing instead of inserting where possible:
+
+    - a candidate matching an unread notification with the same user, letter
+      and title created less than LETTERS_NOTIFICATION_COALESCE_SECONDS ago
+      adds to that row's `count` and replaces its message;
+    - titles listed in LETTERS_NOTIFICATION_DIGEST_TITLES are collected into
+      one row per user and title for the whole (local) day, across letters.
+
+    Read notifications are never reopened. Two concurrent writers may still
+    both insert a first row; the next event merges into the newer one.
+    Returns (created, merged) lists of Notification objects.
+    """
+    window  = getattr(settings, "LETTERS_NOTIFICATION_COALESCE_SECONDS", 3600)
+    digest  = set(getattr(settings, "LETTERS_NOTIFICATION_DIGEST_TITLES", ()))
+    now     = timezone.now()
+    # Oldest unread row each kind of title may merge into; None never merges.
+    window_start = now - timedelta(seconds=window) if window > 0 else None
+    day_start    = None
+    if digest:
+        local     = timezone.localtime(now) if timezone.is_aware(now) else now
+        day_start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def key(user_id, letter_id, title):
+        return (user_id, None, title) if title in digest else (user_id, letter_id, title)
+
+    def cutoff(title):
+        return day_start if title in digest else window_start
+
+    groups = {}
+    for user_id, letter_id, title, message in candidates:
+        groups.setdefault(key(user_id, letter_id, title), []).append((letter_id, message))
+    if not groups:
+        return [], []
+
+    open_rows = {}
+    titles    = {title for _, _, title in groups if cutoff(title) is not None}
+    if titles:
+        since = min(cutoff(title) for title in titles)
+        for chunk in chunked({user_id for user_id, _, _ in groups}):
+            for row in (
+                Notification.objects.select_for_update()
+                .filter(user_id__in=chunk, title__in=titles, is_read=False, created_at__gte=since)
+                .order_by("created_at", "id")
+            ):
+                row_key = key(row.user_id, row.letter_id, row.title)
+                if row_key in groups and row.created_at >= cutoff(row.title):
+                    open_rows[row_key] = row   # newest wins
+
+    created, merged = [], []
+    for group_key, items in groups.items():
+        user_id, _, title  = group_key
+        letter_id, message = items[-1]
+        row = open_rows.get(group_key)
+        if row is None:
+            row = Notification(user_id=user_id, letter_id=letter_id, title=title, count=len(items))
+            created.append(row)
+            letters = {item[0] for item in items}
+        else:
+            row.count += len(items)
+            merged.append(row)
+            letters = {row.letter_id} | {item[0] for item in items}
+        if title in digest:
+            # A digest spanning several letters links to none of them.
+            row.letter_id = letter_id if len(letters) == 1 else None
+            row.message   = _digest_message(row.count, message) if row.count > 1 else message
+        else:
+            row.message = message
+
+    created = Notification.objects.bulk_create(created, batch_size=batch_size)
+    # bulk_create sends no post_save, so count the new rows here. A merged row
+    # was already unread, so merges leave the counters alone.
+    counters.created(created)
+    if merged:
+        # Seven parameters per row (three CASE pairs and the pk), so 250 rows
+        # stay under SQL Server's 2100.
+        Notification.objects.bulk_update(merged, ["count", "message", "letter"], batch_size=250)
+    return created, merged
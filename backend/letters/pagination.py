@@ -0,0 +1,80 @@
+import base64
+import json
+
+from django.db.models import F, Q
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE     = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    raw = json.dumps({"v": value, "id": pk}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data   = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return data["v"], int(data["id"])
+    except Exception:
+        raise InvalidCursor("Invalid cursor.")
+
+
+def parse_page_size(raw, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if raw in (None, ""):
+        return default
+    try:
+        size = int(raw)
+    except (TypeError, ValueError):
+        raise InvalidCursor("page_size must be an integer.")
+    return max(1, min(size, maximum))
+
+
+def keyset_paginate(queryset, field, descending=False, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Seek-method pagination over (field, pk). Each page is a single indexed range
+    scan, so page N costs the same as page 1. NULLs in `field` sort last in both
+    directions; the cursor value None means we are inside that NULL tail.
+    """
+    model_field = queryset.model._meta.get_field(field)
+    if model_field.null:
+        order_expr = F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+    else:
+        # Plain ORDER BY: SQL Server emulates NULLS LAST with a CASE
+        # expression, which no index can serve.
+        order_expr = f"-{field}" if descending else field
+    pk_order    = "-pk" if descending else "pk"
+    pk_seek     = "pk__lt" if descending else "pk__gt"
+    value_seek  = f"{field}__lt" if descending else f"{field}__gt"
+
+    if cursor:
+        value, last_pk = decode_cursor(cursor)
+        if value is None:
+            queryset = queryset.filter(**{f"{field}__isnull": True, pk_seek: last_pk})
+        else:
+            try:
+                value = model_field.to_python(value)
+            except Exception:
+                raise InvalidCursor("Invalid cursor.")
+            after = Q(**{value_seek: value}) | Q(**{field: value, pk_seek: last_pk})
+            if model_field.null:
+                after |= Q(**{f"{field}__isnull": True})
+            queryset = queryset.filter(after)
+
+    rows = list(queryset.order_by(order_expr, pk_order)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return rows, next_cursor
@@ -0,0 +1,151 @@
+"""
+Batched recurrence: the next N due dates for many letters at once.
+
+Letter.calculate_next_due_date steps one letter one occurrence at a time.
+next_occurrences() takes (key, base_date, rule) items and returns every
+occurrence in closed form, so it never loops occurrence by occurrence. It runs
+on NumPy datetime64 arrays when NumPy is installed and falls back to plain
+Python otherwise.
+Occurrence k is exactly what k chained calls of calculate_next_due_date
+return, including the month-end clamping that relativedelta carries forward:
+Jan 31 monthly gives Feb 28/29, then the 28th/29th from there on.
+"""
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # optional: the pure-Python path gives identical results
+    np = None
+
+
+# How a pattern moves from one occurrence to the next:
+#   days        fixed number of days
+#   months      fixed number of months, day of month clamped and carried forward
+#   month_day   next month, on a fixed day (clamped to the month's length)
+#   weekday     next month, on its first given weekday
+Rule = namedtuple("Rule", "kind step day weekday")
+
+
+@lru_cache(maxsize=1024)
+def compile_rule(recurrence_type, recurrence_value=None, day=None, weekday=None):
+    """
+    The Rule for one recurrence setting, or None for a letter that does not
+    recur. Arguments mirror the Letter fields; `day` and `weekday` come from
+    recurrence_metadata. Compiled rules are cached, since most letters share a
+    handful of settings.
+    """
+    interval = recurrence_value or 1
+    if recurrence_type == "daily":
+        return Rule("days", interval, None, None)
+    if recurrence_type == "weekly":
+        return Rule("days", 7 * interval, None, None)
+    if recurrence_type == "monthly":
+        return Rule("months", interval, None, None)
+    if recurrence_type == "yearly":
+        return Rule("months", 12 * interval, None, None)
+    if recurrence_type == "quarterly":
+        return Rule("months", 3, None, None)
+    if recurrence_type == "monthly_day":
+        day = 1 if day is None else day
+        if day < 1:
+            raise ValueError(f"monthly_day recurrence needs a day of at least 1, got {day}.")
+        return Rule("month_day", 1, day, None)
+    if recurrence_type == "first_weekday":
+        return Rule("weekday", 1, None, 0 if weekday is None else weekday)
+    return None
+
+
+def rule_for(letter):
+    meta = letter.recurrence_metadata or {}
+    return compile_rule(letter.recurrence_type, letter.recurrence_value, meta.get("day"), meta.get("weekday"))
+
+
+def _add_months(year, month, n):
+    index = year * 12 + month - 1 + n
+    return index // 12, index % 12 + 1
+
+
+def _python_occurrences(base, rule, count):
+    if rule.kind == "days":
+        return [base + timedelta(days=rule.step * k) for k in range(1, count + 1)]
+
+    result, day = [], base.day
+    for k in range(1, count + 1):
+        year, month = _add_months(base.year, base.month, rule.step * k)
+        last = calendar.monthrange(year, month)[1]
+        if rule.kind == "months":
+            day = min(day, last)
+            result.append(date(year, month, day))
+        elif rule.kind == "month_day":
+            result.append(date(year, month, min(rule.day, last)))
+        else:
+            first = date(year, month, 1)
+            result.append(first + timedelta(days=(rule.weekday - first.weekday()) % 7))
+    return result
+
+
+def _numpy_occurrences(bases, rule, count):
+    """(len(bases), count) datetime64[D] array for bases sharing one rule."""
+    days   = np.array(bases, dtype="datetime64[D]")[:, None]
+    steps  = np.arange(1, count + 1)[None, :] * rule.step
+    if rule.kind == "days":
+        return days + steps
+
+    months = days.astype("datetime64[M]") + steps
+    firsts = months.astype("datetime64[D]")
+    lasts  = ((months + 1).astype("datetime64[D]") - firsts).astype(int)
+    if rule.kind == "months":
+        base_day = (days - days.astype("datetime64[M]").astype("datetime64[D]")).astype(int) + 1
+        day = np.minimum.accumulate(np.minimum(lasts, base_day), axis=1)
+        return firsts + (day - 1)
+    if rule.kind == "month_day":
+        return firsts + (np.minimum(lasts, rule.day) - 1)
+    # 1970-01-01 was a Thursday (weekday 3).
+    first_weekday = (firsts.astype(int) + 3) % 7
+    return firsts + (rule.weekday - first_weekday) % 7
+
+
+def count_until(base, rule, end):
+    """
+    How many occurrences after `base` can fall on or before `end`. Exact for
+    day-based rules; month-based rules may include one that lands after
+    `end` within its last month, which callers filter out.
+    """
+    if base is None or rule is None or rule.step <= 0 or end <= base:
+        return 0
+    if rule.kind == "days":
+        return (end - base).days // rule.step
+    return ((end.year - base.year) * 12 + end.month - base.month) // rule.step
+
+
+def next_occurrences(items, count=1):
+    """
+    `items` is an iterable of (key, base_date, rule), with rules from
+    compile_rule() or rule_for(). Returns {key: [next `count` dates]}; keys
+    with no base date or no rule map to an empty list.
+    """
+    result, groups = {}, {}
+    for key, base, rule in items:
+        if base is None or rule is None:
+            result[key] = []
+        else:
+            groups.setdefault(rule, []).append((key, base))
+
+    for rule, members in groups.items():
+        if np is None:
+            for key, base in members:
+                result[key] = _python_occurrences(base, rule, count)
+            continue
+        grid = _numpy_occurrences([base for _, base in members], rule, count)
+        for (key, _), row in zip(members, grid.tolist()):
+            result[key] = row
+    return result
+
+
+def next_due_dates(letters):
+    """{letter pk: next due date or None} from each letter's due_date, like calculate_next_due_date()."""
+    occurrences = next_occurrences(((letter.pk, letter.due_date, rule_for(letter)) for letter in letters), 1)
+    return {pk: dates[0] if dates else None for pk, dates in occurrences.items()}
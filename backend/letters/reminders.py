@@ -0,0 +1,164 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Letter, LetterCycle, ReminderSchedule
+from .notifications import chunked, deliver
+
+
+# Days before the due date a "due soon" reminder fires, per letter priority.
+DEFAULT_REMINDER_OFFSETS = (1, 2, 3)
+
+
+def offsets_for(priority):
+    offsets = getattr(settings, "LETTERS_REMINDER_OFFSETS", {})
+    return tuple(offsets.get((priority or "").lower(), offsets.get("default", DEFAULT_REMINDER_OFFSETS)))
+
+
+def plan(letter_id, cycle_id, due_date, priority):
+    rows = [
+        ReminderSchedule(letter_id=letter_id, cycle_id=cycle_id, kind="due_soon", fire_date=due_date - timedelta(days=days))
+        for days in sorted(set(offsets_for(priority)))
+        if days > 0
+    ]
+    rows.append(ReminderSchedule(letter_id=letter_id, cycle_id=cycle_id, kind="due_today", fire_date=due_date))
+    rows.append(ReminderSchedule(letter_id=letter_id, cycle_id=cycle_id, kind="overdue", fire_date=due_date + timedelta(days=1)))
+    return rows
+
+
+def plan_letter(letter, cycles):
+    """Reminder rows for a letter given its cycles as (id, due_date, status)."""
+    if not letter.is_active or letter.status != "in-progress":
+        return []
+    if not cycles:
+        return plan(letter.pk, None, letter.due_date, letter.priority) if letter.due_date else []
+    rows = []
+    for cycle_id, due_date, status in cycles:
+        if status != "completed":
+            rows.extend(plan(letter.pk, cycle_id, due_date, letter.priority))
+    return rows
+
+
+def _key(row):
+    return (row.letter_id, row.cycle_id, row.kind, row.fire_date)
+
+
+def _replace(letter_ids, rows):
+    """
+    Swap the unsent reminders of `letter_ids` for `rows`. A planned reminder
+    that was already sent (same letter, cycle, kind and fire_date) is not
+    planned again; sent rows the new plan no longer has are dropped.
+    """
+    planned = {_key(row): row for row in rows}
+    sent, stale = set(), []
+    for chunk in chunked(letter_ids):
+        for pk, *key in (
+            ReminderSchedule.objects.filter(letter_id__in=chunk, sent_on__isnull=False)
+            .values_list("pk", "letter_id", "cycle_id", "kind", "fire_date")
+        ):
+            if tuple(key) in planned:
+                sent.add(tuple(key))
+            else:
+                stale.append(pk)
+        ReminderSchedule.objects.filter(letter_id__in=chunk, sent_on__isnull=True).delete()
+    for chunk in chunked(stale):
+        ReminderSchedule.objects.filter(pk__in=chunk).delete()
+    fresh = [row for key, row in planned.items() if key not in sent]
+    ReminderSchedule.objects.bulk_create(fresh, batch_size=1000)
+    return len(fresh)
+
+
+def reschedule_many(letters):
+    """
+    Replace the pending reminders of every letter in `letters` with a fresh
+    plan: one cycle read and one swap per chunk, however many letters there
+    are. Returns the number of reminders planned.
+    """
+    scheduled = 0
+    for chunk in chunked(letters):
+        cycles = {}
+        for letter_id, *cycle in (
+            LetterCycle.objects.filter(letter_id__in=[letter.pk for letter in chunk])
+            .values_list("letter_id", "id", "due_date", "status")
+        ):
+            cycles.setdefault(letter_id, []).append(tuple(cycle))
+        rows = []
+        for letter in chunk:
+            rows.extend(plan_letter(letter, cycles.get(letter.pk, [])))
+        scheduled += _replace([letter.pk for letter in chunk], rows)
+    return scheduled
+
+
+@transaction.atomic
+def reschedule(letter):
+    """Replace every pending reminder of `letter` with a fresh plan."""
+    reschedule_many([letter])
+
+
+def rebuild_schedule(batch_size=500):
+    ReminderSchedule.objects.exclude(letter__is_active=True, letter__status="in-progress").delete()
+    letters = Letter.objects.filter(is_active=True, status="in-progress").order_by("pk")
+    scheduled, last_pk = 0, 0
+    while True:
+        batch = list(letters.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return scheduled
+        with transaction.atomic():
+            scheduled += reschedule_many(batch)
+        last_pk = batch[-1].pk
+
+
+def _notice(ref_no, days_left):
+    if days_left < 0:
+        return "Letter Overdue", f"Letter {ref_no} is overdue by {-days_left} day(s)."
+    if days_left == 0:
+        return "Due Today", f"Letter {ref_no} is due today."
+    return "Due Soon", f"Letter {ref_no} is due in {days_left} day(s)."
+
+
+def fire_due_reminders(today, letter_range=None):
+    """
+    Send the reminders whose fire_date has arrived and mark them sent. When
+    the sweep skipped days, only the latest reminder per cycle is sent, worded
+    from today's distance to the due date. The sent rows are what keeps a
+    reminder from going out twice, so every offset of every cycle fires once.
+    `letter_range` (first, last) limits the sweep to one shard. Returns
+    (fired rows, notifications delivered).
+    """
+    pending = ReminderSchedule.objects.filter(sent_on__isnull=True, fire_date__lte=today)
+    if letter_range:
+        pending = pending.filter(letter_id__gte=letter_range[0], letter_id__lte=letter_range[1])
+    rows = list(
+        pending.values_list(
+            "pk", "fire_date", "letter_id", "cycle_id",
+            "letter__ref_no", "letter__status", "letter__is_active", "letter__due_date",
+            "letter__assigned_to_id", "letter__assigned_head_id", "letter__created_by_id",
+            "cycle__due_date", "cycle__status",
+        )
+        # Most pressing cycle first, so it words a letter's notification.
+        .order_by("letter_id", "cycle__due_date", "pk")
+    )
+
+    latest = {}
+    for row in rows:
+        key = (row[2], row[3])
+        if key not in latest or row[1] > latest[key][1]:
+            latest[key] = row
+
+    candidates = []
+    for (_, _, letter_id, _, ref_no, status, is_active, letter_due,
+         assignee_id, head_id, creator_id, cycle_due, cycle_status) in latest.values():
+        if not is_active or status != "in-progress" or cycle_status == "completed":
+            continue
+        due = cycle_due or letter_due
+        if due is None:
+            continue
+        title, message = _notice(ref_no, (due - today).days)
+        for user_id in {assignee_id, head_id, creator_id} - {None}:
+            candidates.append((user_id, letter_id, title, message))
+
+    created, merged = deliver(candidates)
+    for chunk in chunked([row[0] for row in rows]):
+        ReminderSchedule.objects.filter(pk__in=chunk).update(sent_on=today)
+    return len(rows), len(created) + len(merged)
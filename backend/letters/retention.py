@@ -0,0 +1,358 @@
+import gzip
+import json
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef, Q
+from django.utils import timezone
+
+from .models import ArchivedLetterCycle, Letter, LetterCycle, Log, Notification, RetentionCheckpoint, Tombstone
+from . import compaction, counters, versions
+from .summary import apply_deltas, key_for
+from .sync import cycle_tombstones
+
+
+DEFAULT_BATCH_SIZE = 1000   # well below SQL Server's ~5000-lock escalation threshold
+DEFAULT_SLEEP      = 0.1    # seconds between batches, so web requests get the locks in between
+SEGMENT_ROWS       = 50000
+PENDING_SUFFIX     = ".pending"
+
+
+class Policy:
+    """
+    What one retention policy removes and what it must fix up afterwards.
+    Subclasses set `model`, `default_days` and `default_archive`, and override
+    expired() and, when other tables depend on the rows, after_delete().
+    """
+    name            = None
+    model           = None
+    default_days    = None
+    default_archive = False
+
+    def __init__(self, days=None, archive=None):
+        config = getattr(settings, "LETTERS_RETENTION", {}).get(self.name, {})
+        self.days    = days if days is not None else config.get("days", self.default_days)
+        self.archive = archive if archive is not None else config.get("archive", self.default_archive)
+
+    def cutoff(self):
+        return timezone.now() - timedelta(days=self.days)
+
+    def expired(self, cutoff):
+        raise NotImplementedError
+
+    def after_delete(self, rows):
+        """Called inside the batch transaction with the deleted rows as dicts."""
+
+
+class NotificationPolicy(Policy):
+    name         = "notification"
+    model        = Notification
+    default_days = 30
+
+    def expired(self, cutoff):
+        return Notification.objects.filter(created_at__lt=cutoff)
+
+    def after_delete(self, rows):
+        unread = Counter(row["user_id"] for row in rows if not row["is_read"])
+        counters.adjust({user_id: -n for user_id, n in unread.items()})
+
+
+class LogPolicy(Policy):
+    name            = "log"
+    model           = Log
+    default_days    = 365
+    default_archive = True
+
+    def expired(self, cutoff):
+        return Log.objects.filter(created_at__lt=cutoff)
+
+    def after_delete(self, rows):
+        # A letter's history is cached under its scopes, like any other log change.
+        scopes = set()
+        for letter_id, assignee_id, head_id in Letter.objects.filter(
+            pk__in={row["letter_id"] for row in rows},
+        ).values_list("pk", "assigned_to_id", "assigned_head_id"):
+            scopes |= versions.letter_scopes(letter_id, assignee_id, head_id)
+        transaction.on_commit(lambda: versions.bump(scopes))
+
+
+def _cycles_removed(rows):
+    """Take deleted cycles (live or archived) out of the task summary and bump their letters' versions."""
+    letter_ids = {row["letter_id"] for row in rows}
+    letters = {
+        row[0]: row[1:]
+        for row in Letter.objects.filter(pk__in=letter_ids).values_list(
+            "pk", "assigned_to_id", "assigned_head_id", "department_id", "created_at", "is_active",
+        )
+    }
+    deltas = Counter()
+    for row in rows:
+        assignee_id, head_id, department_id, created_at, is_active = letters[row["letter_id"]]
+        if is_active:
+            deltas[key_for(assignee_id, head_id, department_id, row["status"], created_at)] -= 1
+    apply_deltas(deltas)
+
+    scopes = set()
+    for letter_id, (assignee_id, head_id, *_) in letters.items():
+        scopes |= versions.letter_scopes(letter_id, assignee_id, head_id)
+    transaction.on_commit(lambda: versions.bump(scopes))
+
+
+class CompletedCyclePolicy(Policy):
+    """
+    Completed cycles of recurring letters. A letter's newest cycle is always
+    kept: it drives the current-cycle rows and the next cycle number.
+    """
+    name            = "cycle"
+    model           = LetterCycle
+    default_days    = 730
+    default_archive = True
+
+    def expired(self, cutoff):
+        newer = LetterCycle.objects.filter(letter_id=OuterRef("letter_id"), cycle_no__gt=OuterRef("cycle_no"))
+        return LetterCycle.objects.filter(
+            Q(completed_at__lt=cutoff) | Q(completed_at__isnull=True, updated_at__lt=cutoff),
+            Exists(newer),
+            status="completed",
+        )
+
+    def after_delete(self, rows):
+        _cycles_removed(rows)
+        Tombstone.objects.bulk_create(cycle_tombstones(rows))
+
+
+class CycleCompactionPolicy(CompletedCyclePolicy):
+    """
+    The same cycles as CompletedCyclePolicy, but moved rather than dropped:
+    into documents_cycle_archive and the letter's CycleHistorySummary
+    (letters.compaction). Its shorter default age means it normally reaches
+    cycles first, leaving the "cycle" policy nothing to delete.
+    """
+    name            = "compact_cycle"
+    default_days    = 180
+    default_archive = False
+
+    def after_delete(self, rows):
+        compaction.fold(rows)
+
+
+class ArchivedCyclePolicy(Policy):
+    """Compacted cycles past their retention age; their history summary keeps counting them."""
+    name            = "archived_cycle"
+    model           = ArchivedLetterCycle
+    default_days    = 730
+    default_archive = True
+
+    def expired(self, cutoff):
+        return ArchivedLetterCycle.objects.filter(
+            Q(completed_at__lt=cutoff) | Q(completed_at__isnull=True, updated_at__lt=cutoff),
+        )
+
+    def after_delete(self, rows):
+        _cycles_removed(rows)
+
+
+# Run order matters: compaction moves old cycles before "cycle" would delete them.
+POLICIES = {
+    policy.name: policy
+    for policy in (NotificationPolicy, LogPolicy, CycleCompactionPolicy, CompletedCyclePolicy, ArchivedCyclePolicy)
+}
+
+
+def archive_dir():
+    return getattr(settings, "LETTERS_RETENTION_ARCHIVE_DIR", os.path.join(settings.BASE_DIR, "archive"))
+
+
+class SegmentWriter:
+    """
+    Appends batches to gzip-compressed JSONL segments named
+    <policy>-<run start>-<seq>.jsonl.gz, starting a new segment every
+    `segment_rows` rows. A batch is first staged, fsynced, in a
+    "<segment>.<first id>.pending" file, and only appended to the segment
+    (as its own gzip member) once the transaction deleting its rows has
+    committed. A rolled-back batch's staging file is discarded, so a retried
+    batch is archived exactly once; recover() settles files left by a crash.
+    """
+
+    def __init__(self, policy_name, directory=None, segment_rows=SEGMENT_ROWS):
+        self.policy_name  = policy_name
+        self.directory    = directory or archive_dir()
+        self.segment_rows = segment_rows
+        self.run_id       = timezone.now().strftime("%Y%m%dT%H%M%S")
+        self.seq          = 0
+        self.rows_in_seg  = 0
+        self.paths        = []
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{self.policy_name}-{self.run_id}-{seq:04d}.jsonl.gz")
+
+    def stage(self, rows):
+        """Write `rows` to a staging file and return its path; see commit() and discard()."""
+        if not self.paths or self.rows_in_seg >= self.segment_rows:
+            segment = self._path(self.seq + 1)
+        else:
+            segment = self.paths[-1]
+        pending = f"{segment}.{rows[0]['id']}{PENDING_SUFFIX}"
+        payload = "".join(json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows)
+        with gzip.open(pending, "wt", encoding="utf-8") as staged:
+            staged.write(payload)
+            staged.flush()
+            os.fsync(staged.fileno())
+        return pending
+
+    def commit(self, pending, rows):
+        segment = _promote(pending)
+        if segment not in self.paths:
+            self.seq += 1
+            self.rows_in_seg = 0
+            self.paths.append(segment)
+        self.rows_in_seg += rows
+
+    def discard(self, pending):
+        if os.path.exists(pending):
+            os.remove(pending)
+
+    def recover(self, model):
+        """
+        Settle staging files a crash left between delete and append: if none
+        of a file's rows are left in `model`'s table its delete committed and
+        the batch joins its segment, otherwise it rolled back and is dropped.
+        """
+        for filename in sorted(os.listdir(self.directory)):
+            if not (filename.startswith(f"{self.policy_name}-") and filename.endswith(PENDING_SUFFIX)):
+                continue
+            pending = os.path.join(self.directory, filename)
+            try:
+                with gzip.open(pending, "rt", encoding="utf-8") as staged:
+                    pks = [json.loads(line)["id"] for line in staged]
+            except (EOFError, OSError, ValueError):
+                # Cut off while staging, which is before the delete could commit.
+                pks = None
+            if pks and not model.objects.filter(pk__in=pks).exists():
+                _promote(pending)
+            else:
+                os.remove(pending)
+
+
+def _promote(pending):
+    """Append a staged batch to its segment and remove the staging file; returns the segment path."""
+    segment = pending[:-len(PENDING_SUFFIX)].rsplit(".", 1)[0]
+    with open(pending, "rb") as staged:
+        member = staged.read()
+    with open(segment, "ab") as target:
+        target.write(member)
+        target.flush()
+        os.fsync(target.fileno())
+    os.remove(pending)
+    return segment
+
+
+def read_archive(directory=None, policy=None, match=None):
+    """
+    Yield archived rows (dicts) from every segment in `directory`, oldest
+    segment first, optionally only one policy's and only rows where every
+    `match` field equals the given value (compared as strings).
+    """
+    directory = directory or archive_dir()
+    if not os.path.isdir(directory):
+        return
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".jsonl.gz"):
+            continue
+        if policy and not filename.startswith(f"{policy}-"):
+            continue
+        with gzip.open(os.path.join(directory, filename), "rt", encoding="utf-8") as segment:
+            for line in segment:
+                row = json.loads(line)
+                if match and any(str(row.get(field)) != str(value) for field, value in match.items()):
+                    continue
+                yield row
+
+
+def report(policy):
+    """Dry run: what `policy` would remove right now, without touching anything."""
+    cutoff  = policy.cutoff()
+    stats   = policy.expired(cutoff).aggregate(first_pk=Min("pk"), last_pk=Max("pk"))
+    count   = policy.expired(cutoff).count()
+    batch   = getattr(settings, "LETTERS_RETENTION_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    checkpoint = RetentionCheckpoint.objects.filter(policy=policy.name).values_list("last_pk", flat=True).first()
+    return {
+        "policy":     policy.name,
+        "days":       policy.days,
+        "cutoff":     cutoff.isoformat(),
+        "archive":    policy.archive,
+        "rows":       count,
+        "batches":    -(-count // batch),
+        "first_pk":   stats["first_pk"],
+        "last_pk":    stats["last_pk"],
+        "checkpoint": checkpoint or 0,
+    }
+
+
+def run(policy, batch_size=None, sleep=None, max_seconds=None, writer=None):
+    """
+    Delete (and archive, when the policy says so) expired rows in primary-key
+    batches of `batch_size`, each in its own short transaction, sleeping
+    `sleep` seconds between batches. Progress is checkpointed after every
+    batch, so a run stopped by `max_seconds` or a crash resumes from there.
+    Returns a dict with the rows removed and whether the table was finished.
+    """
+    batch_size = batch_size or getattr(settings, "LETTERS_RETENTION_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    sleep      = sleep if sleep is not None else getattr(settings, "LETTERS_RETENTION_SLEEP", DEFAULT_SLEEP)
+    fields     = [field.attname for field in policy.model._meta.concrete_fields]
+    cutoff     = policy.cutoff()
+    started    = time.monotonic()
+
+    checkpoint, _ = RetentionCheckpoint.objects.get_or_create(policy=policy.name)
+    if policy.archive and writer is None:
+        writer = SegmentWriter(policy.name)
+    if writer is not None:
+        writer.recover(policy.model)
+
+    removed = 0
+    while True:
+        pks = list(
+            policy.expired(cutoff).filter(pk__gt=checkpoint.last_pk)
+            .order_by("pk").values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            checkpoint.last_pk = 0
+            checkpoint.save(update_fields=["last_pk", "updated_at"])
+            return {"policy": policy.name, "removed": removed, "finished": True,
+                    "segments": writer.paths if writer else []}
+
+        pending = None
+        try:
+            with transaction.atomic():
+                # Re-read the rows locked, in the transaction that deletes them,
+                # so the archive and after_delete() see what was deleted (a
+                # notification may have been read since the batch was picked).
+                rows = list(
+                    policy.expired(cutoff).select_for_update().filter(pk__in=pks)
+                    .order_by("pk").values(*fields)
+                )
+                if writer is not None and rows:
+                    pending = writer.stage(rows)
+                    transaction.on_commit(lambda staged=pending, count=len(rows): writer.commit(staged, count))
+                policy.model.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+                policy.after_delete(rows)
+                checkpoint.last_pk    = pks[-1]
+                checkpoint.processed += len(rows)
+                checkpoint.save(update_fields=["last_pk", "processed", "updated_at"])
+        except Exception:
+            if pending is not None:
+                writer.discard(pending)
+            raise
+        removed += len(rows)
+
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            return {"policy": policy.name, "removed": removed, "finished": False,
+                    "segments": writer.paths if writer else []}
+        if sleep:
+            time.sleep(sleep)
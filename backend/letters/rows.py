@@ -0,0 +1,125 @@
+import json
+
+from django.db.models import Case, IntegerField, OuterRef, Prefetch, Q, Subquery, Value, When
+
+from .models import ArchivedLetterCycle, LetterCycle
+
+
+def with_list_cycles(letters, cycle_q=Q()):
+    """
+    Attach the cycles shown in the task lists as `letter.list_cycles`, fetched
+    for the whole page in one extra query instead of one per letter. Cycles
+    compacted into the archive come along as `letter.list_archived_cycles`,
+    so the rows still cover a letter's whole history.
+    """
+    return letters.prefetch_related(
+        Prefetch(
+            "cycles",
+            queryset=LetterCycle.objects.filter(cycle_q).order_by("cycle_no"),
+            to_attr="list_cycles",
+        ),
+        Prefetch(
+            "archived_cycles",
+            queryset=ArchivedLetterCycle.objects.filter(cycle_q).order_by("cycle_no"),
+            to_attr="list_archived_cycles",
+        ),
+    )
+
+
+def current_cycle_subquery(cycle_q=Q(), letter_ref="letter_id"):
+    """
+    pk of a letter's current cycle: the newest cycle that is still open, or the
+    newest cycle of all once every cycle is completed. Only cycles matching
+    `cycle_q` are considered, so list filters pick the row they asked for.
+    """
+    is_completed = Case(
+        When(status="completed", then=Value(1)),
+        default=Value(0), output_field=IntegerField(),
+    )
+    return Subquery(
+        LetterCycle.objects
+        .filter(cycle_q, letter_id=OuterRef(letter_ref))
+        .order_by(is_completed, "-cycle_no")
+        .values("pk")[:1]
+    )
+
+
+def with_current_cycle(letters, cycle_q=Q()):
+    """
+    Like with_list_cycles, but `letter.list_cycles` holds at most the current
+    cycle, chosen in the database, so a page has one row per letter however
+    many cycles a recurring letter has accumulated.
+    """
+    return letters.prefetch_related(
+        Prefetch(
+            "cycles",
+            queryset=LetterCycle.objects.filter(pk=current_cycle_subquery(cycle_q)),
+            to_attr="list_cycles",
+        )
+    )
+
+
+def letter_base_row(letter):
+    return {
+        "letter_id":        str(letter.id),
+        "id":               letter.id,
+        "ref_no":           letter.ref_no,
+        "subject":          letter.subject,
+        "department":       letter.department.name if letter.department else "N/A",
+        "category":         letter.category,
+        "priority":         letter.priority,
+        "file":             letter.file.url if letter.file else None,
+        "created_by":       letter.created_by.username    if letter.created_by    else "N/A",
+        "assigned_to":      letter.assigned_to.username   if letter.assigned_to   else None,
+        "assigned_head":    letter.assigned_head.username if letter.assigned_head else None,
+        "recurrence_type":  letter.recurrence_type,
+        "recurrence_value": letter.recurrence_value,
+        "created_at":       letter.created_at.isoformat(),
+    }
+
+
+def iter_letter_rows(letters):
+    """
+    One row per cycle, archived ones (`archived`: true) merged in by cycle_no;
+    letters without cycles yet produce a single row of their own.
+    """
+    for letter in letters:
+        base   = letter_base_row(letter)
+        cycles = [(cycle, False) for cycle in letter.list_cycles]
+        cycles += [(cycle, True) for cycle in getattr(letter, "list_archived_cycles", [])]
+        if cycles:
+            cycles.sort(key=lambda item: item[0].cycle_no)
+            for cycle, archived in cycles:
+                yield {
+                    **base,
+                    "_id":           str(cycle.id),
+                    "cycle_no":      cycle.cycle_no,
+                    "due_date":      cycle.due_date.isoformat(),
+                    "next_due_date": cycle.next_due_date.isoformat() if cycle.next_due_date else None,
+                    "status":        cycle.status,
+                    "archived":      archived,
+                }
+        else:
+            yield {
+                **base,
+                "_id":           str(letter.id),
+                "cycle_no":      1,
+                "due_date":      letter.due_date.isoformat() if letter.due_date else None,
+                "next_due_date": letter.next_due_date.isoformat() if letter.next_due_date else None,
+                "status":        letter.status,
+                "archived":      False,
+            }
+
+
+def build_letter_rows(letters):
+    return list(iter_letter_rows(letters))
+
+
+def stream_json_array(rows):
+    """Yield a JSON array piece by piece so the response never holds every row at once."""
+    yield "["
+    first = True
+    for row in rows:
+        yield ("" if first else ",") + json.dumps(row)
+        first = False
+    yield "]"
@@ -0,0 +1,115 @@
+import contextvars
+import time
+import tracemalloc
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Avg, Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import TaskRun
+
+
+_current_run = contextvars.ContextVar("letters_task_run", default=None)
+
+
+def record(rows_updated=0, notifications_created=0):
+    """Add to the counters of the tracked run in progress, if any."""
+    counters = _current_run.get()
+    if counters is not None:
+        counters["rows_updated"]          += rows_updated
+        counters["notifications_created"] += notifications_created
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def tracked_run(func):
+    """
+    Record a TaskRun for every call of `func`: timing, rows and notifications
+    reported through record(), queries issued on the default connection and,
+    with LETTERS_TASK_TRACE_MEMORY on, peak traced memory. Put it under
+    @shared_task so the Celery task name stays that of `func`.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        run = TaskRun.objects.create(task_name=f"{func.__module__}.{func.__name__}", started_at=timezone.now())
+
+        trace_memory = getattr(settings, "LETTERS_TASK_TRACE_MEMORY", True)
+        owns_trace   = trace_memory and not tracemalloc.is_tracing()
+        if owns_trace:
+            tracemalloc.start()
+
+        counters = {"rows_updated": 0, "notifications_created": 0}
+        token    = _current_run.set(counters)
+        queries  = _QueryCounter()
+        started  = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                result = func(*args, **kwargs)
+        except Exception as e:
+            run.status = "failure"
+            run.error  = repr(e)
+            raise
+        else:
+            run.status = "success"
+            run.result = str(result)[:1000]
+            return result
+        finally:
+            run.duration_ms = (time.perf_counter() - started) * 1000
+            _current_run.reset(token)
+            if trace_memory and tracemalloc.is_tracing():
+                run.peak_memory_kb = tracemalloc.get_traced_memory()[1] // 1024
+            if owns_trace:
+                tracemalloc.stop()
+            run.finished_at           = timezone.now()
+            run.query_count           = queries.count
+            run.rows_updated          = counters["rows_updated"]
+            run.notifications_created = counters["notifications_created"]
+            run.save()
+    return wrapper
+
+
+def run_trends(days=30, task_name=None):
+    """Per task and day: run count, failures, duration, rows, queries and memory."""
+    runs = TaskRun.objects.filter(started_at__gte=timezone.now() - timedelta(days=days))
+    if task_name:
+        runs = runs.filter(task_name=task_name)
+    return [
+        {
+            "task_name":       row["task_name"],
+            "day":             row["day"].isoformat(),
+            "runs":            row["runs"],
+            "failures":        row["failures"],
+            "avg_duration_ms": round(row["avg_duration_ms"] or 0, 1),
+            "max_duration_ms": round(row["max_duration_ms"] or 0, 1),
+            "rows_updated":    row["rows_updated"] or 0,
+            "notifications":   row["notifications"] or 0,
+            "avg_queries":     round(row["avg_queries"] or 0, 1),
+            "peak_memory_kb":  row["peak_memory_kb"],
+        }
+        for row in (
+            runs.annotate(day=TruncDate("started_at"))
+            .values("task_name", "day")
+            .annotate(
+                runs=Count("pk"),
+                failures=Count("pk", filter=Q(status="failure")),
+                avg_duration_ms=Avg("duration_ms"),
+                max_duration_ms=Max("duration_ms"),
+                rows_updated=Sum("rows_updated"),
+                notifications=Sum("notifications_created"),
+                avg_queries=Avg("query_count"),
+                peak_memory_kb=Max("peak_memory_kb"),
+            )
+            .order_by("task_name", "day")
+        )
+    ]
@@ -0,0 +1,209 @@
+import math
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, FloatField, IntegerField, Max, OuterRef, Q, Sum, Value, When
+from django.utils.html import escape
+
+from .models import Letter, LetterComment, SearchPosting
+
+
+INDEXED_FIELDS = ("ref_no", "subject", "category", "file_description")
+FIELD_WEIGHTS = {
+    "ref_no":           4.0,
+    "subject":          3.0,
+    "category":         1.5,
+    "file_description": 1.0,
+    "comment":          0.5,
+}
+MAX_TERM_LENGTH  = 64
+MAX_PREFIX_TERMS = 50
+STOPWORDS = {"a", "an", "and", "are", "for", "in", "is", "of", "on", "or", "the", "to", "with"}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in _TOKEN_RE.findall((text or "").lower())
+        if token not in STOPWORDS
+    ]
+
+
+def _ref_terms(ref_no):
+    # "HR/2024-15" also indexes as "hr202415" so pasted reference numbers match.
+    terms   = tokenize(ref_no)
+    compact = "".join(terms)
+    if len(terms) > 1 and compact:
+        terms.append(compact[:MAX_TERM_LENGTH])
+    return terms
+
+
+def letter_terms(letter, comments):
+    weights = Counter()
+    fields = {
+        "ref_no":           _ref_terms(letter.ref_no),
+        "subject":          tokenize(letter.subject),
+        "category":         tokenize(letter.category),
+        "file_description": tokenize(letter.file_description),
+        "comment":          [t for c in comments for t in tokenize(c)],
+    }
+    for field, terms in fields.items():
+        for term in terms:
+            weights[term] += FIELD_WEIGHTS[field]
+    return weights
+
+
+def _postings(letter, comments):
+    return [
+        SearchPosting(term=term, letter_id=letter.pk, weight=weight)
+        for term, weight in letter_terms(letter, comments).items()
+    ]
+
+
+@transaction.atomic
+def index_letter(letter):
+    comments = LetterComment.objects.filter(letter_id=letter.pk).values_list("comment", flat=True)
+    SearchPosting.objects.filter(letter_id=letter.pk).delete()
+    SearchPosting.objects.bulk_create(_postings(letter, comments))
+
+
+def rebuild_index(batch_size=500):
+    SearchPosting.objects.all().delete()
+    indexed = 0
+    letters = Letter.objects.order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(letters.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return indexed
+        comments = {}
+        for letter_id, text in (
+            LetterComment.objects.filter(letter__in=batch).values_list("letter_id", "comment")
+        ):
+            comments.setdefault(letter_id, []).append(text)
+        postings = []
+        for letter in batch:
+            postings.extend(_postings(letter, comments.get(letter.pk, [])))
+        with transaction.atomic():
+            SearchPosting.objects.bulk_create(postings, batch_size=1000)
+        indexed += len(batch)
+        last_pk = batch[-1].pk
+
+
+def _token_q(token, prefix):
+    # LIKE 'x%' with a constant prefix seeks the term index on SQL Server and
+    # matches whatever follows the prefix, whatever the collation sorts it as.
+    return Q(term__startswith=token) if prefix else Q(term=token)
+
+
+def _term_frequencies(terms_q, limit=None):
+    rows = (
+        SearchPosting.objects.filter(terms_q)
+        .values("term").annotate(df=Count("letter_id")).order_by("-df", "term")
+        .values_list("term", "df")
+    )
+    return dict(rows[:limit] if limit else rows)
+
+
+def search(letters, query, limit=20):
+    """
+    Rank letters in `letters` (a scoped queryset) against `query`. Every query
+    token must match; the last one also matches as a prefix so results show up
+    while the user is still typing. A prefix expands to at most
+    MAX_PREFIX_TERMS of its most common terms, on top of its exact match.
+    Score is sum(weight × idf) over matched terms.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+
+    term_df = _term_frequencies(Q(term__in=tokens))
+    if any(token not in term_df for token in tokens[:-1]):
+        return []
+    last     = tokens[-1]
+    expanded = _term_frequencies(_token_q(last, prefix=True) & ~Q(term=last), limit=MAX_PREFIX_TERMS)
+    token_terms = [[token] for token in tokens[:-1]]
+    token_terms.append(([last] if last in term_df else []) + list(expanded))
+    if not token_terms[-1]:
+        return []
+    term_df.update(expanded)
+
+    total = cache.get_or_set(
+        "letters:search:total", lambda: Letter.objects.filter(is_active=True).count(), 300,
+    ) or 1
+    idf   = {term: math.log(1 + total / df) for term, df in term_df.items()}
+
+    in_scope = Exists(letters.filter(pk=OuterRef("letter_id")))
+    if len(idf) == 1:
+        # One term, and every token matched it: (term, letter) is unique, so the
+        # score is weight × idf and the (term, -weight) index yields the top rows
+        # without aggregating the list.
+        (term, w), = idf.items()
+        ranked = (
+            SearchPosting.objects.filter(in_scope, term=term)
+            .order_by("-weight", "letter_id").values_list("letter_id", "weight")[:limit]
+        )
+        return _load(letters, [(letter_id, weight * w) for letter_id, weight in ranked], tokens)
+
+    score = Sum(Case(
+        *[When(term=term, then=F("weight") * Value(w)) for term, w in idf.items()],
+        default=Value(0.0), output_field=FloatField(),
+    ))
+    matched = {
+        f"m{i}": Max(Case(When(term__in=terms, then=Value(1)), default=Value(0), output_field=IntegerField()))
+        for i, terms in enumerate(token_terms)
+    }
+    ranked = (
+        SearchPosting.objects
+        .filter(in_scope, term__in=list(idf))
+        .values("letter_id")
+        .annotate(score=score, **matched)
+        .filter(**{name: 1 for name in matched})
+        .order_by("-score", "letter_id")[:limit]
+    )
+    return _load(letters, [(row["letter_id"], row["score"]) for row in ranked], tokens)
+
+
+def _load(letters, ranked, tokens):
+    by_id = letters.in_bulk([letter_id for letter_id, _ in ranked])
+    return [(by_id[letter_id], score, tokens) for letter_id, score in ranked if letter_id in by_id]
+
+
+def highlight(text, tokens, prefix_last=True):
+    """HTML-escape `text` and wrap matched words in <mark>."""
+    if not text:
+        return text
+    last = tokens[-1] if prefix_last and tokens else None
+
+    def matches(word):
+        lowered = word.lower()
+        return lowered in tokens or (last is not None and lowered.startswith(last))
+
+    out, pos = [], 0
+    for m in _TOKEN_RE.finditer(text):
+        out.append(escape(text[pos:m.start()]))
+        word = m.group(0)
+        out.append(f"<mark>{escape(word)}</mark>" if matches(word) else escape(word))
+        pos = m.end()
+    out.append(escape(text[pos:]))
+    return "".join(out)
+
+
+def matching_comments(letter_ids, tokens, per_letter=1):
+    """First comment per letter containing a query word, for result snippets."""
+    q = Q()
+    for token in tokens:
+        q |= Q(comment__icontains=token)
+    snippets = {}
+    for letter_id, text in (
+        LetterComment.objects.filter(q, letter_id__in=letter_ids)
+        .order_by("-created_at").values_list("letter_id", "comment")
+    ):
+        bucket = snippets.setdefault(letter_id, [])
+        if len(bucket) < per_letter:
+            bucket.append(text)
+    return snippets
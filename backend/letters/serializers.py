@@ -3,7 +3,8 @@ from django.utils import timezone
 from datetime import date as date_type
 import re, json
 
-from .models import Letter, Notification, Log, LetterCycle, Category, LetterComment
+from .models import Letter, Notification, Log, LetterCycle, ArchivedLetterCycle, Category, LetterComment
+from .recurrence import next_due_dates
 from department.models import Department
 
 
@@ -30,6 +31,14 @@ ALLOWED_FILE_EXTENSIONS = {".pdf", ".docx", ".doc", ".jpg", ".jpeg", ".png"}
 MAX_FILE_SIZE_MB = 5
 
 
+class LetterListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Work out the missing next due dates for the whole page in one batch.
+        letters = list(data.all() if hasattr(data, "all") else data)
+        self.next_due_dates = next_due_dates([letter for letter in letters if not letter.next_due_date])
+        return super().to_representation(letters)
+
+
 class LetterSerializer(serializers.ModelSerializer):
     department_name    = serializers.CharField(source="department.name",          read_only=True)
     assigned_to_name   = serializers.CharField(source="assigned_to.username",   read_only=True)
@@ -41,6 +50,7 @@ class LetterSerializer(serializers.ModelSerializer):
     class Meta:
         model  = Letter
         fields = "__all__"
+        list_serializer_class = LetterListSerializer
         extra_kwargs = {
             "department":    {"required": True},
             "assigned_to":   {"write_only": True, "required": False},
@@ -120,7 +130,8 @@ class LetterSerializer(serializers.ModelSerializer):
         data["created_by_name"]    = instance.created_by.username    if instance.created_by     else None
 
         if not instance.next_due_date:
-            next_due = instance.calculate_next_due_date()
+            batch = getattr(self.parent, "next_due_dates", None)
+            next_due = batch[instance.pk] if batch is not None else instance.calculate_next_due_date()
             data["next_due_date"] = next_due.isoformat() if next_due else None
 
         return data
@@ -133,6 +144,13 @@ class LetterCycleSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class ArchivedLetterCycleSerializer(serializers.ModelSerializer):
+    """Same shape as LetterCycleSerializer, for cycles moved out by compaction."""
+    class Meta:
+        model  = ArchivedLetterCycle
+        exclude = ["archived_at"]
+
+
 class LogSerializer(serializers.ModelSerializer):
     class Meta:
         model  = Log
@@ -141,16 +159,22 @@ class LogSerializer(serializers.ModelSerializer):
 
 class NotificationSerializer(serializers.ModelSerializer):
     time_ago  = serializers.SerializerMethodField()
-    user_name = serializers.CharField(source="user.username", read_only=True)
+    user_name = serializers.SerializerMethodField()
 
     class Meta:
         model  = Notification
         fields = [
             "id", "user", "user_name", "letter",
-            "title", "message", "is_read", "created_at", "time_ago",
+            "title", "message", "count", "is_read", "created_at", "time_ago",
         ]
         read_only_fields = ["created_at"]
 
+    def get_user_name(self, obj):
+        # An inbox belongs to one user: pass context={"user_name": ...} to skip the join per row.
+        if "user_name" in self.context:
+            return self.context["user_name"]
+        return obj.user.username
+
     def get_time_ago(self, obj):
         diff = timezone.now() - obj.created_at
         if diff.days:
@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Letter, LetterCycle, LetterComment, Log, Notification, Tombstone
+from . import counters, reminders, search, versions
+from .authentication import user_cache
+
+User = get_user_model()
+
+
+def _tracked_state(instance):
+    return {
+        "assigned_to_id":   instance.__dict__.get("assigned_to_id"),
+        "assigned_head_id": instance.__dict__.get("assigned_head_id"),
+        "is_active":        instance.__dict__.get("is_active"),
+        "search_text":      tuple(instance.__dict__.get(f) for f in search.INDEXED_FIELDS),
+        "reminder_state":   tuple(instance.__dict__.get(f) for f in ("due_date", "priority", "status", "is_active")),
+    }
+
+
+@receiver(post_init, sender=Letter)
+def remember_letter_state(sender, instance, **kwargs):
+    # Reassigning or deactivating a letter must also reach the scopes it is leaving.
+    instance._loaded_state = _tracked_state(instance)
+
+
+def _bump_on_commit(scopes):
+    # After commit, so no reader can pair the new version with the old rows
+    # and cache that pair under the new ETag.
+    transaction.on_commit(lambda: versions.bump(scopes))
+
+
+def _write_tombstones(instance, loaded, deleted):
+    tombstones = []
+    if deleted or (loaded["is_active"] and not instance.is_active):
+        tombstones.append(Tombstone(
+            object_type="letter", object_id=instance.pk, letter_id=instance.pk,
+            assignee_id=loaded["assigned_to_id"] or instance.assigned_to_id,
+            head_id=loaded["assigned_head_id"] or instance.assigned_head_id,
+        ))
+    elif instance.is_active:
+        for field in ("assigned_to_id", "assigned_head_id"):
+            old = loaded[field]
+            if old and old != getattr(instance, field):
+                tombstones.append(Tombstone(
+                    object_type="letter", object_id=instance.pk, letter_id=instance.pk, user_id=old,
+                ))
+    if tombstones:
+        Tombstone.objects.bulk_create(tombstones)
+
+
+@receiver(post_save, sender=Letter)
+@receiver(post_delete, sender=Letter)
+def letter_changed(sender, instance, created=False, **kwargs):
+    loaded  = getattr(instance, "_loaded_state", None) or _tracked_state(instance)
+    deleted = kwargs["signal"] is post_delete
+
+    scopes = versions.letter_scopes(instance.pk, instance.assigned_to_id, instance.assigned_head_id)
+    scopes |= versions.letter_scopes(instance.pk, loaded["assigned_to_id"], loaded["assigned_head_id"])
+    _bump_on_commit(scopes)
+
+    if not created:
+        _write_tombstones(instance, loaded, deleted)
+    current = _tracked_state(instance)
+    if not deleted and (created or loaded["search_text"] != current["search_text"]):
+        search.index_letter(instance)
+    if not deleted and (created or loaded["reminder_state"] != current["reminder_state"]):
+        reminders.reschedule(instance)
+    instance._loaded_state = current
+
+
+# Only saves are hooked for cycles and logs: a post_delete receiver would stop
+# Django from fast-deleting them in bulk, so bulk deleters bump the scopes themselves.
+@receiver(post_save, sender=LetterCycle)
+@receiver(post_save, sender=Log)
+def bump_letter_child_versions(sender, instance, **kwargs):
+    letter = instance._state.fields_cache.get("letter")
+    _bump_on_commit(versions.scopes_for_letter_id(instance.letter_id, letter))
+
+
+@receiver(post_save, sender=LetterCycle)
+def reschedule_cycle_reminders(sender, instance, **kwargs):
+    reminders.reschedule(instance.letter)
+
+
+@receiver(post_save, sender=LetterComment)
+def index_comment(sender, instance, **kwargs):
+    search.index_letter(instance.letter)
+
+
+@receiver(post_save, sender=Notification)
+def notification_created(sender, instance, created, **kwargs):
+    if created:
+        counters.created([instance])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_version(sender, instance, **kwargs):
+    # Dropped now for this transaction's own requests, and again after commit
+    # in case another request cached the old row in between.
+    user_id = instance.pk
+    user_cache.invalidate_user(user_id)
+
+    def committed():
+        versions.bump({f"user:{user_id}"})
+        user_cache.invalidate_user(user_id)
+    transaction.on_commit(committed)
@@ -0,0 +1,89 @@
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+
+from .models import ArchivedLetterCycle, LetterCycle
+
+
+ACTIVE_EXCLUDED_STATUSES = ("pending", "draft")
+
+
+def _recurring_q(prefix=""):
+    return (
+        Q(**{f"{prefix}recurrence_type__isnull": False})
+        & ~Q(**{f"{prefix}recurrence_type__in": ("", "none", "null")})
+        & Q(**{f"{prefix}recurrence_value__gt": 0})
+    )
+
+
+def _row_sources(letters):
+    """
+    Counts are per cycle, live or compacted into the archive, or one for a
+    letter that has no cycles yet, which is what the list endpoints return row
+    for row with `cycles=all`. Each source is aggregated separately and summed.
+    """
+    pks      = letters.values("pk")
+    cycles   = LetterCycle.objects.filter(letter__in=pks)
+    archived = ArchivedLetterCycle.objects.filter(letter__in=pks)
+    uncycled = letters.filter(
+        ~Exists(LetterCycle.objects.filter(letter=OuterRef("pk"))),
+        ~Exists(ArchivedLetterCycle.objects.filter(letter=OuterRef("pk"))),
+    )
+    return [(cycles, "letter__"), (archived, "letter__"), (uncycled, "")]
+
+
+def letter_stats(letters, summary_rows, today=None):
+    """
+    Status, department and monthly buckets come from the maintained TaskSummary
+    rows (already scoped by the caller), which count archived cycles too. The
+    date-relative tiles (upcoming / overdue) depend on today and the recurring
+    tile on letter fields, so those are aggregated from the cycle tables,
+    archive included.
+    """
+    today       = today or date.today()
+    month_start = today.replace(day=1) - relativedelta(months=11)
+
+    status_counts = {}
+    departments   = {}
+    monthly       = {}
+
+    grouped = (
+        summary_rows.filter(count__gt=0)
+        .values("department__name", "status", "month")
+        .annotate(n=Sum("count")).order_by()
+    )
+    for entry in grouped:
+        name   = entry["department__name"] or "N/A"
+        status = entry["status"]
+        status_counts[status] = status_counts.get(status, 0) + entry["n"]
+        bucket = departments.setdefault(name, {"department": name, "total": 0, "status_counts": {}})
+        bucket["total"] += entry["n"]
+        bucket["status_counts"][status] = bucket["status_counts"].get(status, 0) + entry["n"]
+        if entry["month"] >= month_start:
+            key = entry["month"].strftime("%Y-%m")
+            monthly[key] = monthly.get(key, 0) + entry["n"]
+
+    totals = {"total": sum(status_counts.values()), "upcoming": 0, "overdue": 0, "recurring": 0}
+    for rows, letter_prefix in _row_sources(letters):
+        active = ~Q(status__in=ACTIVE_EXCLUDED_STATUSES) & ~Q(status="completed")
+        agg = rows.aggregate(
+            upcoming=Count("pk", filter=active & Q(due_date__gt=today)),
+            overdue=Count("pk", filter=active & Q(due_date__lt=today)),
+            recurring=Count(
+                "pk",
+                filter=~Q(status__in=ACTIVE_EXCLUDED_STATUSES) & _recurring_q(letter_prefix),
+            ),
+        )
+        for key in ("upcoming", "overdue", "recurring"):
+            totals[key] += agg[key] or 0
+
+    months = [
+        (month_start + relativedelta(months=i)).strftime("%Y-%m") for i in range(12)
+    ]
+    return {
+        **totals,
+        "status_counts": status_counts,
+        "monthly":       [{"month": m, "count": monthly.get(m, 0)} for m in months],
+        "departments":   sorted(departments.values(), key=lambda d: d["department"]),
+    }
@@ -0,0 +1,156 @@
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef
+from django.db.models.functions import TruncMonth
+
+from .models import ArchivedLetterCycle, Letter, LetterCycle, TaskSummary
+
+
+KEY_FIELDS = ("assignee_id", "head_id", "department_id", "status", "month")
+
+_pending = contextvars.ContextVar("letters_summary_pending", default=None)
+
+
+def _month(value):
+    return date(value.year, value.month, 1)
+
+
+def summary_key(letter, status):
+    return key_for(letter.assigned_to_id, letter.assigned_head_id, letter.department_id, status, letter.created_at)
+
+
+def key_for(assignee_id, head_id, department_id, status, created_at):
+    return (assignee_id, head_id, department_id, status, _month(created_at))
+
+
+def snapshot(letter):
+    """
+    Summary rows a letter contributes right now: one per cycle, live or
+    compacted, or one for the letter itself while it has no cycles. Inactive
+    (deleted) letters contribute nothing.
+    """
+    if not letter.pk or not letter.is_active:
+        return Counter()
+    statuses = list(LetterCycle.objects.filter(letter_id=letter.pk).values_list("status", flat=True))
+    statuses += ArchivedLetterCycle.objects.filter(letter_id=letter.pk).values_list("status", flat=True)
+    if not statuses:
+        statuses = [letter.status]
+    return Counter(summary_key(letter, status) for status in statuses)
+
+
+def _lock_order(item):
+    # Every writer touches summary rows in the same order, so concurrent
+    # sweep shards queue on each other's row locks instead of deadlocking.
+    return [(value is None, value if value is not None else 0) for value in item[0]]
+
+
+def apply_deltas(deltas):
+    pending = _pending.get()
+    if pending is not None:
+        pending.update(deltas)
+        return
+    for key, delta in sorted(deltas.items(), key=_lock_order):
+        if not delta:
+            continue
+        lookup  = dict(zip(KEY_FIELDS, key))
+        updated = TaskSummary.objects.filter(**lookup).update(count=F("count") + delta)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                TaskSummary.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # Another writer created the row first.
+            TaskSummary.objects.filter(**lookup).update(count=F("count") + delta)
+
+
+@contextmanager
+def deferred():
+    """
+    Collect every apply_deltas() call made inside the block and apply their
+    sum once, in lock order, when it exits without an error. Long batch
+    transactions use it to take summary row locks once, at the end.
+    """
+    pending = Counter()
+    token   = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    apply_deltas(pending)
+
+
+def sync(letter, before=None):
+    """
+    Apply the difference between an earlier snapshot() and the letter's current
+    state. Leave `before` out for a letter that was just created.
+    """
+    deltas = Counter(snapshot(letter))
+    deltas.subtract(before or Counter())
+    apply_deltas(deltas)
+
+
+def compute():
+    """Authoritative counts straight from documents / documents_cycle / documents_cycle_archive."""
+    counts = Counter()
+    sources = [
+        (
+            LetterCycle.objects.filter(letter__is_active=True),
+            ("letter__assigned_to_id", "letter__assigned_head_id", "letter__department_id", "status"),
+            "letter__created_at",
+        ),
+        (
+            ArchivedLetterCycle.objects.filter(letter__is_active=True),
+            ("letter__assigned_to_id", "letter__assigned_head_id", "letter__department_id", "status"),
+            "letter__created_at",
+        ),
+        (
+            Letter.objects.filter(is_active=True).filter(
+                ~Exists(LetterCycle.objects.filter(letter=OuterRef("pk")))
+            ),
+            ("assigned_to_id", "assigned_head_id", "department_id", "status"),
+            "created_at",
+        ),
+    ]
+    for rows, fields, created_field in sources:
+        grouped = (
+            rows.annotate(month=TruncMonth(created_field))
+            .values(*fields, "month").annotate(n=Count("pk")).order_by()
+        )
+        for entry in grouped:
+            key = tuple(entry[f] for f in fields) + (_month(entry["month"]),)
+            counts[key] += entry["n"]
+    return counts
+
+
+def stored():
+    return Counter({
+        tuple(row[f] for f in KEY_FIELDS): row["count"]
+        for row in TaskSummary.objects.values(*KEY_FIELDS, "count")
+        if row["count"]
+    })
+
+
+def drift():
+    """{key: (stored, expected)} for every key where the table disagrees with the source tables."""
+    expected, table = compute(), stored()
+    return {
+        key: (table.get(key, 0), expected.get(key, 0))
+        for key in set(expected) | set(table)
+        if table.get(key, 0) != expected.get(key, 0)
+    }
+
+
+@transaction.atomic
+def rebuild():
+    counts = compute()
+    TaskSummary.objects.all().delete()
+    TaskSummary.objects.bulk_create(
+        [TaskSummary(count=n, **dict(zip(KEY_FIELDS, key))) for key, n in counts.items() if n],
+        batch_size=500,
+    )
+    return len(counts)
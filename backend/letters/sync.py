@@ -0,0 +1,135 @@
+import base64
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Letter, LetterComment, LetterCycle, Tombstone
+from .rows import letter_base_row
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def encode_sync_token(moment):
+    return base64.urlsafe_b64encode(moment.isoformat().encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_sync_token(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return datetime.fromisoformat(base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii"))
+    except Exception:
+        raise InvalidSyncToken("Invalid sync token.")
+
+
+def cycle_tombstones(rows):
+    """Tombstones for removed cycles (value dicts), scoped to their letters' assignee and head."""
+    owners = {
+        pk: (assignee_id, head_id)
+        for pk, assignee_id, head_id in Letter.objects.filter(pk__in={row["letter_id"] for row in rows})
+        .values_list("pk", "assigned_to_id", "assigned_head_id")
+    }
+    tombstones = []
+    for row in rows:
+        assignee_id, head_id = owners.get(row["letter_id"], (None, None))
+        tombstones.append(Tombstone(
+            object_type="cycle", object_id=row["id"], letter_id=row["letter_id"],
+            assignee_id=assignee_id, head_id=head_id,
+        ))
+    return tombstones
+
+
+def visible_tombstones(user):
+    """
+    Tombstones meant for `user`: their own, plus shared ones for letters they
+    could see, by the same role split as the letter lists. Nobody learns the
+    ids of letters outside their scope.
+    """
+    shared = Q(user_id__isnull=True)
+    if user.is_superuser and user.is_staff:
+        shared &= Q(head_id=user.id)
+    elif not user.is_superuser:
+        shared &= Q(assignee_id=user.id)
+    return Tombstone.objects.filter(shared | Q(user_id=user.id))
+
+
+def _letter_row(letter):
+    return {
+        **letter_base_row(letter),
+        "status":        letter.status,
+        "due_date":      letter.due_date.isoformat() if letter.due_date else None,
+        "next_due_date": letter.next_due_date.isoformat() if letter.next_due_date else None,
+        "updated_at":    letter.updated_at.isoformat(),
+    }
+
+
+def _cycle_row(cycle):
+    return {
+        "id":            cycle.id,
+        "letter_id":     cycle.letter_id,
+        "cycle_no":      cycle.cycle_no,
+        "due_date":      cycle.due_date.isoformat(),
+        "next_due_date": cycle.next_due_date.isoformat() if cycle.next_due_date else None,
+        "status":        cycle.status,
+        "completed_at":  cycle.completed_at.isoformat() if cycle.completed_at else None,
+        "updated_at":    cycle.updated_at.isoformat(),
+    }
+
+
+def _comment_row(comment):
+    return {
+        "id":         comment.id,
+        "letter_id":  comment.letter_id,
+        "user_id":    comment.user_id,
+        "username":   comment.user.username,
+        "comment":    comment.comment,
+        "created_at": comment.created_at.isoformat(),
+    }
+
+
+def changes_since(letters, user, since=None):
+    """
+    Everything in `letters` (an already scoped, active-only queryset) that
+    changed after `since`, plus tombstones for what the client should drop.
+    With since=None this is a full snapshot to seed a fresh client.
+
+    The returned token is taken before reading and moved back by
+    LETTERS_SYNC_OVERLAP_SECONDS, so rows committed by transactions that were
+    still open while we read are picked up on the next poll. Clients apply
+    rows as upserts, so the occasional repeat is harmless.
+    """
+    overlap = getattr(settings, "LETTERS_SYNC_OVERLAP_SECONDS", 5)
+    started = timezone.now()
+
+    letter_ids = letters.values("pk")
+    changed_letters = letters
+    cycles   = LetterCycle.objects.filter(letter__in=letter_ids)
+    comments = LetterComment.objects.filter(letter__in=letter_ids).select_related("user")
+    deleted  = visible_tombstones(user)
+
+    if since is not None:
+        changed_letters = changed_letters.filter(updated_at__gt=since)
+        cycles   = cycles.filter(updated_at__gt=since)
+        comments = comments.filter(created_at__gt=since)
+        deleted  = deleted.filter(deleted_at__gt=since)
+    else:
+        deleted = deleted.none()
+
+    return {
+        "letters":  [_letter_row(l) for l in changed_letters.order_by("updated_at", "pk")],
+        "cycles":   [_cycle_row(c) for c in cycles.order_by("updated_at", "pk")],
+        "comments": [_comment_row(c) for c in comments.order_by("created_at", "pk")],
+        "deleted":  [
+            {
+                "type":       t.object_type,
+                "id":         t.object_id,
+                "letter_id":  t.letter_id,
+                "deleted_at": t.deleted_at.isoformat(),
+            }
+            for t in deleted.order_by("deleted_at", "pk")
+        ],
+        "next_token": encode_sync_token(started - timedelta(seconds=overlap)),
+    }
@@ -1,80 +1,314 @@
-from celery import shared_task
+from celery import group, shared_task
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date
 from django.contrib.auth import get_user_model
 
-from .models import Letter, LetterCycle, Log, Notification
+from .models import Letter, LetterCycle, Log
+from .notifications import chunked, deliver, letter_recipients, notify_users
+from .recurrence import count_until, next_occurrences, rule_for
+from .runs import record, tracked_run
+from .summary import apply_deltas, key_for
+from . import counters, reminders, retention, summary, versions
+from collections import Counter
 import logging
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
-@shared_task
-def process_letters_and_recurrence():
-    today = timezone.now().date()
-
-    letters = (
-        Letter.objects
-        .filter(status="in-progress")
-        .exclude(due_date__isnull=True)
-        .select_related("created_by", "assigned_to", "assigned_head")
-        .prefetch_related("cycles")
+def mark_overdue_cycles(today, letter_range=None):
+    """
+    Flip every in-progress cycle past its due date to overdue with a single
+    UPDATE, log each flip and keep the task summary and list versions in step.
+    `letter_range` (first, last) limits the sweep to one shard of letter ids.
+    Returns the number of cycles flipped.
+    """
+    overdue = LetterCycle.objects.filter(
+        status="in-progress", due_date__lt=today,
+        letter__status="in-progress", letter__due_date__isnull=False,
     )
+    if letter_range:
+        overdue = overdue.filter(letter_id__gte=letter_range[0], letter_id__lte=letter_range[1])
+    with transaction.atomic():
+        # Locked so the UPDATE below flips exactly the rows that get logged.
+        rows = list(overdue.select_for_update().values_list(
+            "letter_id", "cycle_no",
+            "letter__assigned_to_id", "letter__assigned_head_id",
+            "letter__department_id", "letter__created_at", "letter__is_active",
+        ))
+        if not rows:
+            return 0
+        overdue.update(status="overdue", updated_at=timezone.now())
+
+        Log.objects.bulk_create(
+            [
+                Log(
+                    letter_id=letter_id,
+                    action="overdue",
+                    message=f"Cycle {cycle_no} automatically marked overdue.",
+                )
+                for letter_id, cycle_no, *_ in rows
+            ],
+            batch_size=500,
+        )
 
-    logger.info(f"Processing {letters.count()} in-progress letters")
+        summary_deltas = Counter()
+        for _, _, assignee_id, head_id, department_id, created_at, is_active in rows:
+            if not is_active:
+                continue
+            summary_deltas[key_for(assignee_id, head_id, department_id, "in-progress", created_at)] -= 1
+            summary_deltas[key_for(assignee_id, head_id, department_id, "overdue", created_at)]     += 1
+        apply_deltas(summary_deltas)
 
+    scopes = set()
+    for letter_id, _, assignee_id, head_id, *_ in rows:
+        scopes |= versions.letter_scopes(letter_id, assignee_id, head_id)
+    # After commit, so no reader can pair the new version with the old rows.
+    transaction.on_commit(lambda: versions.bump(scopes))
+    return len(rows)
+
+
+def _missed_cycles(letters, today):
+    """
+    (letter, [LetterCycle, ...]) for every letter whose next cycle is due by
+    `today`: the cycles from its newest cycle's next_due_date up to today,
+    each carrying the occurrence after it as next_due_date.
+    """
+    # One engine call per occurrence count, since it returns a fixed number.
+    by_count = {}
     for letter in letters:
+        rule = rule_for(letter)
+        by_count.setdefault(count_until(letter.next_due, rule, today) + 1, []).append((letter, rule))
+
+    plans = []
+    for count, members in by_count.items():
+        later = next_occurrences(((letter.pk, letter.next_due, rule) for letter, rule in members), count)
+        for letter, _ in members:
+            dates  = [letter.next_due] + later[letter.pk]
+            cycles = [
+                LetterCycle(
+                    letter_id=letter.pk, cycle_no=letter.last_cycle_no + i + 1,
+                    due_date=due, next_due_date=dates[i + 1] if i + 1 < len(dates) else None,
+                    status="overdue" if due < today else "in-progress",
+                )
+                for i, due in enumerate(dates)
+                if due <= today
+            ]
+            if cycles:
+                plans.append((letter, cycles))
+    plans.sort(key=lambda plan: plan[0].pk)
+    return plans
 
-        overdue_cycles = letter.cycles.filter(status="in-progress", due_date__lt=today)
-        for cycle in overdue_cycles:
-            cycle.status = "overdue"
-            cycle.save(update_fields=["status"])
-            Log.objects.create(
-                letter=letter,
-                action="overdue",
-                message=f"Cycle {cycle.cycle_no} automatically marked overdue.",
+
+def generate_missed_cycles(today, letter_range=None, batch_size=500):
+    """
+    Catch up recurring letters whose newest cycle was never completed, or was
+    completed late: every occurrence from that cycle's next_due_date up to
+    `today` gets its cycle (overdue when already past) and a "recurred" log,
+    inserted with bulk_create in one transaction. The unique (letter,
+    cycle_no) key guards against a completion racing the sweep: letters that
+    gained a cycle meanwhile are skipped and picked up again next run.
+    Returns the number of cycles created.
+    """
+    newest  = LetterCycle.objects.filter(letter_id=OuterRef("pk")).order_by("-cycle_no")
+    letters = (
+        Letter.objects.filter(is_active=True, status="in-progress", recurrence_type__isnull=False)
+        .exclude(recurrence_type="")
+        .annotate(
+            last_cycle_no=Subquery(newest.values("cycle_no")[:1]),
+            last_due=Subquery(newest.values("due_date")[:1]),
+            next_due=Subquery(newest.values("next_due_date")[:1]),
+        )
+        .filter(next_due__isnull=False, next_due__lte=today)
+    )
+    if letter_range:
+        letters = letters.filter(pk__gte=letter_range[0], pk__lte=letter_range[1])
+
+    with transaction.atomic():
+        plans = _missed_cycles(letters, today)
+        if not plans:
+            return 0
+
+        # Idempotency: drop letters whose newest cycle changed since it was read.
+        newest_no = {}
+        for chunk in chunked([letter.pk for letter, _ in plans]):
+            newest_no.update(
+                LetterCycle.objects.filter(letter_id__in=chunk)
+                .values("letter_id").annotate(top=Max("cycle_no")).order_by()
+                .values_list("letter_id", "top")
             )
+        plans = [(letter, cycles) for letter, cycles in plans if newest_no.get(letter.pk) == letter.last_cycle_no]
+        if not plans:
+            return 0
+
+        try:
+            with transaction.atomic():
+                LetterCycle.objects.bulk_create([c for _, cycles in plans for c in cycles], batch_size=batch_size)
+        except IntegrityError:
+            # A cycle was completed between the check and the insert. Insert
+            # letter by letter instead, each under its own savepoint, so only
+            # the letters that collided are skipped; the next sweep recomputes
+            # them from their new state.
+            inserted = []
+            for letter, cycles in plans:
+                try:
+                    with transaction.atomic():
+                        LetterCycle.objects.bulk_create(cycles, batch_size=batch_size)
+                except IntegrityError:
+                    logger.warning("Missed-cycle catch-up skipped letter %s after a concurrent cycle insert", letter.pk)
+                    continue
+                inserted.append((letter, cycles))
+            plans = inserted
+            if not plans:
+                return 0
+        new_cycles = [cycle for _, cycles in plans for cycle in cycles]
+
+        Log.objects.bulk_create(
+            [
+                Log(
+                    letter_id=cycle.letter_id, action="recurred",
+                    old_due_date=previous, new_due_date=cycle.due_date, next_due_date=cycle.next_due_date,
+                    message=f"Cycle {cycle.cycle_no} auto-created (missed recurrence caught up).",
+                )
+                for letter, cycles in plans
+                for previous, cycle in zip([letter.last_due] + [c.due_date for c in cycles], cycles)
+            ],
+            batch_size=batch_size,
+        )
 
-       
-        active_cycle = letter.cycles.filter(status="in-progress").order_by("-cycle_no").first()
-        check_date   = active_cycle.due_date if active_cycle else letter.due_date
-
-        if not check_date:
-            continue
-
-        days_left = (check_date - today).days
-
-        if days_left < 0:
-            title   = "Letter Overdue"
-            message = f"Letter {letter.ref_no} is overdue by {-days_left} day(s)."
-        elif days_left == 0:
-            title   = "Due Today"
-            message = f"Letter {letter.ref_no} is due today."
-        elif days_left in (1, 2, 3):
-            title   = "Due Soon"
-            message = f"Letter {letter.ref_no} is due in {days_left} day(s)."
-        else:
-            continue
-
-        recipients = set()
-        if letter.assigned_to:   recipients.add(letter.assigned_to)
-        if letter.assigned_head: recipients.add(letter.assigned_head)
-        if letter.created_by:    recipients.add(letter.created_by)
-
-        for user in recipients:
-            Notification.objects.get_or_create(
-                user=user,
-                letter=letter,
-                title=title,
-                defaults={"message": message},
+        summary_deltas = Counter()
+        candidates     = []
+        for letter, cycles in plans:
+            for cycle in cycles:
+                summary_deltas[key_for(
+                    letter.assigned_to_id, letter.assigned_head_id, letter.department_id, cycle.status, letter.created_at,
+                )] += 1
+            message = (
+                f"Letter {letter.ref_no}: {len(cycles)} missed cycle(s) created, "
+                f"latest due {cycles[-1].due_date}."
             )
+            for user_id in {letter.assigned_to_id, letter.assigned_head_id, letter.created_by_id} - {None}:
+                candidates.append((user_id, letter.pk, "Missed Cycles Created", message))
+        apply_deltas(summary_deltas)
+        # bulk_create skips the post_save that reschedules reminders.
+        reminders.reschedule_many([letter for letter, _ in plans])
+        deliver(candidates)
+
+    scopes = set()
+    for letter, _ in plans:
+        scopes |= versions.letter_scopes(letter.pk, letter.assigned_to_id, letter.assigned_head_id)
+    transaction.on_commit(lambda: versions.bump(scopes))
+    return len(new_cycles)
+
+
+def letter_shards(shard_size):
+    """Contiguous (first, last) letter id ranges covering every letter."""
+    bounds = Letter.objects.aggregate(first=Min("pk"), last=Max("pk"))
+    if bounds["first"] is None:
+        return []
+    return [
+        (start, min(start + shard_size - 1, bounds["last"]))
+        for start in range(bounds["first"], bounds["last"] + 1, shard_size)
+    ]
+
 
-    return f"Processed {letters.count()} letters"
+def sweep_shard(today, letter_range=None):
+    """
+    Missed-cycle catch-up, overdue flips and due reminders for one shard,
+    committed together. Summary and unread-counter changes are summed over the
+    shard and written once, in lock order, just before the commit, so parallel
+    shards hold those hot rows only briefly and always lock them in one order.
+    """
+    with transaction.atomic():
+        with summary.deferred(), counters.deferred():
+            caught_up = generate_missed_cycles(today, letter_range)
+            flipped   = mark_overdue_cycles(today, letter_range)
+            fired, notified = reminders.fire_due_reminders(today, letter_range)
+    return {"caught_up": caught_up, "flipped": flipped, "fired": fired, "notified": notified}
 
 
 @shared_task
+@tracked_run
+def process_letter_shard(today, first, last):
+    """
+    One shard of the nightly sweep. Its counts go to its own TaskRun, so the
+    sweep needs no result backend to be totalled: run_trends() sums the
+    shards of each day.
+    """
+    counts = sweep_shard(date.fromisoformat(today), (first, last))
+    record(rows_updated=counts["caught_up"] + counts["flipped"], notifications_created=counts["notified"])
+    logger.info(
+        f"Sweep shard {first}-{last}: created {counts['caught_up']} missed cycle(s), "
+        f"marked {counts['flipped']} cycle(s) overdue, "
+        f"fired {counts['fired']} reminder(s), sent {counts['notified']} notification(s)"
+    )
+    return counts
+
+
+def _lane(today, shards):
+    """
+    The shards of one lane, each linked to start the next once it succeeds.
+    This is what a chain does on a worker, but an eager chain would join its
+    results inside the dispatching task, which Celery refuses.
+    """
+    head = None
+    for shard in reversed(shards):
+        signature = process_letter_shard.si(today.isoformat(), *shard)
+        if head is not None:
+            signature.link(head)
+        head = signature
+    return head
+
+
+@shared_task
+@tracked_run
+def process_letters_and_recurrence():
+    """
+    Split the nightly sweep into letter-id shards of LETTERS_SWEEP_SHARD_SIZE
+    and dispatch them as a group of LETTERS_SWEEP_CONCURRENCY lanes, each a
+    run of shards one after another. Nothing waits on the group, so no
+    result backend is needed; every shard records its own counts.
+    """
+    today       = timezone.now().date()
+    shard_size  = getattr(settings, "LETTERS_SWEEP_SHARD_SIZE", 5000)
+    concurrency = getattr(settings, "LETTERS_SWEEP_CONCURRENCY", 4)
+
+    shards = letter_shards(shard_size)
+    if not shards:
+        return "Dispatched 0 shards"
+
+    lanes = [shards[i::concurrency] for i in range(min(concurrency, len(shards)))]
+    group(_lane(today, lane) for lane in lanes).apply_async()
+
+    logger.info(f"Dispatched {len(shards)} shard(s) across {len(lanes)} lane(s)")
+    return f"Dispatched {len(shards)} shards"
+
+
+@shared_task
+def fan_out_letter_notification(letter_id, title, message):
+    """Notify everyone following a letter, off the request path."""
+    created = notify_users(letter_recipients(letter_id), letter_id, title, message)
+    return f"Sent {created} notifications"
+
+
+@shared_task
+@tracked_run
 def cleanup_old_notifications(days=30):
-    cutoff = timezone.now() - timedelta(days=days)
-    deleted_count, _ = Notification.objects.filter(created_at__lt=cutoff).delete()
-    return f"Deleted {deleted_count} old notifications"
\ No newline at end of file
+    result = retention.run(retention.NotificationPolicy(days=days))
+    record(rows_updated=result["removed"])
+    return f"Deleted {result['removed']} old notifications"
+
+
+@shared_task
+@tracked_run
+def apply_retention(max_seconds=None):
+    """Every retention policy in turn; a policy cut short by max_seconds resumes next run."""
+    removed = {}
+    for policy_class in retention.POLICIES.values():
+        result = retention.run(policy_class(), max_seconds=max_seconds)
+        removed[result["policy"]] = result["removed"]
+        record(rows_updated=result["removed"])
+    return removed
@@ -1,3 +1,1181 @@
-from django.test import TestCase
+import calendar
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from datetime import date, timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+import jwt
+from celery import current_app
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from department.models import Department
+from .authentication import resolve_user, user_cache
+from .models import (
+    ArchivedLetterCycle, Letter, LetterCycle, Log, Notification, NotificationCounter, ReminderSchedule,
+    TaskRun, TaskSummary, RECURRENCE_PATTERN_CHOICES,
+)
+from .filters import SORTABLE_FIELDS
+from .pagination import keyset_paginate
+from . import counters, notifications, recurrence, reminders, retention, search, summary, tasks, versions, views
+
+User = get_user_model()
+
+
+def _token(user):
+    return jwt.encode({"username": user.username}, settings.SECRET_KEY, algorithm="HS256")
+
+
+def _auth_header(user):
+    return {"HTTP_AUTHORIZATION": f"Bearer {_token(user)}"}
+
+
+class LetterListQueryCountTests(TestCase):
+    def setUp(self):
+        self.factory    = APIRequestFactory()
+        self.department = Department.objects.create(name="IT")
+        self.admin      = User.objects.create(username="admin", is_superuser=True)
+        self.user       = User.objects.create(username="bob")
+        # Measure the steady state: tokens are resolved once and then served from cache.
+        user_cache.clear()
+        for user in (self.admin, self.user):
+            resolve_user(_token(user))
+
+    def _make_letters(self, count, cycles_per_letter=3):
+        due = date.today() + timedelta(days=7)
+        for i in range(count):
+            letter = Letter.objects.create(
+                department=self.department, category="General", priority="high",
+                ref_no=f"REF-{Letter.objects.count() + 1}", subject=f"Subject {i}",
+                status="in-progress", due_date=due,
+                assigned_to=self.user, created_by=self.admin,
+            )
+            for n in range(1, cycles_per_letter + 1):
+                LetterCycle.objects.create(
+                    letter=letter, cycle_no=n, due_date=due + timedelta(days=n),
+                )
+
+    def _count_queries(self, view, user, path):
+        request = self.factory.get(path, **_auth_header(user))
+        with CaptureQueriesContext(connection) as ctx:
+            response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_list_letters_query_count_is_independent_of_letter_count(self):
+        self._make_letters(1)
+        small, response = self._count_queries(views.list_letters, self.user, "/api/letters/?cycles=all")
+        self.assertEqual(len(response.data), 3)
+
+        self._make_letters(9)
+        large, response = self._count_queries(views.list_letters, self.user, "/api/letters/?cycles=all")
+        self.assertEqual(len(response.data), 30)
+        self.assertEqual(small, large)
+
+    def test_get_all_letters_query_count_is_independent_of_letter_count(self):
+        self._make_letters(1)
+        small, _ = self._count_queries(views.get_all_letters, self.admin, "/api/letters/all/?cycles=all")
+
+        self._make_letters(9)
+        large, response = self._count_queries(views.get_all_letters, self.admin, "/api/letters/all/?cycles=all")
+        self.assertEqual(len(response.data), 30)
+        self.assertEqual(small, large)
+
+    def test_authenticated_requests_skip_user_lookup_until_user_changes(self):
+        path = "/api/letters/notifications/unread-count/"
+        self._count_queries(views.get_unread_count, self.user, path)  # seeds the unread counter
+        count, _ = self._count_queries(views.get_unread_count, self.user, path)
+        self.assertEqual(count, 1)
+
+        self.user.first_name = "Bob"
+        self.user.save()
+        count, _ = self._count_queries(views.get_unread_count, self.user, path)
+        self.assertEqual(count, 2)
+        count, _ = self._count_queries(views.get_unread_count, self.user, path)
+        self.assertEqual(count, 1)
+
+    def test_streamed_export_matches_the_buffered_list(self):
+        self._make_letters(4, cycles_per_letter=3)
+        Letter.objects.filter(pk=Letter.objects.order_by("pk").first().pk).update(priority="low")
+        for query in ("", "cycles=all", "cycles=all&priority=high&ordering=-due_date", "priority=none", "status=draft"):
+            buffered = self._count_queries(views.get_all_letters, self.admin, f"/api/letters/all/?{query}")[1]
+            request  = self.factory.get(f"/api/letters/all/?{query}&stream=1", **_auth_header(self.admin))
+            streamed = views.get_all_letters(request)
+            self.assertEqual(streamed["Content-Type"], "application/json")
+            body = b"".join(part if isinstance(part, bytes) else part.encode() for part in streamed.streaming_content)
+            self.assertEqual(json.loads(body), json.loads(json.dumps(buffered.data)), query)
+            empty = query.startswith(("priority=none", "status=draft"))
+            self.assertEqual(body == b"[]", empty, query)
+
+    def test_cycle_rows_are_ordered_by_cycle_no(self):
+        self._make_letters(1, cycles_per_letter=4)
+        _, response = self._count_queries(views.list_letters, self.user, "/api/letters/?cycles=all")
+        self.assertEqual([row["cycle_no"] for row in response.data], [1, 2, 3, 4])
+
+    def test_default_list_returns_current_cycle_only(self):
+        self._make_letters(2, cycles_per_letter=4)
+        letter = Letter.objects.order_by("pk").first()
+        letter.cycles.filter(cycle_no__in=[3, 4]).update(status="completed")
+
+        _, response = self._count_queries(views.list_letters, self.user, "/api/letters/")
+        self.assertEqual(len(response.data), 2)
+        current = {row["id"]: row["cycle_no"] for row in response.data}
+        self.assertEqual(current[letter.pk], 2)
+
+        letter.cycles.update(status="completed")
+        _, response = self._count_queries(views.list_letters, self.user, "/api/letters/")
+        current = {row["id"]: (row["cycle_no"], row["status"]) for row in response.data}
+        self.assertEqual(current[letter.pk], (4, "completed"))
+
+    def test_letter_cycles_endpoint_pages_through_history(self):
+        self._make_letters(1, cycles_per_letter=5)
+        letter = Letter.objects.get()
+        seen, cursor = [], None
+        while True:
+            path = f"/api/letters/{letter.pk}/cycles/?page_size=2" + (f"&cursor={cursor}" if cursor else "")
+            request  = self.factory.get(path, **_auth_header(self.user))
+            response = views.get_letter_cycles(request, pk=letter.pk)
+            self.assertEqual(response.status_code, 200)
+            seen  += [c["cycle_no"] for c in response.data["results"]]
+            cursor = response.data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [1, 2, 3, 4, 5])
+
+
+class LetterStatsTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.today   = date.today()
+        self.admin   = User.objects.create(username="admin", is_superuser=True)
+        self.user    = User.objects.create(username="bob")
+        departments  = [Department.objects.create(name="IT"), Department.objects.create(name="HR")]
+        statuses     = ["in-progress", "completed", "overdue"]
+        for i in range(12):
+            letter = Letter.objects.create(
+                department=departments[i % 2], category="General", priority="high",
+                ref_no=f"REF-{i}", subject=f"Subject {i}",
+                status=["pending", "draft", "in-progress"][i % 3], due_date=self.today,
+                assigned_to=self.user, created_by=self.admin,
+                recurrence_type="monthly" if i % 4 else None, recurrence_value=1 if i % 4 else None,
+            )
+            for n in range(1, i % 4 + 1):
+                LetterCycle.objects.create(
+                    letter=letter, cycle_no=n, status=statuses[(i + n) % 3],
+                    due_date=self.today + timedelta(days=(i + n) % 5 - 2),
+                )
+        summary.rebuild()
+
+    def _get(self, view, user, path):
+        response = view(self.factory.get(path, **_auth_header(user)))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _expected(self, rows):
+        today, active = self.today.isoformat(), lambda row: row["status"] not in ("pending", "draft", "completed")
+        return {
+            "total":     len(rows),
+            "upcoming":  sum(1 for row in rows if active(row) and row["due_date"] > today),
+            "overdue":   sum(1 for row in rows if active(row) and row["due_date"] < today),
+            "recurring": sum(1 for row in rows if row["status"] not in ("pending", "draft") and row["recurrence_type"]),
+            "status_counts": {status: sum(1 for row in rows if row["status"] == status) for status in {row["status"] for row in rows}},
+        }
+
+    def _check_tiles(self):
+        for user in (self.admin, self.user):
+            rows  = self._get(views.list_letters, user, "/api/letters/?cycles=all")
+            stats = self._get(views.get_letter_stats, user, "/api/letters/stats/")
+            self.assertEqual({key: stats[key] for key in self._expected(rows)}, self._expected(rows))
+            self.assertEqual(sum(d["total"] for d in stats["departments"]), len(rows))
+            self.assertEqual(stats["monthly"][-1]["count"], len(rows))
+        return rows
+
+    def test_tiles_match_the_list_rows(self):
+        self._check_tiles()
+
+    def _history(self, letter_id, ordering):
+        seen, cursor = [], None
+        while True:
+            path = f"/api/letters/{letter_id}/cycles/?page_size=1&ordering={ordering}"
+            path += f"&cursor={cursor}" if cursor else ""
+            page = views.get_letter_cycles(self.factory.get(path, **_auth_header(self.user)), pk=letter_id).data
+            seen  += [(cycle["cycle_no"], cycle["archived"]) for cycle in page["results"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                return seen, page["compacted"]
+
+    def test_compacted_and_retired_cycles_stay_consistent(self):
+        LetterCycle.objects.filter(status="completed").update(completed_at=timezone.now() - timedelta(days=200))
+        key    = lambda row: (row["id"], row["cycle_no"], row["status"])
+        before = sorted(map(key, self._check_tiles()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            retention.run(retention.CycleCompactionPolicy(), sleep=0)
+        archived = list(ArchivedLetterCycle.objects.values_list("letter_id", "cycle_no"))
+        self.assertTrue(archived)
+        rows = self._check_tiles()
+        self.assertEqual(sorted(map(key, rows)), before)
+        self.assertEqual(sorted((row["id"], row["cycle_no"]) for row in rows if row["archived"]), sorted(archived))
+        self.assertEqual(summary.drift(), {})
+
+        letter_id = archived[0][0]
+        expected  = sorted(
+            [(n, False) for n in LetterCycle.objects.filter(letter_id=letter_id).values_list("cycle_no", flat=True)]
+            + [(n, True) for l, n in archived if l == letter_id]
+        )
+        history, compacted = self._history(letter_id, "cycle_no")
+        self.assertEqual(history, expected)
+        self.assertEqual(self._history(letter_id, "-cycle_no")[0], expected[::-1])
+        self.assertEqual(compacted["cycles"], sum(1 for l, _ in archived if l == letter_id))
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with self.settings(LETTERS_RETENTION_ARCHIVE_DIR=directory), self.captureOnCommitCallbacks(execute=True):
+            retention.run(retention.ArchivedCyclePolicy(days=100), sleep=0)
+        self.assertFalse(ArchivedLetterCycle.objects.exists())
+        self.assertEqual(len(list(retention.read_archive(directory, policy="archived_cycle"))), len(archived))
+        self.assertEqual(len(self._check_tiles()), len(before) - len(archived))
+        self.assertEqual(self._history(letter_id, "cycle_no")[1], compacted)
+        self.assertEqual(summary.drift(), {})
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        self.factory    = APIRequestFactory()
+        self.department = Department.objects.create(name="IT")
+        self.admin      = User.objects.create(username="admin", is_superuser=True)
+        self.user       = User.objects.create(username="bob")
+        self.other      = User.objects.create(username="carol")
+        self.letters    = [
+            Letter.objects.create(
+                department=self.department, category="General", priority="high",
+                ref_no=f"REF-{i}", subject=f"Subject {i}", status="in-progress",
+                due_date=date.today(), assigned_to=assignee, created_by=self.admin,
+            )
+            for i, assignee in enumerate((self.user, self.other))
+        ]
+
+    def _shared_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        return self.settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location,
+        }})
+
+    def _get(self, user, etag=None):
+        headers = _auth_header(user)
+        if etag:
+            headers["HTTP_IF_NONE_MATCH"] = etag
+        return views.list_letters(self.factory.get("/api/letters/", **headers))
+
+    def test_process_local_cache_sends_no_etag(self):
+        response = self._get(self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+    def test_etag_follows_changes_in_scope(self):
+        with self._shared_cache():
+            etag = self._get(self.user)["ETag"]
+            self.assertEqual(self._get(self.user, etag).status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                LetterCycle.objects.create(letter=self.letters[0], cycle_no=1, due_date=date.today())
+                # Not bumped before commit, or a reader could cache the old rows under the new version.
+                self.assertEqual(self._get(self.user, etag).status_code, 304)
+            self.assertEqual(self._get(self.user, etag).status_code, 200)
+
+    def test_update_letter_checks_the_authenticated_user(self):
+        def patch(user):
+            request = self.factory.patch(
+                f"/api/letters/{self.letters[0].pk}/update/", {"subject": "Renamed"},
+                format="multipart", **_auth_header(user),
+            )
+            return views.update_letter(request, pk=self.letters[0].pk)
+
+        self.assertEqual(patch(self.other).status_code, 403)
+        # The user resolved by authentication is reused, not looked up again.
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(patch(self.other).status_code, 403)
+        self.assertFalse([q["sql"] for q in queries if "auth_user" in q["sql"]])
+        self.assertEqual(patch(self.user).status_code, 200)
+        self.letters[0].refresh_from_db()
+        self.assertEqual(self.letters[0].subject, "Renamed")
+
+    def test_scope_comes_from_the_current_role(self):
+        with self._shared_cache():
+            etag = self._get(self.user)["ETag"]
+            self.user.is_superuser = True   # promoted to super admin: now sees every letter
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+            etag = self._get(self.user, etag)["ETag"]
+            self.assertEqual(self._get(self.user, etag).status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                LetterCycle.objects.create(letter=self.letters[1], cycle_no=1, due_date=date.today())
+            self.assertEqual(self._get(self.user, etag).status_code, 200)
+
+    def test_unread_count_polls_are_conditional(self):
+        def poll(etag=None):
+            headers = _auth_header(self.user)
+            if etag:
+                headers["HTTP_IF_NONE_MATCH"] = etag
+            return views.get_unread_count(self.factory.get("/api/letters/notifications/unread-count/", **headers))
+
+        first = poll()
+        self.assertEqual(first.data, {"count": 0})
+        self.assertEqual(poll(first["ETag"]).status_code, 304)
+
+        Notification.objects.create(user=self.user, letter=self.letters[0], title="Letter Assigned", message="m")
+        second = poll(first["ETag"])
+        self.assertEqual((second.status_code, second.data), (200, {"count": 1}))
+        with self.assertNumQueries(1):
+            self.assertEqual(poll(second["ETag"]).status_code, 304)
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.factory    = APIRequestFactory()
+        department      = Department.objects.create(name="IT")
+        self.admin      = User.objects.create(username="admin", is_superuser=True)
+        self.director   = User.objects.create(username="dana", is_superuser=True, is_staff=True)
+        self.user       = User.objects.create(username="bob")
+        self.other      = User.objects.create(username="carol")
+        self.mine, self.theirs = [
+            Letter.objects.create(
+                department=department, category="General", priority="high",
+                ref_no=f"REF-{i}", subject=f"Subject {i}", status="in-progress", due_date=date.today(),
+                assigned_to=assignee, assigned_head=head, created_by=self.admin,
+            )
+            for i, (assignee, head) in enumerate(((self.user, self.director), (self.other, None)))
+        ]
+
+    def _sync(self, user, token=None):
+        path     = "/api/letters/changes/" + (f"?since={token}" if token else "")
+        response = views.get_changes(self.factory.get(path, **_auth_header(user)))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _deleted(self, data):
+        return {(row["type"], row["letter_id"]) for row in data["deleted"]}
+
+    def test_snapshot_then_changes(self):
+        first = self._sync(self.user)
+        self.assertEqual([row["id"] for row in first["letters"]], [self.mine.pk])
+        cycle = LetterCycle.objects.create(letter=self.mine, cycle_no=1, due_date=date.today())
+        self.assertIn(cycle.pk, [row["id"] for row in self._sync(self.user, first["next_token"])["cycles"]])
+
+    def test_tombstones_only_reach_users_who_saw_the_letter(self):
+        tokens = {user: self._sync(user)["next_token"] for user in (self.admin, self.director, self.user, self.other)}
+        self.theirs.is_active = False
+        self.theirs.save()
+        self.mine.assigned_to = self.other
+        self.mine.save()
+
+        deleted = {user: self._deleted(self._sync(user, token)) for user, token in tokens.items()}
+        self.assertEqual(deleted[self.admin],    {("letter", self.theirs.pk)})
+        self.assertEqual(deleted[self.other],    {("letter", self.theirs.pk)})
+        self.assertEqual(deleted[self.user],     {("letter", self.mine.pk)})
+        self.assertEqual(deleted[self.director], set())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        department = Department.objects.create(name="IT")
+        admin      = User.objects.create(username="admin", is_superuser=True)
+        subjects   = ["Quarterly report bua budare", "Budget review"] + [f"Memo bua bub buc bud {i}" for i in range(4)]
+        self.letters = [
+            Letter.objects.create(
+                department=department, category="General", priority="high", ref_no=f"REF-{i}",
+                subject=subject, status="in-progress", due_date=date.today(), created_by=admin,
+            )
+            for i, subject in enumerate(subjects)
+        ]
+
+    def _search(self, query):
+        return [letter.pk for letter, _, _ in search.search(Letter.objects.all(), query)]
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self._search("budget"), [self.letters[1].pk])
+        self.assertEqual(self._search("budget zzzqqq"), [])
+        self.assertEqual(self._search("zzzqqq budget"), [])
+
+    def test_common_prefix_terms_do_not_crowd_out_exact_matches(self):
+        with mock.patch.object(search, "MAX_PREFIX_TERMS", 2):
+            # "bu" expands to its two most common terms, bua and bub, which
+            # outnumber the rare "report"; that exact match is still kept.
+            self.assertEqual(self._search("report bu"), [self.letters[0].pk])
+            # budare is outside the cap, but an exact last token always counts.
+            self.assertEqual(self._search("budare"), [self.letters[0].pk])
+
+    def test_prefix_matches_terms_continuing_past_the_bmp(self):
+        # U+1D51E is a letter outside the Basic Multilingual Plane, so it sorts
+        # after any "\uffff" upper bound; a LIKE prefix still finds it.
+        letter = self.letters[2]
+        letter.subject = "Notes on zyx\U0001d51e"
+        letter.save()
+        self.assertEqual(self._search("zyx"), [letter.pk])
+
+
+class TaskSummaryTests(TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(name="IT")
+        self.keys = [
+            (assignee, head, self.department.pk, "in-progress", date(2026, 1, 1))
+            for assignee in (None, 7) for head in (None, 9)
+        ]
+
+    def test_null_user_buckets_are_unique(self):
+        for assignee, head, department_id, status, month in self.keys:
+            TaskSummary.objects.create(
+                assignee_id=assignee, head_id=head, department_id=department_id, status=status, month=month,
+            )
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                TaskSummary.objects.create(
+                    assignee_id=assignee, head_id=head, department_id=department_id, status=status, month=month,
+                )
+
+    def test_apply_deltas_falls_back_when_another_writer_created_the_bucket(self):
+        summary.apply_deltas({key: 1 for key in self.keys})
+        # Every lookup misses once, as if the rows did not exist yet, so each
+        # delta goes through the create-then-IntegrityError path.
+        real_filter, missed = TaskSummary.objects.filter, set()
+
+        def racing_filter(*args, **kwargs):
+            key = tuple(sorted(kwargs.items(), key=str))
+            if key in missed:
+                return real_filter(*args, **kwargs)
+            missed.add(key)
+            return mock.Mock(update=mock.Mock(return_value=0))
+
+        with mock.patch.object(TaskSummary.objects, "filter", side_effect=racing_filter):
+            summary.apply_deltas({key: 2 for key in self.keys})
+        self.assertEqual(TaskSummary.objects.count(), len(self.keys))
+        self.assertEqual(set(TaskSummary.objects.values_list("count", flat=True)), {3})
+
+
+class NightlySweepTests(TestCase):
+    def setUp(self):
+        self.today      = date.today()
+        self.department = Department.objects.create(name="IT")
+        self.admin      = User.objects.create(username="admin", is_superuser=True)
+        self.user       = User.objects.create(username="bob")
+
+    def _letters(self, count, status="in-progress", cycle_status="in-progress", days=-3, **fields):
+        letters = []
+        for i in range(count):
+            letter = Letter.objects.create(
+                department=self.department, category="General", priority="high",
+                ref_no=f"REF-{Letter.objects.count() + 1}", subject=f"Subject {i}", status=status,
+                due_date=self.today + timedelta(days=days), assigned_to=self.user, created_by=self.admin, **fields,
+            )
+            LetterCycle.objects.create(letter=letter, cycle_no=1, status=cycle_status,
+                                       due_date=self.today + timedelta(days=days))
+            letters.append(letter)
+        summary.rebuild()
+        return letters
+
+    def _flip(self):
+        with CaptureQueriesContext(connection) as ctx:
+            flipped = tasks.mark_overdue_cycles(self.today)
+        return flipped, len(ctx.captured_queries)
+
+    def test_overdue_flip_is_set_based(self):
+        self._letters(1)
+        self._flip()                                      # creates the overdue summary bucket
+        self._letters(5)
+        small, small_queries = self._flip()
+        self._letters(20)
+        self._letters(3, days=2)                          # not due yet
+        self._letters(2, cycle_status="completed")
+        self._letters(2, status="draft")
+        large, large_queries = self._flip()
+
+        self.assertEqual((small, large), (5, 20))
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(LetterCycle.objects.filter(status="overdue").count(), 26)
+        self.assertEqual(Log.objects.filter(action="overdue").count(), 26)
+        self.assertEqual(summary.drift(), {})
+        self.assertEqual(self._flip()[0], 0)
+
+    def _recurring(self, count):
+        # Weekly letters whose first cycle was due 22 days ago and never completed.
+        letters = self._letters(count, days=-22, recurrence_type="weekly", recurrence_value=1)
+        for letter in letters:
+            letter.cycles.update(next_due_date=letter.calculate_next_due_date(letter.due_date))
+        return letters
+
+    def _catch_up(self):
+        with CaptureQueriesContext(connection) as ctx:
+            created = tasks.generate_missed_cycles(self.today)
+        return created, len(ctx.captured_queries)
+
+    def test_catch_up_backfills_every_missed_period(self):
+        self._recurring(1)
+        self._catch_up()                                  # creates summary buckets and counters
+        self._recurring(2)
+        small, small_queries = self._catch_up()
+        letters = self._recurring(6)
+        large, large_queries = self._catch_up()
+        self.assertEqual((small, large), (6, 18))
+        self.assertEqual(small_queries, large_queries)
+
+        for letter in letters:
+            cycles  = list(letter.cycles.order_by("cycle_no"))
+            chained = [letter.due_date]
+            while len(chained) < len(cycles):
+                chained.append(letter.calculate_next_due_date(chained[-1]))
+            self.assertEqual([cycle.due_date for cycle in cycles], chained)
+            last = cycles[-1]
+            self.assertEqual(last.next_due_date, letter.calculate_next_due_date(last.due_date))
+            self.assertGreater(last.next_due_date, self.today)
+            self.assertTrue(ReminderSchedule.objects.filter(cycle=last, sent_on__isnull=True).exists())
+        self.assertEqual(summary.drift(), {})
+        self.assertEqual(self._catch_up()[0], 0)
+
+    def test_catch_up_skips_only_the_letter_that_raced(self):
+        raced, kept = self._recurring(2)
+        bulk_create = LetterCycle.objects.bulk_create
+
+        def completion_first(cycles, *args, **kwargs):
+            # A completion of `raced` lands between the idempotency check and every insert.
+            if not raced.cycles.filter(cycle_no=2).exists():
+                LetterCycle.objects.create(letter=raced, cycle_no=2, due_date=self.today)
+            return bulk_create(cycles, *args, **kwargs)
+
+        with mock.patch.object(LetterCycle.objects, "bulk_create", side_effect=completion_first), \
+                self.assertLogs("letters.tasks", "WARNING"):
+            self.assertEqual(tasks.generate_missed_cycles(self.today), 3)
+        self.assertEqual(raced.cycles.count(), 2)
+        self.assertEqual(list(kept.cycles.order_by("cycle_no").values_list("cycle_no", flat=True)), [1, 2, 3, 4])
+        self.assertEqual(Log.objects.filter(action="recurred", letter=kept).count(), 3)
+
+    def _eager(self):
+        previous = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, "task_always_eager", previous)
+
+    @override_settings(LETTERS_SWEEP_SHARD_SIZE=3, LETTERS_SWEEP_CONCURRENCY=2)
+    def test_sharded_sweep_runs_eagerly(self):
+        self._eager()
+        self._letters(10)
+        tasks.process_letters_and_recurrence.delay()
+
+        self.assertEqual(LetterCycle.objects.filter(status="overdue").count(), 10)
+        self.assertEqual(summary.drift(), {})
+        shards = len(tasks.letter_shards(3))
+        self.assertGreaterEqual(shards, 4)                # ten letters, three per shard, two lanes
+
+        runs = TaskRun.objects.filter(task_name="letters.tasks.process_letter_shard")
+        self.assertEqual(runs.count(), shards)
+        self.assertEqual(set(runs.values_list("status", flat=True)), {"success"})
+        self.assertEqual(sum(runs.values_list("rows_updated", flat=True)), 10)
+
+    @override_settings(LETTERS_SWEEP_SHARD_SIZE=2)
+    def test_sweep_dispatches_without_a_result_backend(self):
+        # Not eager, and no result backend configured: a chord would raise here.
+        self._letters(3)
+        previous = {key: current_app.conf[key] for key in ("broker_url", "task_always_eager")}
+        current_app.conf.update(broker_url="memory://", task_always_eager=False)
+        self.addCleanup(current_app.conf.update, previous)
+        with mock.patch.object(current_app, "_pool", None), mock.patch.object(current_app.amqp, "_producer_pool", None):
+            result = tasks.process_letters_and_recurrence.apply()
+            self.assertEqual(result.get(), "Dispatched 2 shards")
+
+    def test_shard_writes_summary_rows_once_at_the_end(self):
+        self._recurring(4)
+        with CaptureQueriesContext(connection) as ctx:
+            counts = tasks.sweep_shard(self.today)
+        sql = [query["sql"] for query in ctx.captured_queries]
+        summary_writes = [i for i, q in enumerate(sql) if "documents_task_summary" in q]
+        other_writes   = [i for i, q in enumerate(sql) if q.startswith(("INSERT", "UPDATE")) and "documents_task_summary" not in q
+                          and "documents_notification_counter" not in q]
+        self.assertEqual(counts["caught_up"], 12)
+        # One UPDATE per bucket touched (in-progress and overdue), plus the
+        # INSERT of the new overdue bucket, after every other write of the shard.
+        self.assertEqual(sum(sql[i].startswith("UPDATE") for i in summary_writes), 2)
+        self.assertGreater(min(summary_writes), max(other_writes))
+        self.assertEqual(summary.drift(), {})
+
+    def test_failed_runs_are_recorded_and_reported(self):
+        self._eager()
+        self._letters(2)
+        today = self.today.isoformat()
+        totals = tasks.process_letter_shard.apply(args=(today, 1, 10**9)).get()
+        self.assertEqual(totals["flipped"], 2)
+        with mock.patch.object(tasks, "sweep_shard", side_effect=RuntimeError("shard lost")):
+            result = tasks.process_letter_shard.apply(args=(today, 1, 10**9))
+        self.assertTrue(result.failed())
+
+        ok, failed = TaskRun.objects.order_by("pk")
+        self.assertEqual((ok.status, ok.rows_updated, ok.notifications_created), ("success", 2, totals["notified"]))
+        self.assertGreater(ok.query_count, 0)
+        self.assertIsNotNone(ok.finished_at)
+        self.assertEqual(failed.status, "failure")
+        self.assertIn("shard lost", failed.error)
+        self.assertIsNotNone(failed.duration_ms)
+
+        request  = APIRequestFactory().get("/api/letters/task-runs/", **_auth_header(self.admin))
+        response = views.get_task_runs(request)
+        self.assertEqual([run["status"] for run in response.data["runs"]], ["failure", "success"])
+        trend, = response.data["trends"]
+        self.assertEqual((trend["runs"], trend["failures"], trend["rows_updated"]), (2, 1, 2))
+        request = APIRequestFactory().get("/api/letters/task-runs/", **_auth_header(self.user))
+        self.assertEqual(views.get_task_runs(request).status_code, 403)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.factory    = APIRequestFactory()
+        department      = Department.objects.create(name="IT")
+        admin           = User.objects.create(username="admin", is_superuser=True)
+        self.user       = User.objects.create(username="bob")
+        self.letters    = [
+            Letter.objects.create(
+                department=department, category="General", priority="high", ref_no=f"REF-{i}",
+                subject=f"Subject {i}", status="in-progress", due_date=date.today(),
+                assigned_to=self.user, created_by=admin,
+            )
+            for i in range(3)
+        ]
+
+    def _stored(self):
+        return NotificationCounter.objects.get(user=self.user).unread
+
+    def _post(self, view, *args):
+        return view(self.factory.post("/", **_auth_header(self.user)), *args)
+
+    def test_counter_follows_every_write_path(self):
+        first = Notification.objects.create(user=self.user, letter=self.letters[0], title="Letter Assigned", message="m")
+        self.assertEqual(self._stored(), 1)
+        notifications.notify_users([self.user.id], self.letters[1].id, "Letter Assigned", "m")
+        notifications.notify_users([self.user.id], self.letters[2].id, "Letter Assigned", "m")
+        self.assertEqual(self._stored(), 3)
+
+        self._post(views.mark_notification_read, first.pk)
+        self._post(views.mark_notification_read, first.pk)   # already read: no second decrement
+        self.assertEqual(self._stored(), 2)
+
+        old = Notification.objects.filter(is_read=False).order_by("pk").first()
+        Notification.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+        tasks.cleanup_old_notifications.apply(kwargs={"days": 30}).get()
+        self.assertEqual(self._stored(), 1)
+
+        self._post(views.mark_all_notifications_read)
+        self.assertEqual(self._stored(), 0)
+        self.assertEqual(counters.drift(), {})
+
+    def test_reconcile_command_reports_and_repairs_drift(self):
+        Notification.objects.create(user=self.user, letter=self.letters[0], title="Letter Assigned", message="m")
+        NotificationCounter.objects.filter(user=self.user).update(unread=5)
+        with self.assertRaisesMessage(CommandError, "1 counter(s) drifted."):
+            call_command("reconcile_notification_counters", "--check", stdout=StringIO())
+
+        call_command("reconcile_notification_counters", stdout=StringIO())
+        self.assertEqual(self._stored(), 1)
+        call_command("reconcile_notification_counters", "--check", stdout=StringIO())
+
+    def _inbox(self, query):
+        response = views.get_notifications(self.factory.get(f"/api/letters/notifications/?{query}", **_auth_header(self.user)))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_inbox_pages_through_filters_with_tied_timestamps(self):
+        other = User.objects.create(username="carol")
+        rows  = [
+            Notification.objects.create(
+                user=other if i == 11 else self.user, letter=self.letters[i % 2],
+                title=["Letter Assigned", "Comment Added"][i % 3 == 0], message=f"m{i}", is_read=i % 4 == 0,
+            )
+            for i in range(12)
+        ]
+        stamp = timezone.now() - timedelta(hours=1)
+        Notification.objects.filter(pk__in=[row.pk for row in rows[:6]]).update(created_at=stamp)
+
+        for query in ("", "unread=1", f"letter={self.letters[0].pk}", "unread=1&title=Letter+Assigned"):
+            expected = self._inbox(query)
+            seen, cursor = [], None
+            while True:
+                page   = self._inbox(f"{query}&page_size=2" + (f"&cursor={cursor}" if cursor else ""))
+                seen  += page["results"]
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            self.assertEqual([n["id"] for n in seen], [n["id"] for n in expected], query)
+            self.assertTrue(expected)
+            self.assertNotIn(rows[11].pk, [n["id"] for n in seen])
+
+        request = self.factory.get("/api/letters/notifications/?letter=abc", **_auth_header(self.user))
+        self.assertEqual(views.get_notifications(request).status_code, 400)
+
+    @override_settings(LETTERS_NOTIFICATION_COALESCE_SECONDS=0, LETTERS_NOTIFICATION_DIGEST_TITLES=("Reminder",))
+    def test_zero_window_turns_coalescing_off_for_non_digest_titles(self):
+        for _ in range(2):
+            notifications.notify(self.user.id, self.letters[0].id, "Letter Assigned", "assigned")
+            notifications.notify(self.user.id, self.letters[0].id, "Reminder", "due soon")
+        notifications.notify(self.user.id, self.letters[1].id, "Reminder", "due soon")
+
+        rows = Notification.objects.filter(user=self.user).order_by("pk")
+        self.assertEqual([(n.title, n.count) for n in rows], [("Letter Assigned", 1), ("Reminder", 3), ("Letter Assigned", 1)])
+        self.assertIsNone(rows[1].letter_id)
+        self.assertEqual(self._stored(), 3)
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.old    = timezone.now() - timedelta(days=800)
+        department  = Department.objects.create(name="IT")
+        admin       = User.objects.create(username="admin", is_superuser=True)
+        self.user   = User.objects.create(username="bob")
+        self.letter = Letter.objects.create(
+            department=department, category="General", priority="high", ref_no="REF-1", subject="Audit",
+            status="in-progress", due_date=date.today(), assigned_to=self.user, created_by=admin,
+        )
+        self.archive = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive, ignore_errors=True)
+
+    def test_failed_batch_is_archived_once_when_retried(self):
+        for _ in range(3):
+            Log.objects.create(letter=self.letter, action="updated")
+        Log.objects.update(created_at=self.old)
+        ids    = sorted(Log.objects.values_list("pk", flat=True))
+        policy = retention.LogPolicy()
+        writer = retention.SegmentWriter("log", directory=self.archive)
+
+        with mock.patch.object(policy, "after_delete", side_effect=RuntimeError("lock timeout")):
+            with self.assertRaises(RuntimeError):
+                retention.run(policy, sleep=0, writer=writer)
+        self.assertEqual(Log.objects.count(), 3)
+        self.assertEqual(os.listdir(self.archive), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            retention.run(policy, sleep=0, writer=writer)
+        self.assertFalse(Log.objects.exists())
+        self.assertEqual(sorted(row["id"] for row in retention.read_archive(self.archive, policy="log")), ids)
+
+    def test_pruned_logs_bump_their_letter_after_commit(self):
+        Log.objects.create(letter=self.letter, action="updated")
+        Log.objects.update(created_at=self.old)
+        with mock.patch.object(retention.versions, "bump") as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                retention.run(retention.LogPolicy(archive=False), sleep=0)
+                bump.assert_not_called()
+        bump.assert_called_once_with({"all", f"letter:{self.letter.pk}", f"assignee:{self.user.pk}"})
+
+    def test_staged_batch_left_by_a_crash_is_settled_by_the_next_run(self):
+        log    = Log.objects.create(letter=self.letter, action="updated")
+        writer = retention.SegmentWriter("log", directory=self.archive)
+        row    = Log.objects.filter(pk=log.pk).values()[0]
+        kept   = writer.stage([row])                       # delete rolled back: row still there
+        writer.recover(Log)
+        self.assertEqual(os.listdir(self.archive), [])
+
+        committed = writer.stage([row])                    # delete committed, append never ran
+        Log.objects.filter(pk=log.pk).delete()
+        writer.recover(Log)
+        self.assertFalse(os.path.exists(committed))
+        self.assertEqual([r["id"] for r in retention.read_archive(self.archive, policy="log")], [log.pk])
+        self.assertEqual(kept, committed)
+
+    def test_notification_read_during_the_batch_is_not_uncounted_twice(self):
+        notification = Notification.objects.create(user=self.user, letter=self.letter, title="Letter Assigned", message="m")
+        Notification.objects.filter(pk=notification.pk).update(created_at=self.old)
+
+        def read_then_atomic(*args, **kwargs):
+            # The user opens the notification after the batch was picked but before it is deleted.
+            if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+                counters.adjust({self.user.id: -1})
+            return transaction.atomic(*args, **kwargs)
+
+        patched = SimpleNamespace(atomic=read_then_atomic, on_commit=transaction.on_commit)
+        with mock.patch.object(retention, "transaction", patched):
+            retention.run(retention.NotificationPolicy(days=30), sleep=0)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 0)
+
+class ReminderScheduleTests(TestCase):
+    def setUp(self):
+        self.start  = date(2026, 3, 2)
+        department  = Department.objects.create(name="IT")
+        admin       = User.objects.create(username="admin", is_superuser=True)
+        self.user   = User.objects.create(username="bob")
+        self.letter = Letter.objects.create(
+            department=department, category="General", priority="urgent", ref_no="REF-1", subject="Audit",
+            status="in-progress", due_date=self.start + timedelta(days=7), assigned_to=self.user, created_by=admin,
+            recurrence_type="monthly", recurrence_value=1,
+        )
+
+    def _walk(self, first, last):
+        for offset in range((last - first).days + 1):
+            reminders.fire_due_reminders(first + timedelta(days=offset))
+        messages = list(Notification.objects.filter(user=self.user).order_by("pk").values_list("message", flat=True))
+        Notification.objects.all().delete()
+        return messages
+
+    @override_settings(LETTERS_NOTIFICATION_COALESCE_SECONDS=0, LETTERS_REMINDER_OFFSETS={"urgent": (1, 2, 3, 5, 7)})
+    def test_every_offset_fires_once_per_cycle(self):
+        due   = self.start + timedelta(days=7)
+        cycle = LetterCycle.objects.create(letter=self.letter, cycle_no=1, due_date=due)
+        expected = [f"Letter REF-1 is due in {n} day(s)." for n in (7, 5, 3, 2, 1)] + [
+            "Letter REF-1 is due today.", "Letter REF-1 is overdue by 1 day(s).",
+        ]
+        messages = self._walk(self.start, due - timedelta(days=4))
+        cycle.save()                                      # replans; sent reminders must not repeat
+        messages += self._walk(due - timedelta(days=3), due + timedelta(days=3))
+        self.assertEqual(messages, expected)
+
+        cycle.status = "completed"
+        cycle.save()
+        self.assertFalse(cycle.reminders.exists())
+        second_due = due + timedelta(days=31)
+        LetterCycle.objects.create(letter=self.letter, cycle_no=2, due_date=second_due)
+        self.assertEqual(self._walk(second_due - timedelta(days=10), second_due + timedelta(days=1)), expected)
+
+        reminders.rebuild_schedule()
+        self.assertEqual(self._walk(second_due, second_due + timedelta(days=5)), [])
+
+    @override_settings(LETTERS_REMINDER_OFFSETS={"urgent": (1, 3)})
+    def test_migration_backfills_letters_without_reminders(self):
+        backfill = import_module("letters.migrations.0018_backfill_reminder_schedule").backfill_reminders
+        LetterCycle.objects.create(letter=self.letter, cycle_no=1, due_date=self.start + timedelta(days=7))
+        LetterCycle.objects.create(letter=self.letter, cycle_no=2, due_date=self.start + timedelta(days=38), status="completed")
+        fields   = ("letter_id", "cycle_id", "kind", "fire_date")
+        expected = sorted(ReminderSchedule.objects.values_list(*fields))
+        self.assertEqual(len(expected), 4)                # two offsets, due today and overdue, open cycle only
+        ReminderSchedule.objects.all().delete()
+
+        backfill(django_apps, None)
+        self.assertEqual(sorted(ReminderSchedule.objects.values_list(*fields)), expected)
+        backfill(django_apps, None)                       # letters that already have reminders are left alone
+        self.assertEqual(ReminderSchedule.objects.count(), len(expected))
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        department   = Department.objects.create(name="IT")
+        admin        = User.objects.create(username="admin", is_superuser=True)
+        self.user    = User.objects.create(username="bob")
+        other        = User.objects.create(username="carol")
+        self.letters = [
+            Letter.objects.create(
+                department=department, category="General", priority="high", ref_no=f"REF-{i}",
+                subject="Audit, part 1; a subject long enough to need folding in an iCalendar file",
+                status="in-progress", due_date=date(2027, 1, 31), assigned_to=assignee, created_by=admin,
+                recurrence_type="monthly", recurrence_value=1,
+            )
+            for i, assignee in enumerate((self.user, other))
+        ]
+        for letter in self.letters:
+            LetterCycle.objects.create(
+                letter=letter, cycle_no=1, due_date=letter.due_date,
+                next_due_date=letter.calculate_next_due_date(letter.due_date),
+            )
+
+    def test_projection_follows_chained_due_dates(self):
+        request  = self.factory.get("/api/letters/calendar/?from=2027-01-01&to=2027-06-30", **_auth_header(self.user))
+        response = views.get_calendar(request)
+        self.assertEqual(response.status_code, 200)
+
+        letter, chained = self.letters[0], [date(2027, 1, 31)]
+        while True:
+            following = letter.calculate_next_due_date(chained[-1])
+            if following > date(2027, 6, 30):
+                break
+            chained.append(following)
+        events = response.data["events"]
+        self.assertEqual({event["letter_id"] for event in events}, {letter.pk})
+        self.assertEqual(
+            [(event["date"], event["cycle_no"], event["projected"]) for event in events],
+            [(day.isoformat(), n, n > 1) for n, day in enumerate(chained, start=1)],
+        )
+        self.assertEqual(chained[-1], date(2027, 6, 28))   # the Feb 28 clamp carries forward
+
+        request = self.factory.get("/api/letters/calendar/?from=2027-06-30&to=2027-01-01", **_auth_header(self.user))
+        self.assertEqual(views.get_calendar(request).status_code, 400)
+
+    def test_compacted_cycles_stay_on_the_calendar(self):
+        letter = self.letters[0]
+        first  = letter.cycles.get()
+        second = LetterCycle.objects.create(
+            letter=letter, cycle_no=2, due_date=first.next_due_date,
+            next_due_date=letter.calculate_next_due_date(first.next_due_date),
+        )
+        ArchivedLetterCycle.objects.create(
+            id=first.pk, letter=letter, cycle_no=1, due_date=first.due_date, next_due_date=first.next_due_date,
+            status="completed", created_at=first.created_at, updated_at=first.updated_at,
+        )
+        LetterCycle.objects.filter(pk=first.pk).delete()
+
+        request = self.factory.get("/api/letters/calendar/?from=2027-01-01&to=2027-02-28", **_auth_header(self.user))
+        events  = views.get_calendar(request).data["events"]
+        self.assertEqual(
+            [(event["date"], event["cycle_no"], event["status"], event["projected"]) for event in events],
+            [("2027-01-31", 1, "completed", False), (second.due_date.isoformat(), 2, "in-progress", False)],
+        )
+
+    def test_ics_feed(self):
+        path     = f"/api/letters/calendar.ics?token={_token(self.user)}&from=2027-01-01&to=2027-03-31"
+        response = views.calendar_ics(self.factory.get(path))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        body  = response.content.decode("utf-8")
+        lines = body.split("\r\n")
+        self.assertEqual((lines[0], lines[-2], lines[-1]), ("BEGIN:VCALENDAR", "END:VCALENDAR", ""))
+        self.assertTrue(all(len(line.encode("utf-8")) <= 75 for line in lines))
+        self.assertEqual(body.count("BEGIN:VEVENT"), 3)
+        self.assertIn(f"UID:letter-{self.letters[0].pk}-cycle-2@letters", lines)
+        self.assertIn("DTSTART;VALUE=DATE:20270228", lines)
+
+        unfolded = body.replace("\r\n ", "")
+        self.assertIn("SUMMARY:REF-0 - Audit\\, part 1\\; a subject long enough", unfolded)
+        self.assertIn("to need folding in an iCalendar file (projected)", unfolded)
+        self.assertNotIn("REF-1", unfolded)
+
+        self.assertEqual(views.calendar_ics(self.factory.get("/api/letters/calendar.ics")).status_code, 401)
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        department = Department.objects.create(name="IT")
+        admin      = User.objects.create(username="admin", is_superuser=True)
+        for i in range(7):
+            Letter.objects.create(
+                department=department, category="General", priority="high",
+                ref_no=f"REF-{i}", subject=f"Subject {i}", status="in-progress",
+                due_date=None if i % 3 == 0 else date.today() + timedelta(days=i % 2),
+                created_by=admin,
+            )
+
+    def _walk(self, field, descending):
+        seen, cursor = [], None
+        with CaptureQueriesContext(connection) as ctx:
+            while True:
+                rows, cursor = keyset_paginate(Letter.objects.all(), field, descending, cursor=cursor, page_size=2)
+                seen += [row.pk for row in rows]
+                if not cursor:
+                    break
+        return seen, [query["sql"] for query in ctx.captured_queries]
+
+    def test_non_null_keys_order_without_nulls_last(self):
+        for descending in (False, True):
+            seen, queries = self._walk("created_at", descending)
+            self.assertEqual(sorted(seen), sorted(Letter.objects.values_list("pk", flat=True)))
+            self.assertFalse(any("NULLS LAST" in sql for sql in queries))
+
+    def test_nullable_keys_page_through_the_null_tail(self):
+        for descending in (False, True):
+            seen, queries = self._walk("due_date", descending)
+            self.assertEqual(len(seen), len(set(seen)))
+            self.assertEqual(sorted(seen), sorted(Letter.objects.values_list("pk", flat=True)))
+            nulls = set(Letter.objects.filter(due_date__isnull=True).values_list("pk", flat=True))
+            self.assertEqual(set(seen[-len(nulls):]), nulls)
+
+    def test_every_sort_field_has_a_keyset_index(self):
+        indexed = {tuple(index.fields) for index in Letter._meta.indexes}
+        for field in SORTABLE_FIELDS - {"id"}:
+            self.assertIn(("is_active", field, "id"), indexed, field)
+
+
+class RecurrenceEngineTests(SimpleTestCase):
+    def _random_letters(self, rng, count):
+        letters = []
+        for pk in range(1, count + 1):
+            # Bias toward month ends, where relativedelta clamping matters.
+            year, month = rng.randint(2020, 2030), rng.randint(1, 12)
+            day  = min(rng.choice([1, 15, 28, 29, 30, 31]), calendar.monthrange(year, month)[1])
+            base = date(year, month, day)
+            letters.append(Letter(
+                pk=pk, due_date=base,
+                recurrence_type=rng.choice([k for k, _ in RECURRENCE_PATTERN_CHOICES] + [None]),
+                recurrence_value=rng.choice([None, 0, 1, 2, 3, 6, 12]),
+                recurrence_metadata=rng.choice([{}, {"day": rng.randint(1, 31)}, {"weekday": rng.randint(0, 6)}]),
+            ))
+        return letters
+
+    def _expected(self, letter, count):
+        dates, base = [], letter.due_date
+        for _ in range(count):
+            base = letter.calculate_next_due_date(base)
+            if base is None:
+                return []
+            dates.append(base)
+        return dates
+
+    def _check(self, seed):
+        rng     = random.Random(seed)
+        letters = self._random_letters(rng, 300)
+        result  = recurrence.next_occurrences(((l.pk, l.due_date, recurrence.rule_for(l)) for l in letters), 24)
+        for letter in letters:
+            self.assertEqual(result[letter.pk], self._expected(letter, 24), (
+                letter.due_date, letter.recurrence_type, letter.recurrence_value, letter.recurrence_metadata,
+            ))
+
+    def test_matches_calculate_next_due_date(self):
+        for seed in range(5):
+            self._check(seed)
+
+    def test_pure_python_fallback_matches_calculate_next_due_date(self):
+        with mock.patch.object(recurrence, "np", None):
+            for seed in range(5):
+                self._check(seed)
+
+
+class CycleCompletionTests(TestCase):
+    def setUp(self):
+        self.factory    = APIRequestFactory()
+        self.department = Department.objects.create(name="IT")
+        self.admin      = User.objects.create(username="admin", is_superuser=True)
+        self.user       = User.objects.create(username="bob")
+        patcher = mock.patch.object(views, "fan_out_letter_notification")
+        self.fan_out = patcher.start()
+        self.addCleanup(patcher.stop)
+        due         = date.today() - timedelta(days=1)
+        self.letter = Letter.objects.create(
+            department=self.department, category="General", priority="high", ref_no="REF-1", subject="Audit",
+            status="in-progress", due_date=due, assigned_to=self.user, created_by=self.admin,
+            recurrence_type="monthly", recurrence_value=1,
+        )
+        self.cycle = LetterCycle.objects.create(
+            letter=self.letter, cycle_no=1, due_date=due, next_due_date=self.letter.calculate_next_due_date(due),
+        )
+        summary.rebuild()
+
+    def _complete(self):
+        request = self.factory.patch(
+            f"/api/letters/cycles/{self.cycle.pk}/status/", {"status": "completed"},
+            format="json", **_auth_header(self.user),
+        )
+        return views.update_cycle_status(request, pk=self.cycle.pk)
+
+    def _after_read(self, action):
+        """Run `action` once, right after the view has read the cycle and before its compare-and-set."""
+        real = views.get_object_or_404
+
+        def read_then_act(*args, **kwargs):
+            found = real(*args, **kwargs)
+            if not fired:
+                fired.append(True)
+                action()
+            return found
+
+        fired = []
+        return mock.patch.object(views, "get_object_or_404", side_effect=read_then_act)
+
+    def test_completion_bumps_versions_after_commit_on_every_path(self):
+        scopes = versions.scopes_for_letter_id(self.letter.pk)
+        # Signals silenced, so only the view's own bump is seen.
+        with mock.patch("letters.signals._bump_on_commit"), mock.patch.object(versions, "bump") as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(self._complete().data["new_cycle_created"])
+                bump.assert_not_called()
+        bump.assert_called_once_with(scopes)
+
+    def test_lost_compare_and_set_retries_from_the_new_status(self):
+        with self._after_read(lambda: tasks.mark_overdue_cycles(date.today())):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self._complete()
+        self.assertEqual(response.status_code, 200)
+        log = Log.objects.get(letter=self.letter, action="status_change")
+        self.assertEqual((log.old_status, log.new_status), ("overdue", "completed"))
+        self.assertEqual(list(self.letter.cycles.order_by("cycle_no").values_list("status", flat=True)),
+                         ["completed", "in-progress"])
+        self.assertEqual(summary.drift(), {})
+
+    def test_completion_that_loses_the_race_changes_nothing(self):
+        with self._after_read(lambda: self.assertEqual(self._complete().status_code, 200)):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self._complete()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.letter.cycles.count(), 2)
+        self.assertEqual(Log.objects.filter(letter=self.letter, action="status_change").count(), 1)
+        self.fan_out.delay.assert_called_once()
+        self.assertEqual(summary.drift(), {})
+
+    def test_enqueue_failure_is_logged_not_raised(self):
+        self.fan_out.delay.side_effect = OSError("broker unreachable")
+        with self.assertLogs("letters.views", "ERROR") as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self._complete()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("broker unreachable", logs.output[0])
+        self.assertEqual(self.letter.cycles.count(), 2)
+
+@skipIf(connection.vendor == "sqlite", "SQLite serialises writers on a database lock; run against SQL Server.")
+class CycleCompletionConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        self.factory    = APIRequestFactory()
+        self.department = Department.objects.create(name="IT")
+        self.admin      = User.objects.create(username="admin", is_superuser=True)
+        self.user       = User.objects.create(username="bob")
+        # New-cycle notifications go to Celery after commit; no broker here.
+        patcher = mock.patch.object(views, "fan_out_letter_notification")
+        self.fan_out = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _recurring_cycles(self, count):
+        due, cycles = date.today(), []
+        for i in range(count):
+            letter = Letter.objects.create(
+                department=self.department, category="General", priority="high",
+                ref_no=f"REF-{i + 1}", subject=f"Subject {i}", status="in-progress", due_date=due,
+                assigned_to=self.user, created_by=self.admin, recurrence_type="monthly", recurrence_value=1,
+            )
+            cycles.append(LetterCycle.objects.create(
+                letter=letter, cycle_no=1, due_date=due, next_due_date=letter.calculate_next_due_date(due),
+            ))
+        summary.rebuild()
+        return cycles
+
+    def _complete(self, cycle_pk, barrier=None):
+        try:
+            if barrier is not None:
+                barrier.wait()
+            request = self.factory.patch(
+                f"/api/letters/cycles/{cycle_pk}/status/", {"status": "completed"},
+                format="json", **_auth_header(self.user),
+            )
+            return cycle_pk, views.update_cycle_status(request, pk=cycle_pk).status_code
+        finally:
+            connection.close()
+
+    def test_racing_completions_complete_once(self):
+        cycle   = self._recurring_cycles(1)[0]
+        barrier = threading.Barrier(self.THREADS)
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            codes = sorted(code for _, code in pool.map(lambda _: self._complete(cycle.pk, barrier), range(self.THREADS)))
+
+        self.assertEqual(codes, [200] + [400] * (self.THREADS - 1))
+        self.assertEqual(list(cycle.letter.cycles.values_list("cycle_no", "status").order_by("cycle_no")),
+                         [(1, "completed"), (2, "in-progress")])
+        self.fan_out.delay.assert_called_once()
+        self.assertEqual(Log.objects.filter(letter=cycle.letter, action="status_change").count(), 1)
+        self.assertEqual(summary.drift(), {})
+
+    def test_contended_completions_all_land(self):
+        cycles = self._recurring_cycles(40)
+        jobs   = [cycle.pk for cycle in cycles] * 3   # every cycle requested by three callers
+        random.Random(0).shuffle(jobs)
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            results = list(pool.map(self._complete, jobs))
+
+        wins = [pk for pk, code in results if code == 200]
+        self.assertEqual(sorted(wins), sorted(cycle.pk for cycle in cycles))
+        self.assertEqual({code for _, code in results}, {200, 400})
+        self.assertEqual(LetterCycle.objects.filter(cycle_no=2, status="in-progress").count(), len(cycles))
+        self.assertFalse(LetterCycle.objects.exclude(status="completed").filter(cycle_no=1).exists())
+        self.assertEqual(summary.drift(), {})
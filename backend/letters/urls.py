@@ -10,8 +10,15 @@ urlpatterns = [
     path("<int:pk>/update/",   views.update_letter,        name="update_letter"),
     path("<int:pk>/delete/",   views.delete_letter,        name="delete_letter"),
     path("all/", views.get_all_letters, name="get_all_letters"),
+    path("stats/",             views.get_letter_stats,     name="letter_stats"),
+    path("changes/",           views.get_changes,          name="letter_changes"),
+    path("search/",            views.search_letters,       name="search_letters"),
+    path("task-runs/",         views.get_task_runs,        name="task_runs"),
+    path("calendar/",          views.get_calendar,         name="letter_calendar"),
+    path("calendar.ics",       views.calendar_ics,         name="letter_calendar_ics"),
     path("<int:pk>/download/", views.download_letter_file, name="download_letter_file"),
     path("<int:pk>/comments/", views.letter_comments),
+    path("<int:pk>/cycles/",   views.get_letter_cycles,    name="letter_cycles"),
 
     path("<int:pk>/approve/",  views.approve_letter,       name="approve_letter"),
     path("<int:pk>/reject/",   views.reject_letter,        name="reject_letter"),
@@ -0,0 +1,104 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponseNotModified
+
+from .models import Letter
+
+
+KEY_PREFIX = "letters:version:"
+
+
+def _key(scope):
+    return f"{KEY_PREFIX}{scope}"
+
+
+def shared():
+    """
+    Whether version tokens live in a cache every process sees. Celery workers
+    bump versions too (the nightly sweep, catch-up, retention), so with a
+    per-process cache the web server would never see those bumps; callers
+    then skip ETags and cached results rather than serve stale data.
+    """
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def letter_scopes(letter_id, assignee_id=None, head_id=None):
+    scopes = {"all", f"letter:{letter_id}"}
+    if assignee_id:
+        scopes.add(f"assignee:{assignee_id}")
+    if head_id:
+        scopes.add(f"head:{head_id}")
+    return scopes
+
+
+def scopes_for_letter_id(letter_id, letter=None):
+    """Scopes touched by a change to one letter's cycles or logs."""
+    if letter is None:
+        row = Letter.objects.filter(pk=letter_id).values_list("assigned_to_id", "assigned_head_id").first()
+        assignee_id, head_id = row or (None, None)
+    else:
+        assignee_id, head_id = letter.assigned_to_id, letter.assigned_head_id
+    return letter_scopes(letter_id, assignee_id, head_id)
+
+
+def bump(scopes):
+    """
+    Give every scope a fresh version. Versions are opaque tokens rather than
+    counters, so an evicted key simply reads as "changed" next time.
+    """
+    if not scopes:
+        return
+    token = time.time_ns()
+    cache.set_many({_key(scope): token for scope in scopes}, timeout=None)
+
+
+def current(scopes):
+    keys   = [_key(scope) for scope in scopes]
+    found  = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def make_etag(request, scopes):
+    scopes  = sorted(scopes)
+    auth    = request.headers.get("Authorization", "")
+    parts   = [request.get_full_path(), auth] + [f"{s}={v}" for s, v in zip(scopes, current(scopes))]
+    digest  = hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def conditional(scopes_for):
+    """
+    ETag / If-None-Match for read views. `scopes_for(request, *args, **kwargs)`
+    names the version scopes the response depends on (or None to skip); it must
+    not hit the database, so a matching request returns 304 with no queries.
+    Without a shared cache (see shared()) no ETag is sent at all.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scopes = scopes_for(request, *args, **kwargs) if shared() else None
+            if not scopes:
+                return view(request, *args, **kwargs)
+
+            etag = make_etag(request, scopes)
+            if_none_match = request.headers.get("If-None-Match", "")
+            if etag in [tag.strip() for tag in if_none_match.split(",")]:
+                response = HttpResponseNotModified()
+                response["ETag"] = etag
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                response["ETag"] = etag
+            return response
+        return wrapper
+    return decorator
@@ -3,18 +3,35 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-import json, os, jwt
+import json, logging, os
+from collections import Counter
 
 from django.contrib.auth import get_user_model
 User = get_user_model()
-
-from .models import Letter, LetterCycle, Log, Notification, Category, LetterComment
+logger = logging.getLogger(__name__)
+
+from .authentication import resolve_user, token_from_request
+from .models import Letter, LetterCycle, Log, Notification, Category, LetterComment, TaskSummary, TaskRun
+from .filters import parse_letter_filters, apply_letter_filters, cycle_filter_q
+from .pagination import keyset_paginate, parse_page_size
+from .runs import run_trends
+from .rows import (
+    with_list_cycles, with_current_cycle, build_letter_rows, iter_letter_rows, stream_json_array,
+    letter_base_row,
+)
+from .notifications import deliver, notify
+from .stats import letter_stats
+from .tasks import fan_out_letter_notification
+from .sync import changes_since, decode_sync_token
+from . import calendar_feed, compaction, counters, reminders, search, summary, versions
 from .serializers import (
     LetterSerializer,
     LetterCycleSerializer,
+    ArchivedLetterCycleSerializer,
     LogSerializer,
     NotificationSerializer,
     CategorySerializer,
@@ -40,29 +57,12 @@ def _validate_file(file):
     return None
 
 
-def _decode_token_payload(request):
-    auth_header = request.headers.get("Authorization", "")
-    token = auth_header.replace("Bearer ", "").strip()
-    if not token:
-        return {}
-    try:
-        return jwt.decode(
-            token, settings.SECRET_KEY, algorithms=["HS256"],
-            options={"verify_signature": False},
-        )
-    except Exception:
-        return {}
-
-
 def _get_user_from_request(request):
-    payload  = _decode_token_payload(request)
-    username = payload.get("username")
-    if not username:
-        return None
-    try:
-        return User.objects.get(username=username)
-    except User.DoesNotExist:
+    # Resolved once per request by CachedJWTAuthentication.
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
         return None
+    return user
 
 
 def get_user_from_token(request):
@@ -76,6 +76,107 @@ def _user_from_payload(request):
     return _get_user_from_request(request)
 
 
+def _scoped_letters(user):
+    base = Letter.objects.filter(is_active=True).select_related(
+        'department', 'created_by', 'assigned_to', 'assigned_head'
+    )
+
+    # Super Admin (superuser + NOT staff) → all letters
+    if user.is_superuser and not user.is_staff:
+        return base
+
+    # Director/Superuser (superuser + staff) → letters where they are the assigned head
+    if user.is_superuser and user.is_staff:
+        return base.filter(assigned_head=user)
+
+    # Regular user → only their assigned letters
+    return base.filter(assigned_to=user)
+
+
+def _token_scopes(request):
+    """
+    Version scopes for the list endpoints, from the authenticated user's
+    current role. request.user comes from the auth cache, which drops a user's
+    entry when the user is saved, so a promotion moves them to the new scope
+    without another login and a conditional request still costs no queries.
+    """
+    user = _get_user_from_request(request)
+    if user is None:
+        return None
+    return {calendar_feed.scope_for(user), f"user:{user.id}"}
+
+
+def _admin_scopes(request):
+    user = _get_user_from_request(request)
+    return {"all", f"user:{user.id}"} if user is not None else None
+
+
+def _letter_scope(request, pk):
+    return {f"letter:{pk}"}
+
+
+def _scoped_summary(user):
+    if user.is_superuser and not user.is_staff:
+        return TaskSummary.objects.all()
+    if user.is_superuser and user.is_staff:
+        return TaskSummary.objects.filter(head_id=user.id)
+    return TaskSummary.objects.filter(assignee_id=user.id)
+
+
+def _wants_page(request):
+    params = request.query_params
+    return "cursor" in params or "page_size" in params
+
+
+def _attach_cycles(request, letters, filters):
+    """
+    Lists return one row per letter with its current cycle; `cycles=all` keeps
+    the old one-row-per-cycle shape. Full history is at /<pk>/cycles/.
+    """
+    cycle_q = cycle_filter_q(filters)
+    if request.query_params.get("cycles") == "all":
+        return with_list_cycles(letters, cycle_q)
+    return with_current_cycle(letters, cycle_q)
+
+
+def _ordered(letters, filters):
+    field, descending = filters["ordering"]
+    ordering = f"-{field}" if descending else field
+    return letters.order_by(ordering, "-pk" if descending else "pk")
+
+
+def _stream_letter_rows(letters):
+    """
+    `stream=1`: write the JSON array as rows are produced. Letters are read in
+    chunks (each chunk gets its own cycles prefetch), so memory stays flat no
+    matter how many rows the export has.
+    """
+    chunk_size = getattr(settings, "LETTERS_STREAM_CHUNK_SIZE", 500)
+    rows = iter_letter_rows(letters.iterator(chunk_size=chunk_size))
+    return StreamingHttpResponse(stream_json_array(rows), content_type="application/json")
+
+
+def _paginate_letters(request, letters, filters):
+    """
+    Without `cursor` / `page_size` the full (filtered) list is returned as before,
+    so existing pages keep working. With them, one keyset page of letters.
+    """
+    field, descending = filters["ordering"]
+    if not _wants_page(request):
+        return _ordered(letters, filters), None
+    return keyset_paginate(
+        letters, field, descending,
+        cursor=request.query_params.get("cursor"),
+        page_size=parse_page_size(request.query_params.get("page_size")),
+    )
+
+
+def _letters_response(request, data, next_cursor):
+    if not _wants_page(request):
+        return Response(data)
+    return Response({"results": data, "next_cursor": next_cursor})
+
+
 @api_view(["POST"])
 @parser_classes([MultiPartParser, FormParser])
 def create_letter(request):
@@ -130,7 +231,7 @@ def create_letter(request):
             if letter.status == "in-progress":
                 try:
                     letter.next_due_date = letter.calculate_next_due_date()
-                    letter.save(update_fields=["next_due_date"])
+                    letter.save(update_fields=["next_due_date", "updated_at"])
                 except Exception as e:
                     print("Next due date error:", e)
 
@@ -153,15 +254,16 @@ def create_letter(request):
                     message=f"Task {letter.ref_no} created with status '{letter.status}'",
                 )
                 if letter.assigned_head and letter.status == "pending":
-                    Notification.objects.create(
-                        user=letter.assigned_head, letter=letter,
-                        title="New Task Pending Approval",
-                        message=(
+                    notify(
+                        letter.assigned_head_id, letter.id,
+                        "New Task Pending Approval",
+                        (
                             f"Task {letter.ref_no} – '{letter.subject}' "
                             "has been submitted for your approval."
                         ),
                     )
 
+            summary.sync(letter)
             return Response(LetterSerializer(letter).data, status=201)
         return Response(serializer.errors, status=400)
 
@@ -181,6 +283,7 @@ def approve_letter(request, pk):
         if letter.status != "pending":
             return Response({"error": "Task is not pending."}, status=400)
 
+        before = summary.snapshot(letter)
         letter.status = "in-progress"
         try:
             letter.next_due_date = letter.calculate_next_due_date()
@@ -201,12 +304,13 @@ def approve_letter(request, pk):
             old_status="pending", new_status="in-progress",
             message=f"Task approved by {user.username}. First cycle created.",
         )
+        summary.sync(letter, before)
 
         if letter.assigned_to:
-            Notification.objects.create(
-                user=letter.assigned_to, letter=letter,
-                title="Task Approved",
-                message=(
+            notify(
+                letter.assigned_to_id, letter.id,
+                "Task Approved",
+                (
                     f"Task {letter.ref_no} – '{letter.subject}' has been approved "
                     f"and is now in progress. Due: {letter.due_date}"
                 ),
@@ -233,8 +337,10 @@ def reject_letter(request, pk):
             return Response({"error": "Only pending letters can be rejected."}, status=400)
 
         rejection_reason = request.data.get("reason", "")
+        before = summary.snapshot(letter)
         letter.status = "draft"
         letter.save()
+        summary.sync(letter, before)
 
         Log.objects.create(
             letter=letter, action="rejected",
@@ -249,16 +355,12 @@ def reject_letter(request, pk):
         if letter.created_by:  recipients.add(letter.created_by)
         if letter.assigned_to: recipients.add(letter.assigned_to)
 
-        for recipient in recipients:
-            Notification.objects.create(
-                user=recipient, letter=letter,
-                title="Task Rejected",
-                message=(
-                    f"Task {letter.ref_no} – '{letter.subject}' was rejected"
-                    + (f": {rejection_reason}" if rejection_reason else ".")
-                    + " It has been returned to drafts."
-                ),
-            )
+        message = (
+            f"Task {letter.ref_no} – '{letter.subject}' was rejected"
+            + (f": {rejection_reason}" if rejection_reason else ".")
+            + " It has been returned to drafts."
+        )
+        deliver([(recipient.id, letter.id, "Task Rejected", message) for recipient in recipients])
 
         return Response({"message": "Task rejected and moved to draft."})
 
@@ -269,79 +371,229 @@ def reject_letter(request, pk):
         return Response({"error": str(e)}, status=500)
 
 @api_view(["GET"])
+@versions.conditional(_token_scopes)
 def list_letters(request):
     try:
         user = _get_user_from_request(request)
         if user is None:
             return Response({"error": "Authentication required."}, status=401)
 
-        # Super Admin (superuser + NOT staff) → all letters
-        if user.is_superuser and not user.is_staff:
-            letters = Letter.objects.filter(is_active=True).select_related(
-                'department', 'created_by', 'assigned_to', 'assigned_head'
-            )
+        letters = _scoped_letters(user)
+        try:
+            filters = parse_letter_filters(request.query_params)
+            letters = apply_letter_filters(letters, filters)
+            letters = _attach_cycles(request, letters, filters)
+            letters, next_cursor = _paginate_letters(request, letters, filters)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
 
-        # Director/Superuser (superuser + staff) → letters where they are the assigned head
-        elif user.is_superuser and user.is_staff:
-            letters = Letter.objects.filter(
-                is_active=True,
-                assigned_head=user  # ← user.id == assigned_head_id
-            ).select_related('department', 'created_by', 'assigned_to', 'assigned_head')
+        data = build_letter_rows(letters)
+        return _letters_response(request, data, next_cursor)
 
-        # Regular user → only their assigned letters
-        else:
-            letters = Letter.objects.filter(assigned_to=user, is_active=True).select_related(
-                'department', 'created_by', 'assigned_to', 'assigned_head'
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
+
+@api_view(["GET"])
+def get_letter_cycles(request, pk):
+    try:
+        user = _get_user_from_request(request)
+        if user is None:
+            return Response({"error": "Authentication required."}, status=401)
+        letter = get_object_or_404(_scoped_letters(user), pk=pk)
+
+        try:
+            # Compacted cycles live in the archive table; page through both as one list.
+            cycles, next_cursor = compaction.cycle_page(
+                letter.pk,
+                descending=request.query_params.get("ordering") == "-cycle_no",
+                cursor=request.query_params.get("cursor"),
+                page_size=parse_page_size(request.query_params.get("page_size")),
             )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        results = []
+        for cycle, archived in cycles:
+            serializer = ArchivedLetterCycleSerializer if archived else LetterCycleSerializer
+            results.append({**serializer(cycle).data, "archived": archived})
+        return Response({
+            "results":     results,
+            "next_cursor": next_cursor,
+            "compacted":   compaction.history_summary(letter.pk),
+        })
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
 
-        data = []
-        for letter in letters:
-            cycles = letter.cycles.all().order_by("cycle_no")
-            base = {
-                "letter_id":        str(letter.id),
-                "id":               letter.id,
-                "ref_no":           letter.ref_no,
-                "subject":          letter.subject,
-                "department": letter.department.name if letter.department else "N/A",
-                "category":         letter.category,
-                "priority":         letter.priority,
-                "file":             letter.file.url if letter.file else None,
-                "created_by":       letter.created_by.username if letter.created_by else "N/A",
-                "assigned_to":      letter.assigned_to.username if letter.assigned_to else None,
-                "assigned_head":    letter.assigned_head.username if letter.assigned_head else None,
-                "recurrence_type":  letter.recurrence_type,
-                "recurrence_value": letter.recurrence_value,
-                "created_at":       letter.created_at.isoformat(),
-            }
 
-            if cycles.exists():
-                for cycle in cycles:
-                    data.append({
-                        **base,
-                        "_id":           str(cycle.id),
-                        "cycle_no":      cycle.cycle_no,
-                        "due_date":      cycle.due_date.isoformat(),
-                        "next_due_date": cycle.next_due_date.isoformat() if cycle.next_due_date else None,
-                        "status":        cycle.status,
-                    })
-            else:
-                data.append({
-                    **base,
-                    "_id":           str(letter.id),
-                    "cycle_no":      1,
-                    "due_date":      letter.due_date.isoformat() if letter.due_date else None,
-                    "next_due_date": letter.next_due_date.isoformat() if letter.next_due_date else None,
-                    "status":        letter.status,
-                })
+@api_view(["GET"])
+def get_changes(request):
+    try:
+        user = _get_user_from_request(request)
+        if user is None:
+            return Response({"error": "Authentication required."}, status=401)
 
+        token = request.query_params.get("since")
+        try:
+            since = decode_sync_token(token) if token else None
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response(changes_since(_scoped_letters(user), user, since))
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
+
+
+@api_view(["GET"])
+def search_letters(request):
+    try:
+        user = _get_user_from_request(request)
+        if user is None:
+            return Response({"error": "Authentication required."}, status=401)
+
+        query = (request.query_params.get("q") or "").strip()
+        if not query:
+            return Response({"error": "Query parameter 'q' is required."}, status=400)
+        limit = parse_page_size(request.query_params.get("limit"), default=20, maximum=100)
+
+        results  = search.search(_scoped_letters(user), query, limit=limit)
+        tokens   = results[0][2] if results else []
+        comments = search.matching_comments([letter.id for letter, _, _ in results], tokens)
+
+        data = []
+        for letter, score, tokens in results:
+            data.append({
+                **letter_base_row(letter),
+                "status":   letter.status,
+                "due_date": letter.due_date.isoformat() if letter.due_date else None,
+                "score":    round(score, 4),
+                "highlights": {
+                    "ref_no":           search.highlight(letter.ref_no, tokens),
+                    "subject":          search.highlight(letter.subject, tokens),
+                    "category":         search.highlight(letter.category, tokens),
+                    "file_description": search.highlight(letter.file_description, tokens),
+                    "comments":         [search.highlight(c, tokens) for c in comments.get(letter.id, [])],
+                },
+            })
         return Response(data)
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
 
+
+@api_view(["GET"])
+def get_letter_stats(request):
+    try:
+        user = _get_user_from_request(request)
+        if user is None:
+            return Response({"error": "Authentication required."}, status=401)
+        return Response(letter_stats(_scoped_letters(user), _scoped_summary(user)))
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        import traceback; traceback.print_exc()
         return Response({"error": str(e)}, status=500)
 
+
+@api_view(["GET"])
+def get_task_runs(request):
+    try:
+        user = _get_user_from_request(request)
+        if user is None:
+            return Response({"error": "Authentication required."}, status=401)
+
+        if not user.is_superuser or user.is_staff:
+            return Response({"error": "Admin access required."}, status=403)
+
+        try:
+            days  = int(request.query_params.get("days", 30))
+            limit = parse_page_size(request.query_params.get("limit"), default=50, maximum=500)
+        except ValueError:
+            return Response({"error": "days and limit must be integers."}, status=400)
+        task_name = request.query_params.get("task") or None
+
+        runs = TaskRun.objects.all()
+        if task_name:
+            runs = runs.filter(task_name=task_name)
+        return Response({
+            "runs": [
+                {
+                    "id":                    run.id,
+                    "task_name":             run.task_name,
+                    "status":                run.status,
+                    "started_at":            run.started_at.isoformat(),
+                    "finished_at":           run.finished_at.isoformat() if run.finished_at else None,
+                    "duration_ms":           run.duration_ms,
+                    "rows_updated":          run.rows_updated,
+                    "notifications_created": run.notifications_created,
+                    "query_count":           run.query_count,
+                    "peak_memory_kb":        run.peak_memory_kb,
+                    "error":                 run.error,
+                }
+                for run in runs.order_by("-started_at")[:limit]
+            ],
+            "trends": run_trends(days=days, task_name=task_name),
+        })
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
+
+
+@api_view(["GET"])
+@versions.conditional(_token_scopes)
+def get_calendar(request):
+    """
+    Due dates between ?from= and ?to= (YYYY-MM-DD, inclusive): stored cycles
+    plus cycles projected from each recurring letter's rule (projected=true).
+    """
+    try:
+        user = _get_user_from_request(request)
+        if user is None:
+            return Response({"error": "Authentication required."}, status=401)
+
+        try:
+            start, end = calendar_feed.parse_window(request.query_params.get("from"), request.query_params.get("to"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response({
+            "from":   start.isoformat(),
+            "to":     end.isoformat(),
+            "events": calendar_feed.events_for(user, _scoped_letters(user), start, end),
+        })
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
+
+
+def calendar_ics(request):
+    """
+    The calendar as an iCalendar file. Calendar apps subscribing to the feed
+    cannot send headers, so the token may also come as ?token=. Without
+    ?to=, the window runs LETTERS_CALENDAR_MAX_DAYS from ?from= (or today).
+    """
+    token = request.GET.get("token") or token_from_request(request)
+    user  = resolve_user(token) if token else None
+    if user is None:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+
+    try:
+        start, end = calendar_feed.parse_window(
+            request.GET.get("from"), request.GET.get("to"),
+            default_days=getattr(settings, "LETTERS_CALENDAR_MAX_DAYS", calendar_feed.MAX_WINDOW_DAYS),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    events   = calendar_feed.events_for(user, _scoped_letters(user), start, end)
+    response = HttpResponse(calendar_feed.to_ics(events), content_type="text/calendar; charset=utf-8")
+    response["Content-Disposition"] = 'attachment; filename="letters.ics"'
+    return response
+
+
 @api_view(["GET"])
+@versions.conditional(_letter_scope)
 def get_letter(request, pk):
     letter = get_object_or_404(Letter, pk=pk)
     return Response(LetterSerializer(letter).data)
@@ -352,15 +604,13 @@ def get_letter(request, pk):
 def update_letter(request, pk):
     try:
         letter   = get_object_or_404(Letter, pk=pk)
-        payload  = _decode_token_payload(request)
-        username = payload.get("username")
+        req_user = _get_user_from_request(request)
+        username = req_user.username if req_user else None
 
-        if username:
-            req_user = User.objects.filter(username=username).first()
-            if req_user:
-                is_owner = (letter.created_by == req_user or letter.assigned_to == req_user)
-                if not req_user.is_superuser and not is_owner:
-                    return Response({"error": "Permission denied."}, status=403)
+        if req_user:
+            is_owner = req_user.pk in (letter.created_by_id, letter.assigned_to_id)
+            if not req_user.is_superuser and not is_owner:
+                return Response({"error": "Permission denied."}, status=403)
 
         data = request.data.copy()
         data.pop("username", None)
@@ -389,9 +639,11 @@ def update_letter(request, pk):
         if letter.status in ("draft", "rejected", "pending"):
                 data["status"] = "pending"
 
+        before     = summary.snapshot(letter)
         serializer = LetterSerializer(letter, data=data, partial=True)
         if serializer.is_valid():
             updated = serializer.save()
+            summary.sync(updated, before)
             Log.objects.create(
                 letter=updated, action="updated",
                 message=(
@@ -401,10 +653,10 @@ def update_letter(request, pk):
                 ),
             )
             if updated.status == "pending" and updated.assigned_head:
-                Notification.objects.create(
-                    user=updated.assigned_head, letter=updated,
-                    title="Task Re-submitted for Approval",
-                    message=f"Task {updated.ref_no} has been updated and awaits your approval.",
+                notify(
+                    updated.assigned_head_id, updated.id,
+                    "Task Re-submitted for Approval",
+                    f"Task {updated.ref_no} has been updated and awaits your approval.",
                 )
             return Response(LetterSerializer(updated).data)
 
@@ -415,6 +667,7 @@ def update_letter(request, pk):
         return Response({"error": str(e)}, status=500)
 
 @api_view(["GET"])
+@versions.conditional(_admin_scopes)
 def get_all_letters(request):
     try:
         user = _get_user_from_request(request)
@@ -427,46 +680,18 @@ def get_all_letters(request):
         letters = Letter.objects.filter(is_active=True).select_related(
             'department', 'created_by', 'assigned_to', 'assigned_head'
         )
-        data = []
-        for letter in letters:
-            cycles = letter.cycles.all().order_by("cycle_no")
-            base = {
-                "letter_id":        str(letter.id),
-                "id":               letter.id,
-                "ref_no":           letter.ref_no,
-                "subject":          letter.subject,
-                "department":       letter.department.name if letter.department else "N/A", 
-                "category":         letter.category,
-                "priority":         letter.priority,
-                "file":             letter.file.url if letter.file else None,
-                "created_by":       letter.created_by.username    if letter.created_by    else "N/A",
-                "assigned_to":      letter.assigned_to.username   if letter.assigned_to   else None,
-                "assigned_head":    letter.assigned_head.username if letter.assigned_head else None,
-                "recurrence_type":  letter.recurrence_type,
-                "recurrence_value": letter.recurrence_value,
-                "created_at":       letter.created_at.isoformat(),
-            }
-            if cycles.exists():
-                for cycle in cycles:
-                    data.append({
-                        **base,
-                        "_id":           str(cycle.id),
-                        "cycle_no":      cycle.cycle_no,
-                        "due_date":      cycle.due_date.isoformat(),
-                        "next_due_date": cycle.next_due_date.isoformat() if cycle.next_due_date else None,
-                        "status":        cycle.status,
-                    })
-            else:
-                data.append({
-                    **base,
-                    "_id":           str(letter.id),
-                    "cycle_no":      1,
-                    "due_date":      letter.due_date.isoformat() if letter.due_date else None,
-                    "next_due_date": letter.next_due_date.isoformat() if letter.next_due_date else None,
-                    "status":        letter.status,
-                })
-
-        return Response(data)
+        try:
+            filters = parse_letter_filters(request.query_params)
+            letters = apply_letter_filters(letters, filters)
+            letters = _attach_cycles(request, letters, filters)
+            if request.query_params.get("stream") == "1":
+                return _stream_letter_rows(_ordered(letters, filters))
+            letters, next_cursor = _paginate_letters(request, letters, filters)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        data = build_letter_rows(letters)
+        return _letters_response(request, data, next_cursor)
 
     except Exception as e:
         import traceback; traceback.print_exc()
@@ -494,8 +719,10 @@ def delete_letter(request, pk):
     if not user.is_superuser and not is_owner:
         return Response({"error": "Permission denied."}, status=403)
 
+    before = summary.snapshot(letter)
     letter.is_active = False
     letter.save()
+    summary.sync(letter, before)
 
     Log.objects.create(
         letter=letter,
@@ -525,13 +752,22 @@ def category_list(request):
     return Response(CategorySerializer(Category.objects.all(), many=True).data)
 
 
+def _enqueue_fan_out(letter_id, title, message):
+    # Runs after commit, so the status change is already saved: a broker
+    # outage must not turn the response into a 500. Log what was not sent.
+    try:
+        fan_out_letter_notification.delay(letter_id, title, message)
+    except Exception:
+        logger.exception("Could not queue %r notifications for letter %s", title, letter_id)
+
+
 @api_view(["PATCH"])
 def update_cycle_status(request, pk):
     try:
-        payload  = _decode_token_payload(request)
-        username = payload.get("username")
+        req_user = _get_user_from_request(request)
+        username = req_user.username if req_user else None
 
-        cycle  = get_object_or_404(LetterCycle, pk=pk)
+        cycle  = get_object_or_404(LetterCycle.objects.select_related("letter"), pk=pk)
         letter = cycle.letter
 
         new_status = request.data.get("status")
@@ -540,52 +776,84 @@ def update_cycle_status(request, pk):
         if cycle.status == "completed":
             return Response({"error": "Cycle already completed."}, status=400)
 
-        old_status   = cycle.status
-        cycle.status = new_status
-        if new_status == "completed":
-            cycle.completed_at = timezone.now()
-        cycle.save()
-
-        log_message = f"Cycle {cycle.cycle_no} status changed '{old_status}' → '{new_status}'"
-        if username:
-            log_message += f" by {username}"
-
-        Log.objects.create(
-            letter=letter, action="status_change",
-            old_status=old_status, new_status=new_status, message=log_message,
-        )
-
         new_cycle_created = False
         new_cycle_no      = None
 
-        if new_status == "completed" and letter.recurrence_type:
-            base = cycle.next_due_date   
+        with transaction.atomic():
+            # Compare-and-set on the status just read, as the first statement of
+            # the transaction: of two requests racing on one cycle only one
+            # matches, so only one completes it and creates the next cycle. A
+            # miss re-reads the row; the overdue sweep may have moved it.
+            now     = timezone.now()
+            changes = {"status": new_status, "updated_at": now}
+            if new_status == "completed":
+                changes["completed_at"] = now
+            old_status = cycle.status
+            while not LetterCycle.objects.filter(pk=cycle.pk, status=old_status).update(**changes):
+                old_status = LetterCycle.objects.filter(pk=cycle.pk).values_list("status", flat=True).first()
+                if old_status is None:
+                    return Response({"error": "Cycle not found."}, status=404)
+                if old_status == "completed":
+                    return Response({"error": "Cycle already completed."}, status=400)
+
+            deltas = Counter({summary.summary_key(letter, old_status): -1})
+            deltas[summary.summary_key(letter, new_status)] += 1
+
+            log_message = f"Cycle {cycle.cycle_no} status changed '{old_status}' → '{new_status}'"
+            if username:
+                log_message += f" by {username}"
+
+            Log.objects.create(
+                letter=letter, action="status_change",
+                old_status=old_status, new_status=new_status, message=log_message,
+            )
+
+            base = cycle.next_due_date if new_status == "completed" and letter.recurrence_type else None
+            # The nightly catch-up may already have created the following cycles.
+            if base and LetterCycle.objects.filter(letter=letter, cycle_no__gt=cycle.cycle_no).exists():
+                base = None
 
             if base:
                 next_cycle_no = cycle.cycle_no + 1
                 next_next_due = letter.calculate_next_due_date(base)
-
-                new_cycle = LetterCycle.objects.create(
-                    letter=letter, cycle_no=next_cycle_no,
-                    due_date=base, next_due_date=next_next_due, status="in-progress",
-                )
-
-                Log.objects.create(
-                    letter=letter, action="recurred",
-                    old_due_date=cycle.due_date, new_due_date=new_cycle.due_date,
-                    next_due_date=new_cycle.next_due_date,
-                    message=f"Cycle {next_cycle_no} auto-created (recurrence).",
-                )
-
-                for u in User.objects.all():
-                    Notification.objects.create(
-                        user=u, letter=letter,
-                        title="New Cycle Created",
-                        message=f"Letter {letter.ref_no} Cycle {next_cycle_no} created. Due: {base}",
+                try:
+                    with transaction.atomic():
+                        new_cycle = LetterCycle.objects.create(
+                            letter=letter, cycle_no=next_cycle_no,
+                            due_date=base, next_due_date=next_next_due, status="in-progress",
+                        )
+                except IntegrityError:
+                    # The catch-up sweep inserted it between the check and here.
+                    new_cycle = None
+
+                if new_cycle is not None:
+                    Log.objects.create(
+                        letter=letter, action="recurred",
+                        old_due_date=cycle.due_date, new_due_date=new_cycle.due_date,
+                        next_due_date=new_cycle.next_due_date,
+                        message=f"Cycle {next_cycle_no} auto-created (recurrence).",
                     )
 
-                new_cycle_created = True
-                new_cycle_no      = next_cycle_no
+                    notify_args = (
+                        letter.pk, "New Cycle Created",
+                        f"Letter {letter.ref_no} Cycle {next_cycle_no} created. Due: {base}",
+                    )
+                    transaction.on_commit(lambda: _enqueue_fan_out(*notify_args))
+
+                    deltas[summary.summary_key(letter, "in-progress")] += 1
+                    new_cycle_created = True
+                    new_cycle_no      = next_cycle_no
+
+            if letter.is_active:
+                summary.apply_deltas(deltas)
+            # update() sends no post_save; a created cycle already rescheduled
+            # the reminders through its signals.
+            if not new_cycle_created:
+                reminders.reschedule(letter)
+            # The status change itself was an update(), so bump on every path
+            # rather than counting on a created cycle's signals to cover it.
+            scopes = versions.scopes_for_letter_id(letter.pk, letter)
+            transaction.on_commit(lambda: versions.bump(scopes))
 
         response_data = {"success": True, "message": f"Status updated to {new_status}."}
         if new_cycle_created:
@@ -602,6 +870,7 @@ def update_cycle_status(request, pk):
 
 
 @api_view(["GET"])
+@versions.conditional(_letter_scope)
 def get_letter_history(request, pk):
     try:
         letter = get_object_or_404(Letter, pk=pk)
@@ -632,8 +901,34 @@ def get_notifications(request):
         user = _user_from_payload(request)
         if not user:
             return Response([])
-        notifs = Notification.objects.filter(user=user).order_by("-created_at")[:20]
-        return Response(NotificationSerializer(notifs, many=True).data)
+        notifs = Notification.objects.filter(user=user)
+        params = request.query_params
+        if params.get("unread") in ("1", "true"):
+            notifs = notifs.filter(is_read=False)
+        if params.get("letter"):
+            if not params["letter"].isdigit():
+                return Response({"error": "letter must be an id."}, status=400)
+            notifs = notifs.filter(letter_id=int(params["letter"]))
+        if params.get("title"):
+            notifs = notifs.filter(title=params["title"])
+
+        context = {"user_name": user.username}
+        if not _wants_page(request):
+            notifs = notifs.order_by("-created_at", "-pk")[:20]
+            return Response(NotificationSerializer(notifs, many=True, context=context).data)
+
+        try:
+            notifs, next_cursor = keyset_paginate(
+                notifs, "created_at", descending=True,
+                cursor=params.get("cursor"),
+                page_size=parse_page_size(params.get("page_size"), default=20, maximum=100),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({
+            "results":     NotificationSerializer(notifs, many=True, context=context).data,
+            "next_cursor": next_cursor,
+        })
     except Exception as e:
         import traceback; traceback.print_exc()
         return Response({"error": str(e)}, status=500)
@@ -645,8 +940,15 @@ def get_unread_count(request):
         user = _user_from_payload(request)
         if not user:
             return Response({"count": 0})
-        count = Notification.objects.filter(user=user, is_read=False).count()
-        return Response({"count": count})
+        count = counters.unread_count(user.id)
+        etag  = f'"unread-{user.id}-{count}"'
+        if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+            response = HttpResponseNotModified()
+        else:
+            response = Response({"count": count})
+        response["ETag"]          = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
     except Exception:
         return Response({"count": 0})
 
@@ -658,9 +960,10 @@ def mark_notification_read(request, pk):
         if not user:
             return Response({"error": "Authentication required."}, status=401)
         notification = get_object_or_404(Notification, pk=pk, user=user)
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            counters.adjust({user.id: -1})
         notification.is_read = True
-        notification.save()
-        return Response(NotificationSerializer(notification).data)
+        return Response(NotificationSerializer(notification, context={"user_name": user.username}).data)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
@@ -672,6 +975,7 @@ def mark_all_notifications_read(request):
         if not user:
             return Response({"error": "Authentication required."}, status=401)
         updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        counters.adjust({user.id: -updated})
         return Response({"message": f"{updated} notifications marked as read.", "count": updated})
     except Exception as e:
         return Response({"error": str(e)}, status=500)
@@ -736,15 +1040,8 @@ def letter_comments(request, pk):
             if letter.assigned_to and letter.assigned_to != user:
                 recipients.add(letter.assigned_to)
 
-            for recipient in recipients:
-                Notification.objects.create(
-                    user=recipient,
-                    letter=letter,
-                    title="New Admin Comment",
-                    message="{} commented on Task {} - '{}': {}".format(
-                        user.username, ref, subject, preview
-                    ),
-                )
+            message = "{} commented on Task {} - '{}': {}".format(user.username, ref, subject, preview)
+            deliver([(recipient.id, letter.id, "New Admin Comment", message) for recipient in recipients])
 
             return Response({
                 "id":         comment.id,
@@ -8,6 +8,7 @@ interface Notification {
   title: string;
   message: string;
   is_read: boolean;
+  count?: number;
   created_at: string;
   letter_id?: number;
   user_id: number;
@@ -27,8 +28,15 @@ export default function NotificationDropdown() {
     }
   }, [isOpen]);
 
+  // No timer: an idle tab sends nothing. The badge is read on mount and again
+  // when the user comes back to the tab, when it may have changed.
   useEffect(() => {
     fetchUnreadCount();
+    const onVisible = () => {
+      if (document.visibilityState === "visible") fetchUnreadCount();
+    };
+    document.addEventListener("visibilitychange", onVisible);
+    return () => document.removeEventListener("visibilitychange", onVisible);
   }, []);
 
   const fetchNotifications = async () => {
@@ -265,6 +273,11 @@ const handleNotificationClick = async (notification: Notification) => {
                       <h6 className="text-sm font-semibold text-gray-800 dark:text-gray-200">
                         {notification.title}
                       </h6>
+                      {(notification.count ?? 1) > 1 && (
+                        <span className="text-xs text-gray-500 dark:text-gray-400">
+                          ×{notification.count}
+                        </span>
+                      )}
                       {!notification.is_read && (
                         <span className="w-2 h-2 bg-blue-500 rounded-full"></span>
                       )}
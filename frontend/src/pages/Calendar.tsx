@@ -1,9 +1,11 @@
-import { useState, useRef, useEffect } from "react";
+import { useState, useRef } from "react";
 import FullCalendar from "@fullcalendar/react";
 import dayGridPlugin from "@fullcalendar/daygrid";
 import timeGridPlugin from "@fullcalendar/timegrid";
 import interactionPlugin from "@fullcalendar/interaction";
-import { EventInput, DateSelectArg, EventClickArg } from "@fullcalendar/core";
+import { EventInput, DateSelectArg, EventClickArg, EventSourceFuncArg } from "@fullcalendar/core";
+import { useNavigate } from "react-router-dom";
+import api from "../api/axios";
 import { Modal } from "../components/ui/modal";
 import { useModal } from "../hooks/useModal";
 import PageMeta from "../components/common/PageMeta";
@@ -11,9 +13,31 @@ import PageMeta from "../components/common/PageMeta";
 interface CalendarEvent extends EventInput {
   extendedProps: {
     calendar: string;
+    letterId?: number;
   };
 }
 
+interface LetterOccurrence {
+  id: string;
+  letter_id: number;
+  ref_no: string;
+  subject: string;
+  date: string;
+  cycle_no: number;
+  status: string;
+  projected: boolean;
+}
+
+const occurrenceColor = (o: LetterOccurrence) => {
+  if (o.projected) return "Primary";
+  if (o.status === "completed") return "Success";
+  if (o.status === "overdue") return "Danger";
+  return "Warning";
+};
+
+const toISODate = (d: Date) =>
+  `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, "0")}-${String(d.getDate()).padStart(2, "0")}`;
+
 const Calendar: React.FC = () => {
   const [selectedEvent, setSelectedEvent] = useState<CalendarEvent | null>(
     null
@@ -25,6 +49,7 @@ const Calendar: React.FC = () => {
   const [events, setEvents] = useState<CalendarEvent[]>([]);
   const calendarRef = useRef<FullCalendar>(null);
   const { isOpen, openModal, closeModal } = useModal();
+  const navigate = useNavigate();
 
   const calendarsEvents = {
     Danger: "danger",
@@ -33,30 +58,34 @@ const Calendar: React.FC = () => {
     Warning: "warning",
   };
 
-  useEffect(() => {
-    // Initialize with some events
-    setEvents([
-      {
-        id: "1",
-        title: "Event Conf.",
-        start: new Date().toISOString().split("T")[0],
-        extendedProps: { calendar: "Danger" },
-      },
-      {
-        id: "2",
-        title: "Meeting",
-        start: new Date(Date.now() + 86400000).toISOString().split("T")[0],
-        extendedProps: { calendar: "Success" },
-      },
-      {
-        id: "3",
-        title: "Workshop",
-        start: new Date(Date.now() + 172800000).toISOString().split("T")[0],
-        end: new Date(Date.now() + 259200000).toISOString().split("T")[0],
-        extendedProps: { calendar: "Primary" },
-      },
-    ]);
-  }, []);
+  // Letter due dates for the visible range: stored cycles plus projected ones.
+  const fetchLetterEvents = async (
+    info: EventSourceFuncArg,
+    success: (events: EventInput[]) => void,
+    failure: (error: Error) => void
+  ) => {
+    try {
+      const token = localStorage.getItem("token");
+      const lastDay = new Date(info.end.getTime() - 86400000); // FullCalendar's end is exclusive
+      const res = await api.get("http://127.0.0.1:9002/api/letters/calendar/", {
+        params: { from: toISODate(info.start), to: toISODate(lastDay) },
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      success(
+        res.data.events.map((o: LetterOccurrence) => ({
+          id: o.id,
+          title: `${o.ref_no} – ${o.subject}${o.projected ? " (projected)" : ""}`,
+          start: o.date,
+          allDay: true,
+          editable: false,
+          extendedProps: { calendar: occurrenceColor(o), letterId: o.letter_id },
+        }))
+      );
+    } catch (err: any) {
+      console.error("Error fetching calendar:", err);
+      failure(err);
+    }
+  };
 
   const handleDateSelect = (selectInfo: DateSelectArg) => {
     resetModalFields();
@@ -67,6 +96,10 @@ const Calendar: React.FC = () => {
 
   const handleEventClick = (clickInfo: EventClickArg) => {
     const event = clickInfo.event;
+    if (event.extendedProps.letterId) {
+      navigate(`/history/${event.extendedProps.letterId}`);
+      return;
+    }
     setSelectedEvent(event as unknown as CalendarEvent);
     setEventTitle(event.title);
     setEventStartDate(event.start?.toISOString().split("T")[0] || "");
@@ -132,7 +165,7 @@ const Calendar: React.FC = () => {
               center: "title",
               right: "dayGridMonth,timeGridWeek,timeGridDay",
             }}
-            events={events}
+            eventSources={[events, fetchLetterEvents]}
             selectable={true}
             select={handleDateSelect}
             eventClick={handleEventClick}